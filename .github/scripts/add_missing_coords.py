@@ -1,7 +1,9 @@
-import json
 import cv2
 import argparse
+import json
 from pathlib import Path
+from spatial_index import GridIndex
+from wall_data import load_json, load_wall
 
 # Global variable to store the last click coordinates
 click_coords = None
@@ -12,7 +14,7 @@ def click_event(event, x, y, flags, params):
         click_coords = (x, y)
         print(f"Clicked at: ({x}, {y})")
 
-def main(wall_dir):
+def main(wall_dir, snap_radius=15):
     wall_path = Path(wall_dir)
     routes_path = wall_path / 'routes.json'
     holds_path = wall_path / 'output/data/holds.json'
@@ -22,24 +24,11 @@ def main(wall_dir):
         print(f"Error: Ensure 'routes.json' and 'image_base.png' exist in '{wall_dir}'")
         return
 
-    # Load existing holds data or initialize if not present
-    holds_data = {}
-    if holds_path.exists():
-        with open(holds_path, 'r', encoding='utf-8') as f:
-            holds_data = json.load(f)
+    # Load existing holds (if any) and routes; hold ids are normalized to lowercase
+    wall = load_wall(wall_path)
 
-    # Find all holds used in routes
-    used_holds = set()
-    with open(routes_path, 'r', encoding='utf-8') as f:
-        routes_db = json.load(f)
-        for route in routes_db.get('routes', []):
-            for move in route.get('moves', []):
-                used_holds.add(move['hold_id'])
-            for foot_hold in route.get('holds', {}).get('foot', []):
-                used_holds.add(foot_hold)
-
-    # Determine missing holds
-    missing_holds = sorted(list(used_holds - set(holds_data.keys())))
+    # Holds used in routes that have no coordinates yet
+    missing_holds = sorted(wall.missing_hold_ids())
 
     if not missing_holds:
         print("✅ All holds used in routes are already defined. Nothing to do.")
@@ -47,6 +36,9 @@ def main(wall_dir):
 
     print(f"Found {len(missing_holds)} missing holds: {', '.join(missing_holds)}")
 
+    # Spatial index over the known holds, used to warn about clicks that land on an existing hold
+    index = GridIndex.from_holds(wall.holds)
+
     # Interactive session to add missing holds
     img = cv2.imread(str(image_path))
     window_name = "Interactive Hold Adder"
@@ -55,6 +47,7 @@ def main(wall_dir):
     
     global click_coords
 
+    added = {}
     for hold_id in missing_holds:
         click_coords = None
         temp_img = img.copy()
@@ -77,12 +70,19 @@ def main(wall_dir):
         if key == ord('q'): # Quit
             break
             
-        holds_data[hold_id] = {'x': click_coords[0], 'y': click_coords[1]}
+        nearby = index.nearest(click_coords[0], click_coords[1], k=1, max_distance=snap_radius)
+        if nearby:
+            print(f"⚠️  Warning: click is only {nearby[0][0]:.0f}px from hold '{nearby[0][1]}'. Is '{hold_id}' the same hold under another id?")
+        added[hold_id] = {'x': click_coords[0], 'y': click_coords[1]}
+        index.add(hold_id, click_coords[0], click_coords[1])
         print(f"Added '{hold_id}' at {click_coords}")
 
     cv2.destroyAllWindows()
 
-    # Save the updated holds data
+    # Save the updated holds data. Only the new holds are added to the file as loaded: existing
+    # entries keep their original keys (including case), so ids are not renamed as a side effect
+    holds_data = load_json(holds_path) if holds_path.exists() else {}
+    holds_data.update(added)
     holds_path.parent.mkdir(parents=True, exist_ok=True)
     with open(holds_path, 'w', encoding='utf-8') as f:
         json.dump(holds_data, f, indent=4, sort_keys=True)
@@ -92,5 +92,6 @@ def main(wall_dir):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Interactively add missing hold coordinates for a specific wall.")
     parser.add_argument("--wall_dir", required=True, help="Path to the wall directory (e.g., 'walls/spray_wall').")
+    parser.add_argument("--snap_radius", type=float, default=15, help="Warn when a click lands within this many pixels of an existing hold.")
     args = parser.parse_args()
-    main(args.wall_dir)
+    main(args.wall_dir, snap_radius=args.snap_radius)
@@ -0,0 +1,281 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，此时不记录内存峰值
+    resource = None
+
+# 各阶段的主指标: 与基线比较的就是这个值 (秒)
+STAGES = {
+    'load':     'seconds',        # wall_data.load_wall: 读取 holds.json / routes.json 并驻留岩点编号
+    'render':   'per_route',      # draw_route.compose_route_image: 绘制一条线路 (不含编码)
+    'encode':   'per_route',      # 一条线路图片的 PNG 编码 (optimize=True，与正式输出一致)
+    'ocr':      'per_megapixel',  # 检测后端识别整张标记图
+    'validate': 'seconds',        # validate_routes.validate_wall: 批量检查所有线路
+}
+DEFAULT_THRESHOLD = 0.25
+# 比基线慢不到这么多秒的不算退化，避免计时抖动让极快的阶段误报
+MIN_REGRESSION_SECONDS = 0.002
+
+_BETA_PHRASES = (
+    '起步时重心放低，双脚踩稳再发力。', '这一步需要侧身贴墙，用髋部靠近岩壁。', '注意换脚，不要急着伸手。',
+    '手臂尽量伸直，用腿推而不是用手拉。', '中段是一个小动态，看准目标点再出手。', '到顶之前保持呼吸节奏，放松前臂。',
+    '用脚尖踩小点，脚跟略微抬起。', '可以尝试挂脚 (heel hook) 来节省手臂力量。', '交叉手之后记得调整身体朝向。',
+    '结束点要双手控制稳定再下攀。', 'Keep your hips close to the wall.', '这条线路适合练习静态移动和平衡。',
+)
+
+
+# --- 合成墙体 ---
+def synthetic_hold_positions(rng, size, count, margin=60):
+    """在图片中随机撒 count 个岩点，相互之间至少隔开一个标签的距离 (拒绝采样，用网格索引查重)。"""
+    from spatial_index import GridIndex
+    width, height = size
+    min_distance = max(12.0, 0.5 * ((width - 2 * margin) * (height - 2 * margin) / count) ** 0.5)
+    index, points = GridIndex(min_distance), []
+    for _ in range(count * 50):
+        if len(points) == count:
+            break
+        x, y = rng.uniform(margin, width - margin), rng.uniform(margin, height - margin)
+        if not index.within(x, y, min_distance):
+            index.add(len(points), x, y); points.append((int(x), int(y)))
+    return points
+
+
+def synthetic_routes(rng, hold_ids, xy, count):
+    """count 条从下往上爬的随机线路: 两个起步点、交替的左右手、一个结束点、若干脚点和中文 beta。"""
+    order = sorted(range(len(hold_ids)), key=lambda i: -xy[i][1])
+    routes = []
+    for n in range(count):
+        length = rng.randint(6, 14)
+        picks = sorted(rng.sample(range(len(order)), min(length + 3, len(order))))
+        moves_idx, feet_idx = picks[:length], picks[length:]
+        moves = [{'hold_id': hold_ids[order[moves_idx[0]]], 'type': 'start', 'hand': 'left'},
+                 {'hold_id': hold_ids[order[moves_idx[1]]], 'type': 'start', 'hand': 'right'}]
+        moves += [{'hold_id': hold_ids[order[i]], 'hand': 'left' if k % 2 == 0 else 'right'} for k, i in enumerate(moves_idx[2:-1])]
+        moves.append({'hold_id': hold_ids[order[moves_idx[-1]]], 'type': 'finish', 'hand': 'both'})
+        routes.append({
+            'routeName': f'Synthetic Route {n + 1}', 'difficulty': f'V{rng.randint(0, 8)}', 'author': 'benchmark',
+            'beta': ''.join(rng.choice(_BETA_PHRASES) for _ in range(rng.randint(2, 6))),
+            'holds': {'foot': [hold_ids[order[i]] for i in feet_idx]}, 'moves': moves,
+        })
+    return routes
+
+
+def make_synthetic_wall(wall_dir, megapixels=2.0, holds=150, routes=10, seed=0, label_font_path='fonts/Oswald-Variable.ttf'):
+    """
+    生成一面合成墙体: 4:3 的底图 (平滑噪声纹理加彩色岩点)、黑底白字 "#编号" 的标记图、
+    holds.json、routes.json 和 config.json。相同的参数和 seed 总是生成相同的墙体。
+    """
+    rng = random.Random(seed)
+    wall_dir = Path(wall_dir)
+    (wall_dir / 'output/data').mkdir(parents=True, exist_ok=True)
+    width = int(round((megapixels * 1e6 * 4 / 3) ** 0.5)); height = int(round(megapixels * 1e6 / width))
+
+    noise = np.random.default_rng(seed).integers(90, 200, (max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    base = Image.fromarray(noise, 'RGB').resize((width, height), Image.BICUBIC)
+    marked = Image.new('RGB', (width, height), (0, 0, 0))
+    base_draw, marked_draw = ImageDraw.Draw(base), ImageDraw.Draw(marked)
+    font = ImageFont.truetype(label_font_path, max(16, int(height / 90)))
+
+    points = synthetic_hold_positions(rng, (width, height), holds)
+    hold_ids = [str(i + 1) for i in range(len(points))]
+    radius = max(6, int(height / 120))
+    for hold_id, (x, y) in zip(hold_ids, points):
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        base_draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+        marked_draw.text((x, y), '#' + hold_id, font=font, fill=(255, 255, 255), anchor='mm')
+    base.save(wall_dir / 'image_base.png'); marked.save(wall_dir / 'image_marked.png')
+
+    with open(wall_dir / 'output/data/holds.json', 'w', encoding='utf-8') as f:
+        json.dump({hold_id: {'x': x, 'y': y} for hold_id, (x, y) in zip(hold_ids, points)}, f, indent=2, sort_keys=True)
+    with open(wall_dir / 'routes.json', 'w', encoding='utf-8') as f:
+        json.dump({'routes': synthetic_routes(rng, hold_ids, points, routes)}, f, ensure_ascii=False, indent=2)
+    with open(wall_dir / 'config.json', 'w', encoding='utf-8') as f:
+        json.dump({'wall_name': wall_dir.name, 'valid_hold_ranges': {'numeric_ranges': [[1, len(points)]]}}, f, indent=2)
+    return wall_dir
+
+
+# --- 计时 ---
+def peak_rss_mb():
+    """进程启动以来的内存峰值 (MB)。Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节。"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def best_of(fn, repeat):
+    """重复 repeat 次，返回 (最短耗时, 最后一次的返回值)。"""
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter(); result = fn(); times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench_load(wall_dir, repeat):
+    from wall_data import load_wall
+    seconds, wall = best_of(lambda: load_wall(wall_dir, with_digest=True), repeat)
+    return {'seconds': seconds}, wall
+
+
+def bench_render(wall, scale, output_dir):
+    """逐条线路计时: 绘制和 PNG 编码分开统计，取每条线路耗时的中位数。"""
+    import draw_route
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state = draw_route._make_render_state(wall.holds, wall.path / 'image_base.png', output_dir, scale)
+    draw_route.warm_sprite_cache(wall.routes, state['holds'], state['fonts'], state['style'], state['sprites'])
+    render_times, encode_times, sizes = [], [], []
+    for route in wall.routes:
+        start = time.perf_counter()
+        image = draw_route.compose_route_image(route, state['holds'], state['base_image'], state['fonts'], state['style'], state['sprites'])
+        middle = time.perf_counter()
+        output_path = output_dir / draw_route.route_output_filename(route)
+        image.save(output_path, 'PNG', optimize=True)
+        render_times.append(middle - start); encode_times.append(time.perf_counter() - middle)
+        sizes.append(output_path.stat().st_size)
+    return ({'per_route': statistics.median(render_times), 'seconds': sum(render_times), 'routes': len(render_times)},
+            {'per_route': statistics.median(encode_times), 'seconds': sum(encode_times), 'mean_bytes': int(statistics.mean(sizes))})
+
+
+def bench_ocr(wall, backend_name, train_wall, repeat):
+    """标记图识别耗时 (按百万像素折算)，同时给出与合成真值比较的召回率，便于发现 "变快但变差" 的改动。"""
+    import cv2
+    from generate_coords import create_backend, detections_to_holds
+    image = cv2.imread(str(wall.path / 'image_marked.png'))
+    backend = create_backend(backend_name, wall.path / 'image_marked.png', train_walls=[train_wall] if train_wall else None)
+    seconds, detections = best_of(lambda: backend.detect_image(image), repeat)
+    megapixels = image.shape[0] * image.shape[1] / 1e6
+    truth, found = wall.holds.coords(), detections_to_holds(detections)
+    correct = sum(1 for k, c in found.items() if k in truth and abs(c['x'] - truth[k]['x']) + abs(c['y'] - truth[k]['y']) <= 40)
+    return {'per_megapixel': seconds / megapixels, 'seconds': seconds, 'recall': round(correct / max(1, len(truth)), 3)}
+
+
+def bench_validate(wall, repeat):
+    from validate_routes import validate_wall
+    seconds, (issues, _) = best_of(lambda: validate_wall(wall), repeat)
+    return {'seconds': seconds, 'issues': len(issues)}
+
+
+def run_benchmarks(options, work_dir):
+    wall_dir = make_synthetic_wall(work_dir / 'bench_wall', options.megapixels, options.holds, options.routes, options.seed)
+    stages = {}
+
+    def record(name, result):
+        result = {key: round(value, 6) if isinstance(value, float) else value for key, value in result.items()}
+        result['peak_rss_mb'] = peak_rss_mb()
+        stages[name] = result
+        print(f"  {name:<9} {STAGES[name]:<14} {result[STAGES[name]] * 1000:10.2f} ms   峰值内存 {result['peak_rss_mb']} MB")
+
+    print(f"合成墙体: {options.megapixels:g} MP, {options.holds} 个岩点, {options.routes} 条线路 -> {wall_dir}")
+    result, wall = bench_load(wall_dir, options.repeat); record('load', result)
+    if 'render' in options.stages or 'encode' in options.stages:
+        render, encode = bench_render(wall, options.scale, wall_dir / 'output/generated_routes')
+        if 'render' in options.stages: record('render', render)
+        if 'encode' in options.stages: record('encode', encode)
+    if 'ocr' in options.stages:
+        train_wall = make_synthetic_wall(work_dir / 'train_wall', options.megapixels, options.holds, 0, options.seed + 1) if options.ocr_backend == 'opencv' else None
+        record('ocr', bench_ocr(wall, options.ocr_backend, train_wall, options.repeat))
+    if 'validate' in options.stages:
+        record('validate', bench_validate(wall, options.repeat))
+    return {
+        'params': {key: getattr(options, key) for key in ('megapixels', 'holds', 'routes', 'seed', 'scale', 'ocr_backend')},
+        'environment': {'python': platform.python_version(), 'machine': platform.machine(), 'system': platform.system()},
+        'stages': stages,
+    }
+
+
+# --- 与基线比较 ---
+def compare_to_baseline(results, baseline, threshold, rss_threshold):
+    """返回 [(阶段, 指标, 基线值, 当前值, 变化比例, 是否退化)]。合成参数不同的基线不可比，返回 None。"""
+    if baseline.get('params') != results['params']:
+        return None
+    rows = []
+    for name, current in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if not base:
+            continue
+        metric = STAGES[name]
+        change = current[metric] / base[metric] - 1 if base[metric] else 0.0
+        regressed = change > threshold and current[metric] - base[metric] > MIN_REGRESSION_SECONDS
+        rows.append((name, metric, base[metric], current[metric], change, regressed))
+    base_rss, rss = max((s.get('peak_rss_mb') or 0 for s in baseline['stages'].values()), default=0), max((s.get('peak_rss_mb') or 0 for s in results['stages'].values()), default=0)
+    if base_rss and rss:
+        change = rss / base_rss - 1
+        rows.append(('peak_rss', 'mb', base_rss, rss, change, change > rss_threshold))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n=== 与基线比较 (阈值 +{threshold:.0%}) ===")
+    for name, metric, base, current, change, regressed in rows:
+        unit, factor = ('MB', 1) if metric == 'mb' else ('ms', 1000)
+        mark = '✗' if regressed else '✓'
+        print(f"{mark} {name:<9} {metric:<14} {base * factor:10.2f} -> {current * factor:10.2f} {unit}  ({change:+.1%})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在合成墙体上测量各阶段耗时和内存峰值，并与基线比较。需要在仓库根目录运行 (使用 fonts/ 下的本地字体，不访问网络)。")
+    parser.add_argument('--megapixels', type=float, default=2.0, help='合成底图的像素数 (百万)。')
+    parser.add_argument('--holds', type=int, default=150, help='合成墙体的岩点数。')
+    parser.add_argument('--routes', type=int, default=10, help='合成墙体的线路数。PNG 编码是最慢的阶段 (每条线路秒级)，线路数决定了总耗时。')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子。')
+    parser.add_argument('--scale', type=float, default=0.5, help='render 阶段的输出比例 (与工作流一致)。')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES), help='要测量的阶段。load 总是执行。')
+    parser.add_argument('--ocr_backend', choices=('opencv', 'easyocr'), default='opencv', help='ocr 阶段的检测后端。opencv 用另一面合成墙体训练，可离线运行；easyocr 需要已下载的模型。')
+    parser.add_argument('--repeat', type=int, default=3, help='load / ocr / validate 重复测量的次数，取最短耗时。')
+    parser.add_argument('--work_dir', type=str, default=None, help='合成墙体的存放目录。默认使用临时目录，运行结束后删除。')
+    parser.add_argument('--output', type=str, default=None, help='把结果另存为 JSON 文件。')
+    parser.add_argument('--baseline', type=str, default=None, help='基线结果 JSON。任一阶段比基线慢超过 --threshold 时以非零状态退出。')
+    parser.add_argument('--save_baseline', action='store_true', help='把本次结果写入 --baseline 指定的文件，作为新的基线。')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='耗时退化阈值 (比例)，默认 0.25 即慢 25%%。')
+    parser.add_argument('--rss_threshold', type=float, default=DEFAULT_THRESHOLD, help='内存峰值退化阈值 (比例)。')
+    args = parser.parse_args()
+
+    font_paths = ['fonts/Oswald-Variable.ttf', 'fonts/NotoSansSC[wght].ttf']
+    missing_fonts = [p for p in font_paths if not Path(p).exists()]
+    if missing_fonts:
+        print(f"错误: 字体文件未找到: {', '.join(missing_fonts)}。请在仓库根目录运行，并把字体放到 'fonts/' 目录下。", file=sys.stderr)
+        sys.exit(1)
+    if args.save_baseline and not args.baseline:
+        parser.error('--save_baseline 需要同时指定 --baseline')
+
+    if args.work_dir:
+        results = run_benchmarks(args, Path(args.work_dir))
+    else:
+        with tempfile.TemporaryDirectory(prefix='wall_bench_') as tmp:
+            results = run_benchmarks(args, Path(tmp))
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline and args.save_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存: {args.baseline}")
+    elif args.baseline:
+        if not Path(args.baseline).exists():
+            print(f"\n⚠️  基线文件 {args.baseline} 不存在，跳过比较。可以用 --save_baseline 生成。", file=sys.stderr)
+            sys.exit(0)
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            rows = compare_to_baseline(results, json.load(f), args.threshold, args.rss_threshold)
+        if rows is None:
+            print("\n⚠️  基线的合成参数与本次不同，无法比较。请用相同参数重新生成基线。", file=sys.stderr)
+            sys.exit(1)
+        print_comparison(rows, args.threshold)
+        regressions = [row[0] for row in rows if row[-1]]
+        if regressions:
+            print(f"\n::error::性能退化: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+        print("\n✅  没有超过阈值的退化。")
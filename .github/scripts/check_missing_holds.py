@@ -1,11 +1,12 @@
-import json
 import argparse
 from pathlib import Path
 import sys
+from wall_data import expected_hold_ids, load_config, load_holds
 
-def check_holds(wall_dir_str: str):
+def check_holds(wall_dir_str: str, holds=None):
     """
-    为一个指定的墙体检查是否有岩点缺失。
+    为一个指定的墙体检查是否有岩点缺失，返回缺失的岩点编号列表 (跳过检查时返回 None)。
+    holds 可以传入已经读取好的 wall_data.HoldTable。
     """
     wall_dir = Path(wall_dir_str)
     
@@ -16,16 +17,13 @@ def check_holds(wall_dir_str: str):
         print(f"⚠️  警告: 墙体 '{wall_dir.name}' 的配置文件不存在。跳过检查。", file=sys.stderr)
         return
 
-    if not holds_path.exists():
+    if holds is None and not holds_path.exists():
         print(f"⚠️  警告: 墙体 '{wall_dir.name}' 的岩点坐标文件不存在。跳过检查。", file=sys.stderr)
         return
 
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = json.load(f)
-    
-    with open(holds_path, 'r', encoding='utf-8') as f:
-        # 将所有检测到的岩点ID转为小写，以便进行不区分大小写的比较
-        detected_holds = {str(h).lower() for h in json.load(f).keys()}
+    config = load_config(wall_dir)
+    # 岩点编号在读取时已统一为小写，可以直接进行不区分大小写的比较
+    detected_holds = set((holds if holds is not None else load_holds(holds_path)).coords())
 
     wall_name = config.get("wall_name", wall_dir.name)
     
@@ -39,20 +37,8 @@ def check_holds(wall_dir_str: str):
 
     print(f"\n--- 正在为墙体检查缺失的岩点: {wall_name} ---")
 
-    expected_holds = set()
-    
-    # 2. 分别处理 "numeric_ranges"
-    numeric_ranges = expected_config.get("numeric_ranges", [])
-    for start, end in numeric_ranges:
-        for i in range(start, end + 1):
-            expected_holds.add(str(i))
-            
-    # 3. 分别处理 "alphabetic_ranges"
-    alphabetic_ranges = expected_config.get("alphabetic_ranges", [])
-    for start_char, end_char in alphabetic_ranges:
-        for i in range(ord(start_char.lower()), ord(end_char.lower()) + 1):
-            expected_holds.add(chr(i))
-    # --- 修复结束 ---
+    # 2. numeric_ranges 和 alphabetic_ranges 的展开见 wall_data.expected_hold_ids
+    expected_holds = expected_hold_ids(config)
 
     if not expected_holds:
         print(f"ℹ️  信息: 'valid_hold_ranges' 中未定义任何范围。无需检查。")
@@ -71,6 +57,7 @@ def check_holds(wall_dir_str: str):
         # sys.exit(1)
 
     print("-" * (42 + len(wall_name)))
+    return missing_holds
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="检查一个或多个攀岩墙是否有缺失的岩点。")
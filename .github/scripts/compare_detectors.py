@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import sys
+from generate_coords import BACKENDS, create_backend, detections_to_holds
+
+
+def score_holds(detected, reference, tolerance):
+    """
+    把识别结果与参考坐标 (holds.json) 比较。编号相同且中心距离不超过 tolerance 像素算正确。
+    返回 (正确数, 识别数, 参考数, 正确岩点的位置误差列表)。
+    """
+    errors = []
+    for hold_id, coord in detected.items():
+        ref = reference.get(hold_id)
+        if ref is None:
+            continue
+        distance = float(np.hypot(coord['x'] - ref['x'], coord['y'] - ref['y']))
+        if distance <= tolerance:
+            errors.append(distance)
+    return len(errors), len(detected), len(reference), errors
+
+
+def compare_wall(wall_dir, backend_name, walls_root, tolerance, leave_one_out):
+    image_path, holds_path = wall_dir / 'image_marked.png', wall_dir / 'output/data/holds.json'
+    with open(holds_path, 'r', encoding='utf-8') as f:
+        reference = {str(k).lower(): v for k, v in json.load(f).items()}
+    image = cv2.imread(str(image_path))
+    train_walls = None
+    if backend_name == 'opencv' and leave_one_out:
+        # 留一法: 不用被测墙体自己的标注训练，更接近给一面新墙生成坐标的情形
+        train_walls = [p for p in sorted(walls_root.iterdir()) if p.resolve() != wall_dir.resolve() and (p / 'output/data/holds.json').exists()]
+    start = time.perf_counter()
+    backend = create_backend(backend_name, image_path, train_walls=train_walls)
+    detected = detections_to_holds(backend.detect_image(image))
+    elapsed = time.perf_counter() - start
+    correct, found, expected, errors = score_holds(detected, reference, tolerance)
+    return {
+        'wall': wall_dir.name, 'backend': backend_name + (' (留一法)' if train_walls is not None else ''),
+        'precision': correct / found if found else 0.0, 'recall': correct / expected if expected else 0.0,
+        'median_error': float(np.median(errors)) if errors else None, 'seconds': elapsed,
+        'missing': sorted(set(reference) - {k for k in detected if k in reference and np.hypot(detected[k]['x'] - reference[k]['x'], detected[k]['y'] - reference[k]['y']) <= tolerance}),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在已有 holds.json 的墙体上比较各检测后端的准确率和耗时。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help='要比较的墙体目录。默认 walls/ 下所有带 holds.json 的墙体。')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--tolerance', type=float, default=40, help='坐标与参考坐标的最大允许距离 (像素)。')
+    parser.add_argument('--leave_one_out', action='store_true', help='opencv 后端不使用被测墙体自己的标注训练。')
+    parser.add_argument('--json', type=str, default=None, help='把比较结果另存为 JSON 文件。')
+    args = parser.parse_args()
+
+    walls_root = Path('walls')
+    wall_dirs = [Path(p) for p in args.wall_dirs] or [p for p in sorted(walls_root.iterdir()) if (p / 'output/data/holds.json').exists()]
+    results = []
+    for wall_dir in wall_dirs:
+        for backend_name in args.backends:
+            try:
+                result = compare_wall(wall_dir, backend_name, walls_root, args.tolerance, args.leave_one_out)
+            except ImportError as e:
+                print(f"⚠️  跳过后端 {backend_name}: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+            error = f"{result['median_error']:.1f}px" if result['median_error'] is not None else '-'
+            print(f"{result['wall']:<12} {result['backend']:<16} 精确率 {result['precision']:6.1%}  召回率 {result['recall']:6.1%}  "
+                  f"位置误差中位数 {error:>7}  耗时 {result['seconds']:6.2f}s")
+            if result['missing']:
+                print(f"    未正确识别 ({len(result['missing'])}): {', '.join(result['missing'][:40])}{' ...' if len(result['missing']) > 40 else ''}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,208 @@
+import json
+from pathlib import Path
+import cv2
+import numpy as np
+
+# 每个字符缩放到 GLYPH_SIZE 见方后作为特征
+GLYPH_SIZE = 16
+# 标签的起始符号。它本身也作为一个类别参与分类，用来切开挨在一起的两个标签 (例如 "#88#89")
+LABEL_PREFIX = '#'
+
+
+def binarize(image):
+    """标记图是黑底白字；如果是白底黑字则先反色。"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if gray.mean() > 127:
+        gray = 255 - gray
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def split_touching(binary, box, max_aspect=1.1):
+    """小字号时相邻字符会粘连成一个连通域 (例如 "#1"、"22")：在中间区域投影最少的列处递归切开。"""
+    x0, y0, x1, y1 = box
+    width, height = x1 - x0, y1 - y0
+    if width <= max_aspect * height or width < 4:
+        return [box]
+    projection = (binary[y0:y1, x0:x1] > 0).sum(axis=0)
+    lo, hi = int(width * 0.3), max(int(width * 0.7), int(width * 0.3) + 1)
+    cut = x0 + lo + int(projection[lo:hi].argmin())
+    return split_touching(binary, (x0, y0, cut, y1), max_aspect) + split_touching(binary, (cut, y0, x1, y1), max_aspect)
+
+
+def find_glyphs(binary, max_height=80, min_area=3):
+    """
+    找出所有字符的外接框 (x0, y0, x1, y1)。横向重叠的上下两部分 (例如 i、j 的点) 合并为一个字符，
+    粘连的字符被切开，过高或过宽的连通域 (例如图上的分隔线) 被丢弃。
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    boxes = sorted((int(x), int(y), int(x + w), int(y + h)) for x, y, w, h, area in stats[1:count] if area >= min_area)
+    merged = []
+    for box in boxes:
+        # boxes 按 x0 排序，只需要回看左边界足够近的已合并框
+        for i in range(len(merged) - 1, -1, -1):
+            other = merged[i]
+            if other[0] < box[0] - max_height:
+                merged.append(box)
+                break
+            overlap = min(box[2], other[2]) - max(box[0], other[0])
+            gap = max(box[1], other[1]) - min(box[3], other[3])
+            if overlap >= 0.5 * min(box[2] - box[0], other[2] - other[0]) and gap <= 0.5 * max(box[3] - box[1], other[3] - other[1]):
+                merged[i] = (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+                break
+        else:
+            merged.append(box)
+    glyphs = []
+    for box in merged:
+        if box[3] - box[1] <= max_height and box[2] - box[0] <= 4 * max_height:
+            glyphs.extend(g for g in split_touching(binary, box) if g[2] - g[0] <= max_height)
+    return glyphs
+
+
+def group_glyphs(glyphs):
+    """按从左到右的顺序把同一行上间距很小的字符归为一组，返回字符框列表的列表。"""
+    groups, open_groups = [], []
+    for glyph in sorted(glyphs):
+        height = glyph[3] - glyph[1]
+        # 右端已经离得很远的组不可能再接上新字符
+        open_groups = [g for g in open_groups if g[-1][2] >= glyph[0] - 4 * height]
+        for group in open_groups:
+            last = group[-1]
+            top, bottom = min(g[1] for g in group), max(g[3] for g in group)
+            line_height = bottom - top
+            vertical_overlap = min(glyph[3], bottom) - max(glyph[1], top)
+            if -2 <= glyph[0] - last[2] <= 0.6 * line_height and vertical_overlap >= 0.5 * min(height, line_height):
+                group.append(glyph)
+                break
+        else:
+            groups.append([glyph]); open_groups.append(groups[-1])
+    return groups
+
+
+def _bounds(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def glyph_features(binary, glyph, line_height):
+    """字符图像按长边补成正方形后缩放到 GLYPH_SIZE，再附加宽高比和相对行高两个形状特征。"""
+    x0, y0, x1, y1 = glyph
+    crop = binary[y0:y1, x0:x1]
+    h, w = crop.shape
+    side = max(h, w)
+    square = np.zeros((side, side), np.uint8)
+    square[(side - h) // 2:(side - h) // 2 + h, (side - w) // 2:(side - w) // 2 + w] = crop
+    pixels = cv2.resize(square, (GLYPH_SIZE, GLYPH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32).ravel() / 255
+    return np.concatenate([pixels, [2 * w / h, 2 * h / max(1, line_height)]]).astype(np.float32)
+
+
+class GlyphClassifier:
+    """最近邻 (kNN) 字符分类器，样本来自已有 holds.json 中标注好的岩点标签。"""
+
+    def __init__(self, features, labels, k=3):
+        self.features = np.asarray(features, np.float32)
+        self.labels = np.asarray(labels)
+        self.k = min(k, len(self.labels))
+        self._sq_norms = (self.features ** 2).sum(axis=1)
+
+    def predict(self, features):
+        """返回 (字符数组, 置信度数组)。置信度为 k 个近邻中投给该字符的比例。"""
+        features = np.asarray(features, np.float32)
+        distances = self._sq_norms[None, :] - 2 * features @ self.features.T
+        nearest = np.argpartition(distances, self.k - 1, axis=1)[:, :self.k]
+        chars, probs = [], []
+        for row in self.labels[nearest]:
+            values, counts = np.unique(row, return_counts=True)
+            chars.append(values[counts.argmax()]); probs.append(counts.max() / self.k)
+        return np.array(chars), np.array(probs)
+
+
+def _group_samples(binary, holds, tolerance=20):
+    """把 holds.json 中的每个岩点与中心最近的字符组对应起来，组内字符数与标签长度一致时产出训练样本。"""
+    groups = group_glyphs(find_glyphs(binary))
+    if not groups:
+        return
+    centers = np.array([((b[0] + b[2]) / 2, (b[1] + b[3]) / 2) for b in map(_bounds, groups)])
+    for hold_id, coord in holds.items():
+        distances = np.hypot(centers[:, 0] - coord['x'], centers[:, 1] - coord['y'])
+        index = int(distances.argmin())
+        if distances[index] > tolerance:
+            continue
+        group = groups[index]
+        text = str(hold_id).lower()
+        if len(group) == len(text) + 1:
+            text = LABEL_PREFIX + text
+        elif len(group) != len(text):
+            continue
+        line_height = _bounds(group)[3] - _bounds(group)[1]
+        for glyph, char in zip(group, text):
+            yield glyph_features(binary, glyph, line_height), char
+
+
+def train_classifier(training_sets, k=3):
+    """training_sets: [(标记图路径, holds.json 路径), ...]。返回 GlyphClassifier。"""
+    features, labels = [], []
+    for image_path, holds_path in training_sets:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        with open(holds_path, 'r', encoding='utf-8') as f:
+            holds = json.load(f)
+        for feature, char in _group_samples(binarize(image), holds):
+            features.append(feature); labels.append(char)
+    if not labels:
+        raise ValueError("没有可用的训练样本: 请提供至少一个带 holds.json 的标记图。")
+    return GlyphClassifier(features, labels, k=k)
+
+
+def discover_training_sets(walls_root, exclude=()):
+    """walls/ 下所有同时有 image_marked.png 和 output/data/holds.json 的墙体。"""
+    exclude = {Path(p).resolve() for p in exclude}
+    sets = []
+    for wall_dir in sorted(Path(walls_root).iterdir()):
+        image_path, holds_path = wall_dir / 'image_marked.png', wall_dir / 'output/data/holds.json'
+        if wall_dir.is_dir() and wall_dir.resolve() not in exclude and image_path.exists() and holds_path.exists():
+            sets.append((image_path, holds_path))
+    return sets
+
+
+class OpenCVLabelBackend:
+    """
+    只依赖 OpenCV 的标签检测后端: 二值化 → 连通域找字符 → 按行距归组 → kNN 逐字符分类，
+    以 '#' 为界切分标签。不需要导入 torch，几秒内即可处理一面墙。
+    """
+    name = 'opencv'
+
+    def __init__(self, training_sets, k=3, require_prefix=True):
+        self.classifier = train_classifier(training_sets, k=k)
+        # 真正的标签总以 '#' 开头；不以 '#' 开头的字符组多半是图上的其他笔画
+        self.require_prefix = require_prefix
+
+    def detect_image(self, image):
+        return self.detect(image)
+
+    def detect(self, image, offset=(0, 0)):
+        binary = binarize(image)
+        groups = group_glyphs(find_glyphs(binary))
+        if not groups:
+            return []
+        features = []
+        for group in groups:
+            line_height = _bounds(group)[3] - _bounds(group)[1]
+            features.extend(glyph_features(binary, glyph, line_height) for glyph in group)
+        chars, probs = self.classifier.predict(features)
+        detections, i = [], 0
+        for group in groups:
+            labels, current = [], []
+            for glyph in group:
+                if chars[i] == LABEL_PREFIX and current:
+                    labels.append(current); current = []
+                current.append((glyph, chars[i], probs[i])); i += 1
+            labels.append(current)
+            for label in labels:
+                text = ''.join(char for _, char, _ in label if char != LABEL_PREFIX)
+                if not text or (self.require_prefix and label[0][1] != LABEL_PREFIX):
+                    continue
+                x0, y0, x1, y1 = _bounds([glyph for glyph, _, _ in label])
+                x0, x1, y0, y1 = x0 + offset[0], x1 + offset[0], y0 + offset[1], y1 + offset[1]
+                detections.append((text, (x0 + x1) // 2, (y0 + y1) // 2, float(min(p for _, _, p in label)), (x0, y0, x1, y1)))
+        return detections
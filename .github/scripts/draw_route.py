@@ -1,14 +1,26 @@
+import io
 import json
 import math
+import multiprocessing
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
 import argparse
+import os
 import re
 import sys
-import textwrap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from marker_sprites import SpriteCache, composite_sprite
+from text_layout import layout_text
+from render_manifest import manifest_path_for, load_manifest, save_manifest, update_manifest, shared_inputs_digest, route_digest, prune_stale_outputs, keep_failed_entries
+from wall_data import MOVE_STYLES, Route, iter_routes, load_holds, route_digests_at_revision, route_selector
+from overlay_viewer import LAYER_INFO_KEY, OVERLAY_BASE_FILENAME, write_viewer
+from image_encoders import DEFAULT_ENCODER, OUTPUT_EXTENSIONS, ImageEncoder
+import tracing
+from tracing import annotate, span
 
 # --- 样式配置 ---
-# 【修改】减小了 beta_text_style 的 wrap_width
+# 标题和 beta 文字按像素宽度自动换行 (见 text_layout.py)，可用宽度为图片宽度减去两侧的 margin / padding_x
 STYLE_CONFIG = {
     'start':       {'outline': (76, 175, 80, 255),  'shape': 'rectangle', 'text_color': (255, 255, 255)},
     'finish':      {'outline': (244, 67, 54, 255),  'shape': 'rectangle', 'text_color': (255, 255, 255)},
@@ -22,7 +34,7 @@ STYLE_CONFIG = {
     'title_style': {
         'font_path': "fonts/Oswald-Variable.ttf", 'font_size': 75, 'font_variation': 700, 
         'fill_color': (255, 255, 255), 'outline_color': (0, 0, 0), 'outline_width': 4, 'margin': 60,
-        'wrap_width': 45, 'line_spacing': 10
+        'line_spacing': 10
     },
     'main_font_style': {
         'font_path': "fonts/Oswald-Variable.ttf", 'font_size': 50, 'font_variation': 700 
@@ -30,16 +42,45 @@ STYLE_CONFIG = {
     'beta_text_style': {
         'font_path': "fonts/NotoSansSC[wght].ttf", 'font_size': 40, 'font_variation': 700,
         'fill_color': (255, 255, 255), 'background_color': (0, 0, 0),
-        'padding_x': 50, 'padding_y': 40, 'line_spacing': 15, 'wrap_width': 35 # 从 80 减小到 35
+        'padding_x': 50, 'padding_y': 40, 'line_spacing': 15,
+        'title_spacing': 30 # 标题和beta之间的额外间距
     }
 }
+# 以原图分辨率为基准的样式，不会被修改；按输出比例缩放后的版本由 style_for_scale() 生成，
+# 通过各绘制函数的 style_config 参数传递，多面墙可以在同一进程中以不同比例同时绘制
+BASE_STYLE_CONFIG = STYLE_CONFIG
+
+# 随输出比例一起缩放的像素尺寸
+SCALED_STYLE_KEYS = {
+    'radius', 'outline_width', 'text_offset', 'font_size', 'text_outline_width', 'center_dot_radius',
+    'arrow_width', 'arrowhead_length', 'center_offset_x', 'center_offset_y',
+    'margin', 'line_spacing', 'padding_x', 'padding_y', 'title_spacing',
+}
+
+def scale_style_config(style_config, factor):
+    scaled = {}
+    for key, value in style_config.items():
+        if isinstance(value, dict): scaled[key] = scale_style_config(value, factor)
+        elif key in SCALED_STYLE_KEYS: scaled[key] = max(1, round(value * factor)) if value > 0 else round(value * factor)
+        else: scaled[key] = value
+    return scaled
+
+def style_for_scale(factor):
+    return BASE_STYLE_CONFIG if factor == 1 else scale_style_config(BASE_STYLE_CONFIG, factor)
+
+def resolve_output_scale(image_size, scale=1.0, max_width=None):
+    """输出比例: 先按 scale 缩放，若宽度仍超过 max_width 则继续缩小到 max_width。"""
+    width, _ = image_size
+    if max_width and width * scale > max_width: scale = max_width / width
+    return scale
 
 # --- 辅助函数 ---
-def draw_arrow(draw, start_xy, end_xy):
-    x1, y1 = start_xy; x2, y2 = end_xy; draw.line([start_xy, end_xy], fill=STYLE_CONFIG['arrow_color'], width=STYLE_CONFIG['arrow_width'])
-    angle = math.atan2(y2 - y1, x2 - x1); length = STYLE_CONFIG['arrowhead_length']; head_angle = math.radians(STYLE_CONFIG['arrowhead_angle'])
+def draw_arrow(draw, start_xy, end_xy, color=None, style_config=STYLE_CONFIG):
+    color = color or style_config['arrow_color']
+    x1, y1 = start_xy; x2, y2 = end_xy; draw.line([start_xy, end_xy], fill=color, width=style_config['arrow_width'])
+    angle = math.atan2(y2 - y1, x2 - x1); length = style_config['arrowhead_length']; head_angle = math.radians(style_config['arrowhead_angle'])
     p1 = (x2 + length * math.cos(angle + math.pi - head_angle), y2 + length * math.sin(angle + math.pi - head_angle)); p2 = (x2 + length * math.cos(angle + math.pi + head_angle), y2 + length * math.sin(angle + math.pi + head_angle))
-    draw.polygon([end_xy, p1, p2], fill=STYLE_CONFIG['arrow_color'])
+    draw.polygon([end_xy, p1, p2], fill=color)
 
 def draw_text_with_outline(draw, position, text, font, fill_color, outline_color, outline_width):
     x, y = position
@@ -48,145 +89,205 @@ def draw_text_with_outline(draw, position, text, font, fill_color, outline_color
             if i != 0 or j != 0: draw.text((x + i, y + j), text, font=font, fill=outline_color)
     draw.text(position, text, font=font, fill=fill_color)
 
-def draw_hold(draw, center_xy, style, text=None, font=None):
-    x, y = center_xy; radius = STYLE_CONFIG['radius']; box = [x - radius, y - radius, x + radius, y + radius]
-    if style.get('shape') == 'rectangle': draw.rectangle(box, outline=style['outline'], width=STYLE_CONFIG['outline_width'])
-    else: draw.ellipse(box, outline=style['outline'], width=STYLE_CONFIG['outline_width'])
-    dot_radius = STYLE_CONFIG['center_dot_radius']; dot_box = [x - dot_radius, y - dot_radius, x + dot_radius, y + dot_radius]
-    draw.ellipse(dot_box, fill=STYLE_CONFIG['center_dot_color'])
+# 岩点标记 (圆圈/方框、中心点和标签) 的精灵缓存，同一种标记只光栅化一次。
+# 这是单独调用绘制函数时的默认缓存；process_all_routes 每次运行使用自己的缓存
+SPRITE_CACHE = SpriteCache()
+
+def _marker_key(style_key, text, font, style_config):
+    # 键中包含样式本身和当前的像素尺寸，缩放比例或颜色变化后不会误用旧的精灵
+    geometry = tuple(style_config[k] for k in ('radius', 'outline_width', 'text_offset', 'text_outline_width', 'center_dot_radius', 'center_dot_color'))
+    font_key = (getattr(font, 'path', None), font.size) if text and font else None
+    return (style_key, text if font_key else None, font_key, geometry, tuple(sorted(style_config[style_key].items())))
+
+def render_marker_sprite(style, text=None, font=None, style_config=STYLE_CONFIG):
+    """把一个岩点标记画到透明小图上，返回 (sprite, 锚点)。锚点是岩点中心在小图中的坐标。"""
+    radius = style_config['radius']; dot_radius = style_config['center_dot_radius']; offset = style_config['text_offset']; stroke = style_config['text_outline_width']
+    left, top, right, bottom = -radius, -radius, radius + 1, radius + 1
+    if text and font:
+        # 描边是把文字向 8 个方向偏移 stroke 像素各画一次，范围是文字本身的边界框向外扩 stroke
+        tl, tt, tr, tb = font.getbbox(text); tl, tt, tr, tb = tl - stroke, tt - stroke, tr + stroke, tb + stroke
+        left, top, right, bottom = min(left, offset + tl), min(top, -offset + tt), max(right, offset + tr), max(bottom, -offset + tb)
+    sprite = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    x, y = -left, -top; box = [x - radius, y - radius, x + radius, y + radius]
+    # 与箭头相同: 早期版本直接画进 RGBA 底图，脚点边框和中心点颜色的 alpha 在粘贴到 RGB 画布时被丢弃，
+    # 所以它们一直是不透明的；精灵做 alpha 合成，这里显式使用不透明的颜色
+    outline = style['outline'][:3] + (255,); dot_color = style_config['center_dot_color'][:3] + (255,)
+    if style.get('shape') == 'rectangle': draw.rectangle(box, outline=outline, width=style_config['outline_width'])
+    else: draw.ellipse(box, outline=outline, width=style_config['outline_width'])
+    draw.ellipse([x - dot_radius, y - dot_radius, x + dot_radius, y + dot_radius], fill=dot_color)
     if text and font:
-        text_pos_x = x + STYLE_CONFIG['text_offset']; text_pos_y = y - STYLE_CONFIG['text_offset']
-        draw_text_with_outline(draw, (text_pos_x, text_pos_y), text, font, fill_color=style['text_color'], outline_color=(0, 0, 0, 255), outline_width=STYLE_CONFIG['text_outline_width'])
-
-def get_wrapped_text_size(draw, text, font, wrap_width, line_spacing):
-    all_lines = []
-    for part in text.split('\n'):
-        all_lines.extend(textwrap.wrap(part, width=wrap_width, replace_whitespace=False))
-    
-    max_line_width, total_text_height = 0, 0
-    if not all_lines: return 0, 0
-
-    for line in all_lines:
-        try: line_bbox = draw.textbbox((0, 0), line, font=font)
-        except AttributeError: line_bbox = font.getbbox(line)
-        line_width = line_bbox[2] - line_bbox[0]; line_height = line_bbox[3] - line_bbox[1]
-        if line_width > max_line_width: max_line_width = line_width
-        total_text_height += line_height
-    total_text_height += line_spacing * (len(all_lines) - 1)
-    return max_line_width, total_text_height
+        draw_text_with_outline(draw, (x + offset, y - offset), text, font, fill_color=style['text_color'], outline_color=(0, 0, 0, 255), outline_width=stroke)
+    return sprite, (x, y)
+
+def get_marker_sprite(style_key, text=None, font=None, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    return sprites.get(_marker_key(style_key, text, font, style_config), lambda: render_marker_sprite(style_config[style_key], text, font, style_config))
+
+def draw_hold(image, center_xy, style_key, text=None, font=None, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    sprite, (anchor_x, anchor_y) = get_marker_sprite(style_key, text, font, style_config, sprites)
+    composite_sprite(image, sprite, round(center_xy[0]) - anchor_x, round(center_xy[1]) - anchor_y)
+
+def iter_route_markers(route, holds, style_config=STYLE_CONFIG):
+    """按绘制顺序产出 (中心坐标, 样式键, 标签文字)。脚点在前，标签为 None；未定义坐标的岩点会被跳过。"""
+    offset = (style_config.get('center_offset_x', 0), style_config.get('center_offset_y', 0))
+    # 一次取出整条线路的坐标 (数组下标访问)，NaN 表示该岩点没有坐标
+    for x, y in holds.xy[route.feet] + offset:
+        if x == x: yield (x, y), 'foot', None
+    for (x, y), style, text_to_draw in zip(holds.xy[route.moves] + offset, route.styles, route.labels):
+        if x == x: yield (x, y), MOVE_STYLES[style] if style >= 0 else None, text_to_draw
+
+def warm_sprite_cache(routes, holds, fonts, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    """预先生成这批线路用到的全部标记精灵，工作进程拿到的缓存因此全部命中。"""
+    for route in routes:
+        for _, style_key, text in iter_route_markers(route, holds, style_config):
+            if style_key in style_config: get_marker_sprite(style_key, text, fonts['main'] if text else None, style_config, sprites)
+
+def draw_text_block(draw, block, font, origin, box_width, align, fill_color, outline_color=None, outline_width=0):
+    """在 origin 处按 layout_text() 的结果逐行绘制文字，align 为 'left'、'center' 或 'right'。"""
+    box_x, y = origin
+    for line in block.lines:
+        if align == 'left': x = box_x
+        elif align == 'center': x = box_x + (box_width - line.width) / 2 - line.bbox[0]
+        else: x = box_x + box_width - line.width - line.bbox[0]
+        if outline_width: draw_text_with_outline(draw, (x, y), line.text, font, fill_color, outline_color, outline_width)
+        else: draw.text((x, y), line.text, font=font, fill=fill_color)
+        y += block.line_height + block.line_spacing
 
 def draw_wrapped_title(draw, text, font, style, image_size):
-    img_width, _ = image_size; margin = style['margin']; line_spacing = style['line_spacing']
-    
-    lines = []
-    for part in text.split('\n'):
-        lines.extend(textwrap.wrap(part, width=style['wrap_width'], replace_whitespace=False))
-
-    block_width, block_height = get_wrapped_text_size(draw, text, font, style['wrap_width'], line_spacing)
-    start_x = img_width - block_width - margin; start_y = margin
-    current_y = start_y
-    for line in lines:
-        try: line_bbox = draw.textbbox((0, 0), line, font=font)
-        except AttributeError: line_bbox = font.getbbox(line)
-        line_height = line_bbox[3] - line_bbox[1]
-        line_width = line_bbox[2] - line_bbox[0]; line_x = start_x + (block_width - line_width) # Right align
-        draw_text_with_outline(draw, (line_x, current_y), line, font, style['fill_color'], style['outline_color'], style['outline_width'])
-        current_y += line_height + line_spacing
-
-def draw_single_route_image(route_data, holds_coords, base_image, fonts, output_dir):
-    image_part = base_image.copy()
-    draw = ImageDraw.Draw(image_part, "RGBA")
-    offset_x, offset_y = STYLE_CONFIG.get('center_offset_x', 0), STYLE_CONFIG.get('center_offset_y', 0)
-    
-    title_style = STYLE_CONFIG['title_style']
-    route_name = route_data.get('routeName', route_data.get('name', 'N/A'))
-    difficulty = route_data.get('difficulty', route_data.get('grade', 'N/A'))
-    author = route_data.get('author', 'N/A')
-    route_info_text = f"{route_name} | {difficulty}"
-    
-    # 标题现在画在底部扩展区域，所以这里先不画
-
-    if 'holds' in route_data and 'foot' in route_data['holds']:
-        for hold_id in route_data['holds']['foot']:
-            if str(hold_id).lower() in holds_coords:
-                draw_hold(draw, (holds_coords[str(hold_id).lower()]['x'] + offset_x, holds_coords[str(hold_id).lower()]['y'] + offset_y), STYLE_CONFIG['foot'])
-    
-    prev_coords = None
-    if 'moves' in route_data:
-        for move in route_data['moves']:
-            hold_id_str = str(move['hold_id']).lower()
-            if hold_id_str in holds_coords:
-                center_xy = (holds_coords[hold_id_str]['x'] + offset_x, holds_coords[hold_id_str]['y'] + offset_y)
-                style_key = 'start' if move.get('type') == 'start' else 'finish' if move.get('type') == 'finish' else f"{move.get('hand')}_hand"
-                style = STYLE_CONFIG.get(style_key)
-                text_to_draw = move.get('text') or (move.get('type') or move.get('hand', ''))[0].upper()
-                if style:
-                    draw_hold(draw, center_xy, style, text_to_draw, fonts['main'])
-                if prev_coords:
-                    draw_arrow(draw, prev_coords, center_xy)
-                prev_coords = center_xy
-    
-    # --- 组合最终图片 ---
-    final_image = image_part
-    beta_text = route_data.get('beta', "")
-    
-    # 创建一个临时的画布来计算所有文本需要的高度
-    temp_draw = ImageDraw.Draw(Image.new('RGB', (1,1)))
-    title_style = STYLE_CONFIG['title_style']
-    beta_style = STYLE_CONFIG['beta_text_style']
-    
-    _, title_height = get_wrapped_text_size(temp_draw, route_info_text, fonts['title'], title_style['wrap_width'], title_style['line_spacing'])
-    _, beta_height = get_wrapped_text_size(temp_draw, beta_text, fonts['beta'], beta_style['wrap_width'], beta_style['line_spacing'])
-    
-    padding_top = beta_style['padding_y']
-    padding_bottom = beta_style['padding_y']
-    title_beta_spacing = 30 # 标题和beta之间的额外间距
-    
-    extra_height = title_height + beta_height + padding_top + padding_bottom + title_beta_spacing
-    
-    orig_width, orig_height = image_part.size
-    new_width, new_height = orig_width, orig_height + int(extra_height)
-    final_image = Image.new('RGB', (new_width, new_height), beta_style['background_color'])
-    
-    final_image.paste(image_part, (0, 0))
-    
-    # 在底部黑色区域绘制标题和beta
-    text_draw = ImageDraw.Draw(final_image)
-    
-    # 绘制标题 (居中)
-    current_y = orig_height + padding_top
-    title_lines = []
-    for part in route_info_text.split('\n'):
-        title_lines.extend(textwrap.wrap(part, width=title_style['wrap_width']))
-    
-    for line in title_lines:
-        try: line_bbox = text_draw.textbbox((0, 0), line, font=fonts['title'])
-        except AttributeError: line_bbox = fonts['title'].getbbox(line)
-        line_width = line_bbox[2] - line_bbox[0]
-        line_height = line_bbox[3] - line_bbox[1]
-        pos_x = (new_width - line_width) / 2
-        draw_text_with_outline(text_draw, (pos_x, current_y), line, fonts['title'], title_style['fill_color'], title_style['outline_color'], title_style['outline_width'])
-        current_y += line_height + title_style['line_spacing']
-        
-    current_y += title_beta_spacing
-    
-    # 【修改】绘制Beta文本（支持手动和自动换行）
-    beta_lines = []
-    for part in beta_text.split('\n'):
-        beta_lines.extend(textwrap.wrap(part, width=beta_style['wrap_width'], replace_whitespace=False))
-
-    for line in beta_lines:
-        try: line_bbox = text_draw.textbbox((0, 0), line, font=fonts['beta'])
-        except AttributeError: line_bbox = fonts['beta'].getbbox(line)
-        line_height = line_bbox[3] - line_bbox[1]
-        text_draw.text((beta_style['padding_x'], current_y), line, font=fonts['beta'], fill=beta_style['fill_color'])
-        current_y += line_height + beta_style['line_spacing']
-
-    safe_filename = re.sub(r'[\\/*?:"<>|]', "", route_name)
-    output_filename = f"{difficulty.replace(' ', '_')}_{safe_filename.replace(' ', '_')}.png"
-    output_path = output_dir / output_filename
-    final_image.save(output_path, 'PNG', optimize=True)
-    print(f"  ✓ Saved: {output_path}")
+    img_width, _ = image_size; margin = style['margin']
+    block = layout_text(text, font, img_width - 2 * margin, style['line_spacing'], style['outline_width'])
+    # 右上角，整块右对齐
+    draw_text_block(draw, block, font, (img_width - block.width - margin, margin), block.width, 'right', style['fill_color'], style['outline_color'], style['outline_width'])
+
+def _draw_route_markers(image, route, holds, fonts, style_config, sprites):
+    """在 image (RGB 画布或透明 RGBA 图层) 上原地绘制一条线路的岩点标记和动作箭头，只改动各标记和箭头覆盖的像素。"""
+    draw = ImageDraw.Draw(image, "RGBA")
+    # 箭头一直是不透明的 (早期版本把它直接写进 RGBA 底图，alpha 随后在粘贴到 RGB 画布时被丢弃)，
+    # 这里显式使用不透明的颜色，RGB 画布和透明图层上的结果一致
+    arrow_color = style_config['arrow_color'][:3] + (255,)
+    with span('draw_holds'):
+        prev_coords = None; markers = 0
+        for center_xy, style_key, text_to_draw in iter_route_markers(route, holds, style_config):
+            markers += 1
+            if style_key == 'foot':
+                draw_hold(image, center_xy, 'foot', style_config=style_config, sprites=sprites)
+                continue
+            if style_key in style_config:
+                draw_hold(image, center_xy, style_key, text_to_draw, fonts['main'], style_config, sprites)
+            if prev_coords:
+                draw_arrow(draw, prev_coords, center_xy, arrow_color, style_config)
+            prev_coords = center_xy
+    annotate(markers=markers)
+
+def _layout_caption(route, fonts, width, style_config):
+    """标题和 beta 各排版一次，计算画布高度和绘制共用同一份结果。返回 (标题, beta, 底部区域高度)。"""
+    title_style = style_config['title_style']; beta_style = style_config['beta_text_style']
+    route_info_text = f"{route.name} | {route.grade}"
+    with span('text_layout'):
+        title_block = layout_text(route_info_text, fonts['title'], width - 2 * title_style['margin'], title_style['line_spacing'], title_style['outline_width'])
+        beta_block = layout_text(route.beta or "", fonts['beta'], width - 2 * beta_style['padding_x'], beta_style['line_spacing'])
+    extra_height = title_block.height + beta_block.height + 2 * beta_style['padding_y'] + beta_style['title_spacing']
+    return title_block, beta_block, int(extra_height)
+
+def _draw_caption(image, title_block, beta_block, fonts, top, style_config):
+    """在 top 以下的底部区域绘制标题 (居中) 和 beta (左对齐，支持手动和自动换行)。"""
+    title_style = style_config['title_style']; beta_style = style_config['beta_text_style']
+    width = image.width
+    with span('draw_text'):
+        text_draw = ImageDraw.Draw(image)
+        current_y = top + beta_style['padding_y']
+        draw_text_block(text_draw, title_block, fonts['title'], (0, current_y), width, 'center', title_style['fill_color'], title_style['outline_color'], title_style['outline_width'])
+        current_y += title_block.height + beta_style['title_spacing']
+        draw_text_block(text_draw, beta_block, fonts['beta'], (beta_style['padding_x'], current_y), width - 2 * beta_style['padding_x'], 'left', beta_style['fill_color'])
+    if tracing.enabled(): annotate(glyphs=sum(len(line.text) - line.text.count(' ') for line in title_block.lines + beta_block.lines))
+
+def compose_route_image(route, holds, base_image, fonts, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    """
+    绘制一条线路的完整图片 (岩点标记、箭头、底部标题和 beta)，返回未编码的 RGB 图像。
+    base_image 是共享的 RGB 底图，只被读取: 最终画布只分配一次，底图直接粘贴进去，之后所有绘制都在画布上原地进行。
+    style_config 是按输出比例缩放后的样式 (见 style_for_scale)，sprites 是标记精灵缓存。
+    """
+    width, height = base_image.size
+    background = style_config['beta_text_style']['background_color']
+    title_block, beta_block, extra_height = _layout_caption(route, fonts, width, style_config)
+    # --- 底图下方扩展出黑色区域放标题和 beta ---
+    with span('extend_canvas'): final_image = Image.new('RGB', (width, height + extra_height), background)
+    with span('copy'): final_image.paste(base_image, (0, 0))
+    _draw_route_markers(final_image, route, holds, fonts, style_config, sprites)
+    # 超出底图下边缘的标记被标题区域盖住 (只重新填充底部区域)
+    final_image.paste(background, (0, height, width, height + extra_height))
+    _draw_caption(final_image, title_block, beta_block, fonts, height, style_config)
+    return final_image
+
+def compose_route_layer(route, holds, base_size, fonts, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    """
+    只绘制线路图层: 在透明画布上画岩点标记、箭头和底部的标题区域，不复制底图。
+    返回 (裁掉透明边缘的 RGBA 图层, 图层在完整画布中的偏移 (x, y), 完整画布尺寸)。
+    把图层按偏移叠加到 (底图 + 底部黑色区域) 上，结果与 compose_route_image 相同。
+    """
+    width, height = base_size
+    title_block, beta_block, extra_height = _layout_caption(route, fonts, width, style_config)
+    with span('extend_canvas'): layer = Image.new('RGBA', (width, height + extra_height), (0, 0, 0, 0))
+    _draw_route_markers(layer, route, holds, fonts, style_config, sprites)
+    # 标题区域在标记之后才填充: 超出底图下边缘的标记会被盖住，与完整图片中被裁掉的效果一致
+    layer.paste(style_config['beta_text_style']['background_color'] + (255,), (0, height, width, height + extra_height))
+    _draw_caption(layer, title_block, beta_block, fonts, height, style_config)
+    bbox = layer.getbbox()
+    return layer.crop(bbox), bbox[:2], layer.size
+
+def compose_route_markers(route, holds, base_size, fonts, region=None, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    """
+    只绘制岩点标记和箭头 (没有底部文字区域)，画布只覆盖这条线路用到的区域，不分配整张底图大小的画布。
+    region=(left, top, right, bottom) 时只绘制底图中的这一块 (例如一行瓦片)。
+    返回 (裁掉透明边缘的 RGBA 图层, 图层左上角在底图中的坐标)；线路没有可绘制的内容时返回 None。
+    """
+    # 箭头在端点附近最多伸出箭头长度或线宽
+    pad = max(style_config['arrowhead_length'], style_config['arrow_width']) + 1
+    left = top = math.inf; right = bottom = -math.inf
+    for (x, y), style_key, text in iter_route_markers(route, holds, style_config):
+        left, top, right, bottom = min(left, x - pad), min(top, y - pad), max(right, x + pad), max(bottom, y + pad)
+        if style_key in style_config:
+            font = None if style_key == 'foot' else fonts['main']
+            sprite, (anchor_x, anchor_y) = get_marker_sprite(style_key, text, font, style_config, sprites)
+            sx, sy = round(x) - anchor_x, round(y) - anchor_y
+            left, top, right, bottom = min(left, sx), min(top, sy), max(right, sx + sprite.width), max(bottom, sy + sprite.height)
+    if left == math.inf: return None
+    left, top = max(0, math.floor(left)), max(0, math.floor(top))
+    right, bottom = min(base_size[0], math.ceil(right)), min(base_size[1], math.ceil(bottom))
+    if region is not None:
+        left, top, right, bottom = max(left, region[0]), max(top, region[1]), min(right, region[2]), min(bottom, region[3])
+    if left >= right or top >= bottom: return None
+    layer = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    # 整数平移不改变任何像素: 标记按取整后的中心定位，箭头的端点只是整体平移
+    _draw_route_markers(layer, route, holds.translated(-left, -top), fonts, style_config, sprites)
+    bbox = layer.getbbox()
+    if bbox is None: return None
+    return layer.crop(bbox), (left + bbox[0], top + bbox[1])
+
+def draw_single_route_image(route, holds, base_image, fonts, output_dir, encoder=None, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    encoder = encoder or ImageEncoder()
+    with span('route', route=route.name, moves=len(route.moves)):
+        final_image = compose_route_image(route, holds, base_image, fonts, style_config, sprites)
+        # 新建的画布不携带任何元数据 (时间戳等)，相同的输入总是编码出相同的字节
+        output_path = output_dir / route_output_filename(route, encoder.extension)
+        with span('encode', encoder=encoder.name): encoder.encode(final_image, output_path)
+        if tracing.enabled(): annotate(bytes=output_path.stat().st_size)
+    return output_path
+
+def draw_single_route_layer(route, holds, base_size, fonts, output_dir, encoder=None, style_config=STYLE_CONFIG, sprites=SPRITE_CACHE):
+    """图层模式: 图层的偏移、完整画布尺寸和线路信息写在 PNG 的文本块 (WebP / AVIF 为 XMP) 里，生成索引时不必解码图片。"""
+    encoder = encoder or ImageEncoder()
+    with span('route', route=route.name, moves=len(route.moves)):
+        layer, offset, canvas_size = compose_route_layer(route, holds, base_size, fonts, style_config, sprites)
+        output_path = output_dir / route_output_filename(route, encoder.extension)
+        info = json.dumps({'offset': list(offset), 'canvas': list(canvas_size), 'route': route.name, 'grade': route.grade, 'author': route.author}, ensure_ascii=False)
+        with span('encode', encoder=encoder.name): encoder.encode(layer, output_path, metadata={LAYER_INFO_KEY: info})
+        if tracing.enabled(): annotate(bytes=output_path.stat().st_size)
+    return output_path
+
+def route_output_filename(route, extension='.png'):
+    safe_filename = re.sub(r'[\\/*?:"<>|]', "", route.name)
+    return f"{route.grade.replace(' ', '_')}_{safe_filename.replace(' ', '_')}{extension}"
 
 def get_variational_font(path, size, variation):
     font = ImageFont.truetype(path, size)
@@ -199,36 +300,239 @@ def get_variational_font(path, size, variation):
              pass
     return font
 
-def process_all_routes(routes_db_path, holds_coords_path, base_image_path, output_dir):
+def load_fonts(style_config=STYLE_CONFIG):
+    """按 style_config 加载主字体、标题字体和 beta 字体。字体文件缺失时抛出 IOError。"""
+    fonts = {}
+    main_style = style_config['main_font_style']; fonts['main'] = get_variational_font(main_style['font_path'], main_style['font_size'], main_style['font_variation'])
+    title_style = style_config['title_style']; fonts['title'] = get_variational_font(title_style['font_path'], title_style['font_size'], title_style['font_variation'])
+    beta_style = style_config['beta_text_style']; fonts['beta'] = get_variational_font(beta_style['font_path'], beta_style['font_size'], beta_style['font_variation'])
+    return fonts
+
+# --- 并行渲染 ---
+# 每个工作进程在初始化时只加载一次底图和字体，之后的每条线路都复用它们。
+# 串行绘制 (workers <= 1) 时状态保存在调用方的局部变量中，不使用这个全局字典，
+# 因此 run_all.py 可以在多个线程中同时绘制多面墙。
+_WORKER_STATE = {}
+
+def scaled_size(size, scale):
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale))) if scale != 1 else tuple(size)
+
+def load_base_image(base_image_path, scale):
+    """解码底图并缩放到输出比例，返回 RGB 图像 (与最终画布同一模式，粘贴时不需要转换)。"""
+    # 底图可能带透明像素: 先按 RGBA 缩放 (预乘 alpha)，再丢弃 alpha，与粘贴到 RGB 画布的效果相同
+    base_image = Image.open(base_image_path).convert("RGBA")
+    if scale != 1: base_image = base_image.resize(scaled_size(base_image.size, scale), Image.LANCZOS)
+    return base_image.convert("RGB")
+
+def _make_render_state(holds, base_image_path, output_dir, scale=1.0, fonts=None, sprite_cache=None, trace=False, overlay=False, encoder=DEFAULT_ENCODER):
+    """一次绘制用到的全部状态: 缩放后的样式、岩点坐标和底图 (或图层模式的底图尺寸)、字体、精灵缓存和输出编码。"""
+    # 工作进程各自记录追踪区间，随每条线路的结果发回主进程
+    if trace: tracing.enable()
+    # 底图、岩点坐标和样式尺寸在这里一次性缩放到输出比例，之后直接按最终尺寸绘制和编码
+    state = {'style': style_for_scale(scale), 'sprites': sprite_cache if sprite_cache is not None else SpriteCache()}
+    if scale != 1: holds = holds.scaled(scale)
+    # 图层模式只需要底图的尺寸 (只读文件头)，不解码、不复制底图
+    if overlay:
+        with Image.open(base_image_path) as im: state['base_size'] = scaled_size(im.size, scale)
+        state['base_image'] = None
+    else:
+        with span('decode_base_image'): state['base_image'] = load_base_image(base_image_path, scale)
+    state['overlay'] = overlay
+    state['encoder'] = ImageEncoder(encoder)
+    state['holds'] = holds
+    if fonts is None:
+        with span('load_fonts'): fonts = load_fonts(state['style'])
+    state['fonts'] = fonts
+    state['output_dir'] = output_dir
+    return state
+
+def _init_worker(*args, **kwargs):
+    """进程池的初始化函数，参数与 _make_render_state 相同。"""
+    _WORKER_STATE.clear(); _WORKER_STATE.update(_make_render_state(*args, **kwargs))
+
+def _render_route_task(route, state=None):
+    """绘制一条线路，返回 (输出路径, 错误信息, 追踪事件)。单条线路失败不会中断整批任务；未开启追踪时事件为 None。"""
+    state = _WORKER_STATE if state is None else state
+    try:
+        if state['overlay']: output_path = draw_single_route_layer(route, state['holds'], state['base_size'], state['fonts'], state['output_dir'], state['encoder'], state['style'], state['sprites'])
+        else: output_path = draw_single_route_image(route, state['holds'], state['base_image'], state['fonts'], state['output_dir'], state['encoder'], state['style'], state['sprites'])
+        return output_path, None, tracing.drain()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", tracing.drain()
+
+def _render_route_png_task(route_data, missing=None):
+    """按线路 JSON 绘制完整图片并编码为 PNG 字节 (route_server.py 使用)。线路在工作进程中解析，未知岩点映射到下标 missing (见 Route.from_json)。"""
+    state = _WORKER_STATE
+    route = Route.from_json(route_data, state['holds'], missing=missing)
+    with span('route', route=route.name, moves=len(route.moves)):
+        image = compose_route_image(route, state['holds'], state['base_image'], state['fonts'], state['style'], state['sprites'])
+        buffer = io.BytesIO()
+        with span('encode'): image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def _iter_render_results(routes, workers, initargs):
+    """按线路顺序依次产出 (线路, 渲染结果)；workers > 1 时使用进程池，同一时刻最多 2 * workers 条线路在排队。"""
+    if workers <= 1:
+        state = _make_render_state(*initargs)
+        for route in routes: yield route, _render_route_task(route, state)
+        return
+    # run_all.py 在多个线程中同时处理多面墙，用 spawn 启动工作进程，避免 fork 时复制其他线程持有的锁
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker, initargs=initargs) as executor:
+        # 逐条提交而不是 executor.map: 后者会先把整个输入展开成任务列表，线路很多时内存随之增长
+        pending = deque()
+        for route in routes:
+            pending.append((route, executor.submit(_render_route_task, route)))
+            if len(pending) >= 2 * workers: route, future = pending.popleft(); yield route, future.result()
+        while pending: route, future = pending.popleft(); yield route, future.result()
+
+def render_inputs_digest(base_image_path, scale, output_mode='full', **extra_options):
+    """所有线路共享的输入 (底图、样式、字体、输出比例、模式和其他输出选项) 的哈希，增量清单和 route_server.py 的缓存共用。"""
+    font_paths = [BASE_STYLE_CONFIG[key]['font_path'] for key in ('main_font_style', 'title_style', 'beta_text_style')]
+    # 全图模式的选项保持不变，已有的清单在升级后仍然有效
+    options = {'scale': scale} if output_mode == 'full' else {'scale': scale, 'output_mode': output_mode}
+    options.update(extra_options)
+    return shared_inputs_digest(base_image_path, BASE_STYLE_CONFIG, font_paths, options=options)
+
+def _plan_routes(routes, holds, base_image_path, output_dir, scale, incremental, warm, output_mode='full', encoder=None):
+    """
+    第一遍流式遍历线路 (不保留 Route 对象)，返回 (需要绘制的线路序号集合, 新清单条目)。
+    非增量模式下清单条目为 None。需要绘制的线路交给 warm() 预先生成标记精灵。
+    """
+    encoder = encoder or ImageEncoder()
+    if incremental:
+        # 默认编码不参与哈希，已有的清单在升级后仍然有效
+        shared = render_inputs_digest(base_image_path, scale, output_mode, **({} if encoder.name == DEFAULT_ENCODER else {'encoder': encoder.name}))
+        previous = load_manifest(manifest_path_for(output_dir))
+    # 同名输出文件只保留最后一条线路，与全量绘制时后者覆盖前者的结果一致
+    by_filename = {}
+    for ordinal, route in enumerate(routes):
+        filename = route_output_filename(route, encoder.extension)
+        if filename in by_filename: print(f"警告: 多条线路输出到同一文件 '{filename}'，只保留最后一条。", file=sys.stderr)
+        digest = route_digest(route, holds, shared) if incremental else None
+        changed = not incremental or previous.get(filename) != digest or not (output_dir / filename).exists()
+        by_filename[filename] = (ordinal, route.name, digest, changed)
+        if changed: warm(route)
+    pending = {ordinal for ordinal, _, _, changed in by_filename.values() if changed}
+    entries = {filename: {'route': name, 'hash': digest} for filename, (_, name, digest, _) in by_filename.items()} if incremental else None
+    return pending, entries
+
+def process_all_routes(routes_db_path, holds_coords_path, base_image_path, output_dir, workers=1, incremental=False, scale=1.0, max_width=None, sprite_cache_path=None, holds=None, routes=None, where=None, output_mode='full', encoder=DEFAULT_ENCODER):
+    """
+    holds / routes 可以传入已经用 wall_data 读取好的数据 (例如 run_all.py)，此时不再重复读取文件。
+    否则线路数据库 (JSON 或 JSONL) 被流式读取两遍: 第一遍计算哈希、决定绘制哪些线路，第二遍逐条绘制，
+    内存中不保留全部线路。where(线路 JSON) 只选出部分线路 (见 wall_data.route_selector)；
+    此时增量清单只更新被选中的线路，也不会清理其他线路的图片。
+    output_mode='overlay' 时每条线路只输出透明图层 (标记、箭头和文字说明)，底图只写一次 base.png，
+    并在输出目录生成 index.json 和静态查看页面 index.html，由浏览器叠加显示。
+    encoder 是输出编码的描述 (见 image_encoders.ImageEncoder)，例如 'webp:quality=85'；图层模式的底图总是 PNG。
+    """
+    overlay = output_mode == 'overlay'
+    try: encoder = ImageEncoder(encoder)
+    except ValueError as e: print(f"错误: 输出编码 '{encoder}' 不可用 - {e}", file=sys.stderr); sys.exit(1)
     try:
-        print(f"Loading routes database: {routes_db_path}");
-        with open(routes_db_path, 'r', encoding='utf-8') as f: raw_data = json.load(f)
-        if isinstance(raw_data, dict): all_routes_data = raw_data.get('routes', [])
-        elif isinstance(raw_data, list): all_routes_data = raw_data
-        else: all_routes_data = []
-        print(f"Loading hold coordinates: {holds_coords_path}");
-        with open(holds_coords_path, 'r', encoding='utf-8') as f: holds_coords = {k.lower(): v for k, v in json.load(f).items()}
-        print(f"Loading base image: {base_image_path}"); base_image = Image.open(base_image_path).convert("RGBA")
+        with span('load_json'):
+            if holds is None: print(f"Loading hold coordinates: {holds_coords_path}"); holds = load_holds(holds_coords_path)
+        if routes is None:
+            print(f"Loading routes database: {routes_db_path}")
+            # 线路中的岩点编号驻留为 holds 的下标，绘制时直接按下标取坐标
+            iter_selected = lambda: iter_routes(routes_db_path, holds, with_digest=incremental, where=where)
+        else:
+            iter_selected = lambda: iter(routes)
+        # 这里只读取文件头做校验，真正的解码在各工作进程中进行
+        print(f"Loading base image: {base_image_path}")
+        with Image.open(base_image_path) as im: scale = resolve_output_scale(im.size, scale, max_width)
+        # 缩放后的样式、字体和精灵缓存都属于这一次运行，不修改模块级状态
+        style_config = style_for_scale(scale); sprites = SpriteCache()
+        if scale != 1: print(f"Output scale: {scale:.4g}")
+        try:
+            with span('load_fonts'): fonts = load_fonts(style_config)
+        except IOError as e: print(f"错误: 字体文件未找到。请确保字体文件存在于 'fonts/' 目录下 - {e}", file=sys.stderr); sys.exit(1)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if sprite_cache_path and sprites.load(sprite_cache_path): print(f"Loaded sprite cache: {sprite_cache_path} ({len(sprites)} sprites)")
+        # 精灵在主进程中预先生成 (数量很少)，随初始化参数一起发给工作进程
+        scaled_holds = holds.scaled(scale)
+        with span('plan_routes'): pending, manifest_entries = _plan_routes(iter_selected(), holds, base_image_path, output_dir, scale, incremental, lambda route: warm_sprite_cache([route], scaled_holds, fonts, style_config, sprites), output_mode, encoder)
     except FileNotFoundError as e: print(f"错误: 必需文件未找到 - {e}", file=sys.stderr); sys.exit(1)
     except json.JSONDecodeError as e: print(f"错误: 解析JSON文件时出错 - {e}", file=sys.stderr); sys.exit(1)
-    fonts = {}
-    try:
-        main_style = STYLE_CONFIG['main_font_style']; fonts['main'] = get_variational_font(main_style['font_path'], main_style['font_size'], main_style['font_variation'])
-        title_style = STYLE_CONFIG['title_style']; fonts['title'] = get_variational_font(title_style['font_path'], title_style['font_size'], title_style['font_variation'])
-        beta_style = STYLE_CONFIG['beta_text_style']; fonts['beta'] = get_variational_font(beta_style['font_path'], beta_style['font_size'], beta_style['font_variation'])
-    except IOError as e: print(f"错误: 字体文件未找到。请确保字体文件存在于 'fonts/' 目录下 - {e}", file=sys.stderr); sys.exit(1)
-    output_dir.mkdir(parents=True, exist_ok=True)
-    if not all_routes_data: print("数据库中没有找到任何线路。"); return
-    print(f"\nProcessing {len(all_routes_data)} routes...")
-    for i, route_data in enumerate(all_routes_data):
-        route_name = route_data.get('routeName', route_data.get('name', 'N/A')); print(f"[{i+1}/{len(all_routes_data)}] Drawing route: '{route_name}'")
-        draw_single_route_image(route_data, holds_coords, base_image, fonts, output_dir)
+    total = len(manifest_entries) if incremental else None
+    base_output_path = output_dir / OVERLAY_BASE_FILENAME
+    if overlay and (pending or not base_output_path.exists()):
+        with span('write_base'): load_base_image(base_image_path, scale).save(base_output_path, 'PNG', optimize=True)
+        print(f"Saved overlay base image: {base_output_path}")
+    if not pending and not total:
+        print("数据库中没有找到任何线路。" if where is None else "没有符合筛选条件的线路。"); return
+    if incremental: print(f"\nIncremental mode: {total - len(pending)} unchanged, {len(pending)} to draw.")
+
+    failures = []
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        print(f"\nProcessing {len(pending)} routes with {workers} worker(s), encoder {encoder.name}...")
+        print(f"Sprite cache: {sprites.stats()}")
+        if sprite_cache_path: sprites.save(sprite_cache_path)
+        initargs = (holds, base_image_path, output_dir, scale, fonts if workers <= 1 else None, sprites, tracing.enabled(), overlay, encoder.name)
+        # 第二遍: 只把需要绘制的线路送进渲染流水线
+        selected = (route for ordinal, route in enumerate(iter_selected()) if ordinal in pending)
+        for i, (route, (output_path, error, events)) in enumerate(_iter_render_results(selected, workers, initargs)):
+            tracing.extend(events)
+            if error:
+                print(f"[{i+1}/{len(pending)}] ✗ Failed: '{route.name}' - {error}", file=sys.stderr)
+                failures.append((route.name, route_output_filename(route, encoder.extension), error))
+            else:
+                print(f"[{i+1}/{len(pending)}] ✓ Saved: '{route.name}' -> {output_path}")
+
+    if manifest_entries is not None:
+        # 只清理不属于任何选中线路的文件: 绘制失败的线路保留上一次的图片 (换用其他编码时也保留旧格式的图片)
+        keep = set(manifest_entries) | ({OVERLAY_BASE_FILENAME} if overlay else set())
+        keep |= {Path(filename).stem + extension for _, filename, _ in failures for extension in OUTPUT_EXTENSIONS}
+        if failures: keep_failed_entries(manifest_entries, load_manifest(manifest_path_for(output_dir)), [filename for _, filename, _ in failures])
+        if where is None:
+            # 换用其他编码后，旧格式的图片同样被清理
+            for extension in OUTPUT_EXTENSIONS:
+                for path in prune_stale_outputs(output_dir, keep, f"*{extension}"): print(f"  - Pruned stale image: {path}")
+            save_manifest(manifest_path_for(output_dir), manifest_entries)
+        else:
+            update_manifest(manifest_path_for(output_dir), manifest_entries)
+    if overlay:
+        index = write_viewer(output_dir, Path(base_image_path).resolve().parent.name)
+        print(f"Overlay viewer: {output_dir / 'index.html'} ({len(index['layers'])} layers)")
+    if failures:
+        print(f"\n错误: {len(failures)}/{len(pending)} 条线路绘制失败:", file=sys.stderr)
+        for route_name, _, error in failures: print(f"  - {route_name}: {error}", file=sys.stderr)
+        sys.exit(1)
     print("\nAll routes processed successfully!")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="在攀岩墙底图上绘制线路并保存为图片。"); parser.add_argument("--routes_database_file", required=True, help="包含所有线路定义的 JSON 文件路径。"); parser.add_argument("--holds_coords_path", required=True, help="包含岩点坐标的 JSON 文件路径。"); parser.add_argument("--base_image_path", required=True, help="作为背景的攀岩墙图片路径。"); parser.add_argument("--output_dir", required=True, help="保存生成线路图片的目录。")
+    parser.add_argument("--workers", type=int, default=1, help="并行绘制的进程数。0 表示使用全部 CPU 核心。默认 1 (串行)。")
+    parser.add_argument("--incremental", action="store_true", help="增量模式: 只重绘内容哈希发生变化的线路，删除已不存在线路的图片，并在输出目录旁写入清单文件。")
+    parser.add_argument("--scale", type=float, default=1.0, help="输出图片相对原图的缩放比例 (例如 0.5)。底图只重采样一次，岩点坐标和所有样式尺寸同比例缩放。")
+    parser.add_argument("--max_width", type=int, default=None, help="输出图片的最大宽度 (像素)。缩放后仍超过该宽度时继续缩小。")
+    parser.add_argument("--sprite_cache", default=None, help="岩点标记精灵的缓存文件路径 (zip)。指定后在多次运行之间复用已光栅化的标记。")
+    parser.add_argument("--route", action="append", default=[], help="只绘制指定名称的线路 (不区分大小写)，可以重复指定。")
+    parser.add_argument("--grade", action="append", default=[], help="只绘制指定难度的线路 (例如 V3)，可以重复指定。")
+    parser.add_argument("--author", action="append", default=[], help="只绘制指定作者的线路，可以重复指定。")
+    parser.add_argument("--changed_since", "--changed-since", default=None, help="只绘制相对于 git 版本 (提交、分支或标签) 新增或修改过的线路。")
+    parser.add_argument("--output_mode", choices=('full', 'overlay'), default='full', help="full: 每条线路输出完整图片 (默认)。overlay: 只输出透明的线路图层，底图单独保存一次，并生成 index.html 在浏览器中叠加查看。")
+    parser.add_argument("--encoder", default=DEFAULT_ENCODER, help="输出编码: png (默认，optimize)、png:level=1、png:colors=256、webp:quality=85、webp:lossless、avif:quality=60 等，选项用逗号分隔。用 image_encoders.py 比较各种设置的编码耗时和体积。")
+    parser.add_argument("--trace", default=None, help="把各阶段的耗时区间写成 Chrome 追踪格式的 JSON (可用 chrome://tracing 或 Perfetto 打开)，并输出最耗时阶段的汇总表。")
+    parser.add_argument("--profile", nargs='?', const='', default=None, help="用 cProfile 运行，输出累计耗时最多的函数；给出路径时另存 pstats 文件。只统计主进程，建议配合 --workers 1。")
     args = parser.parse_args(); routes_db_path = Path(args.routes_database_file); holds_coords_path = Path(args.holds_coords_path); base_image_path = Path(args.base_image_path); output_dir = Path(args.output_dir)
     if not routes_db_path.exists(): print(f"错误: 路线数据库文件不存在 '{routes_db_path}'", file=sys.stderr); sys.exit(1)
     if not holds_coords_path.exists(): print(f"错误: 岩点坐标文件 '{holds_coords_path}' 不存在。", file=sys.stderr); sys.exit(1)
     if not base_image_path.exists(): print(f"错误: 原始图片 '{base_image_path}' 不存在。", file=sys.stderr); sys.exit(1)
-    process_all_routes(routes_db_path, holds_coords_path, base_image_path, output_dir)
+    # 线路数据库可以是 routes.json (列表或带 'routes' 键的对象)，也可以是逐行一条线路的 .jsonl 文件
+    try: unchanged = route_digests_at_revision(routes_db_path, args.changed_since) if args.changed_since else None
+    except ValueError as e: print(f"错误: {e}", file=sys.stderr); sys.exit(1)
+    where = route_selector(args.route, args.grade, args.author, exclude_digests=unchanged)
+    if args.trace: tracing.enable()
+    profiler = None
+    if args.profile is not None: import cProfile; profiler = cProfile.Profile(); profiler.enable()
+    try: process_all_routes(routes_db_path, holds_coords_path, base_image_path, output_dir, workers=args.workers, incremental=args.incremental, scale=args.scale, max_width=args.max_width, sprite_cache_path=args.sprite_cache, where=where, output_mode=args.output_mode, encoder=args.encoder)
+    finally:
+        # 绘制失败 (sys.exit) 时同样输出，慢和失败往往一起出现
+        if profiler:
+            import pstats; profiler.disable(); stats = pstats.Stats(profiler, stream=sys.stderr)
+            if args.profile: stats.dump_stats(args.profile); print(f"Profile saved: {args.profile}", file=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(25)
+        if args.trace:
+            events = tracing.drain(); tracing.save_trace(args.trace, events); tracing.print_summary(events); print(f"Trace saved: {args.trace}")
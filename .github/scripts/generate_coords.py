@@ -1,73 +1,337 @@
 import argparse
 import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import easyocr
-import cv2
 import numpy as np
 import sys
+from ocr_cache import BLOCK_SIZE, block_signatures, bbox_intersects, changed_regions, file_sha256, load_cache, save_cache
 
-def generate_coords(image_path_str: str, output_path_str: str):
+# 岩点标签只由 '#'、数字和小写字母组成，限制识别字符集可以避免把标签认成其他符号
+LABEL_ALLOWLIST = '#0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def clean_label(text):
+    # 清理文本：去除所有非字母和非数字的字符，并转为小写。
+    # 例如 "#a" -> "a", "123." -> "123", "X-Y" -> "xy"
+    # 这样做使脚本非常通用，不依赖于任何特定的标记格式。
+    return ''.join(filter(str.isalnum, text)).lower()
+
+
+def create_reader():
+    # easyocr 会连带导入 torch，只在真正需要识别时才导入
+    import easyocr
+    return easyocr.Reader(['en'], gpu=False) # 在 GitHub Actions 环境中使用 CPU
+
+
+def ocr_region(reader, image, offset=(0, 0)):
+    """
+    识别一块图像中的标签，返回检测结果列表 (text, cx, cy, prob, (x0, y0, x1, y1))，
+    坐标已加上 offset 换算到整张图片的坐标系。
+    """
+    detections = []
+    for (bbox, text, prob) in reader.readtext(image, allowlist=LABEL_ALLOWLIST):
+        cleaned_text = clean_label(text)
+        if not cleaned_text:
+            continue
+        xs = [point[0] + offset[0] for point in bbox]
+        ys = [point[1] + offset[1] for point in bbox]
+        # 计算边界框的中心点 (保留您版本中更精确的 np.mean 方法)
+        detections.append((cleaned_text, int(np.mean(xs)), int(np.mean(ys)), float(prob), (int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys)))))
+    return detections
+
+
+# --- 分块识别 ---
+def iter_tiles(width, height, tile_size, overlap):
+    """把图片切成相互重叠的块，产出 (x0, y0, x1, y1)。tile_size <= 0 时整张图作为一块。"""
+    if tile_size <= 0 or (width <= tile_size and height <= tile_size):
+        yield (0, 0, width, height)
+        return
+    step = max(1, tile_size - overlap)
+    xs = list(range(0, max(1, width - overlap), step))
+    ys = list(range(0, max(1, height - overlap), step))
+    for y0 in ys:
+        for x0 in xs:
+            yield (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+
+
+def _touches_inner_edge(bbox, tile, image_size, margin=2):
+    # 贴着块内部边缘的检测框很可能被截断 (例如 "#12" 只剩 "#1")，重叠区会在相邻块中完整地再识别一次
+    x0, y0, x1, y1 = bbox; tx0, ty0, tx1, ty1 = tile; width, height = image_size
+    return ((tx0 > 0 and x0 - tx0 < margin) or (ty0 > 0 and y0 - ty0 < margin)
+            or (tx1 < width and tx1 - x1 < margin) or (ty1 < height and ty1 - y1 < margin))
+
+
+def merge_detections(detections, sources, radius):
+    """
+    合并相邻块 (或区域) 重叠处对同一个标签的重复识别。sources 是每个检测所在块的序号。
+    按置信度从高到低保留；只有文本相同、来自不同的块、且中心距离小于 radius 的检测才视为重复而丢弃，
+    文本不同的标签离得再近也都保留。
+    """
+    kept, seen = [], {}
+    for detection, source in sorted(zip(detections, sources), key=lambda item: -item[0][3]):
+        text, x, y = detection[:3]
+        if any(other != source and (x - ox) ** 2 + (y - oy) ** 2 < radius ** 2 for ox, oy, other in seen.get(text, ())):
+            continue
+        seen.setdefault(text, []).append((x, y, source))
+        kept.append(detection)
+    return kept
+
+
+_OCR_WORKER = {}
+
+def _init_ocr_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+    _OCR_WORKER['reader'] = create_reader()
+
+
+def _ocr_tile_task(task):
+    tile, tile_image = task
+    return tile, ocr_region(_OCR_WORKER['reader'], tile_image, offset=tile[:2])
+
+
+def _bounded_map(executor, fn, iterable, window):
+    """与 executor.map 相同，但同一时刻最多只有 window 个任务在排队，输入不会被一次性全部展开。"""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def detect_labels(image, tile_size=0, overlap=128, workers=1, reader=None):
+    """对整张图片做 (可选分块、并行的) 标签识别，返回合并后的检测结果列表。"""
+    height, width = image.shape[:2]
+    tiles = list(iter_tiles(width, height, tile_size, overlap))
+    tasks = ((tile, np.ascontiguousarray(image[tile[1]:tile[3], tile[0]:tile[2]])) for tile in tiles)
+    workers = min(workers or os.cpu_count() or 1, len(tiles))
+    if workers <= 1:
+        reader = reader or create_reader()
+        results = ((tile, ocr_region(reader, tile_image, offset=tile[:2])) for tile, tile_image in tasks)
+        detections, sources = _collect_tile_results(results, (width, height), len(tiles))
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # 主进程可能已经有 torch 的线程 (以及 run_all.py 中其他墙体的线程)，用 spawn 启动工作进程，避免 fork 时复制其他线程持有的锁
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_ocr_worker, initargs=(threads,)) as executor:
+            detections, sources = _collect_tile_results(_bounded_map(executor, _ocr_tile_task, tasks, 2 * workers), (width, height), len(tiles))
+    if len(tiles) == 1:
+        return detections
+    # 合并半径取重叠宽度的一半: 同一个标签在相邻块中的两次识别，中心不会相差这么远
+    return merge_detections(detections, sources, max(8, overlap // 2))
+
+
+def _collect_tile_results(results, image_size, tile_count):
+    """返回 (检测结果列表, 每个检测所在块的序号)。"""
+    detections, sources = [], []
+    for i, (tile, tile_detections) in enumerate(results):
+        if tile_count > 1:
+            print(f"  [{i+1}/{tile_count}] 块 {tile}: {len(tile_detections)} 个文本框")
+            tile_detections = [d for d in tile_detections if not _touches_inner_edge(d[4], tile, image_size)]
+        detections.extend(tile_detections)
+        sources.extend([i] * len(tile_detections))
+    return detections, sources
+
+
+def detections_to_holds(detections):
+    """同一个岩点编号被识别到多次时保留置信度最高的那个。"""
+    holds_coords = {}
+    for (text, x, y, prob, _) in sorted(detections, key=lambda d: d[3]):
+        holds_coords[text] = {'x': x, 'y': y}
+    return holds_coords
+
+
+# --- 检测后端 ---
+# 后端需要提供 name、detect(image, offset) (识别一块图像，坐标加上 offset) 和 detect_image(image) (识别整张图片)，
+# 返回的检测结果格式与 ocr_region 相同
+class EasyOCRBackend:
+    """默认后端: EasyOCR，需要安装 torch。读取器在第一次使用时才创建。"""
+    name = 'easyocr'
+
+    def __init__(self, tile_size=0, overlap=128, workers=1):
+        self.tile_size, self.overlap, self.workers = tile_size, overlap, workers
+        self._reader = None
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = create_reader()
+        return self._reader
+
+    def detect(self, image, offset=(0, 0)):
+        return ocr_region(self.reader, image, offset=offset)
+
+    def detect_image(self, image):
+        if self.tile_size > 0:
+            print(f"分块模式: 块大小 {self.tile_size}px，重叠 {self.overlap}px，工作进程 {self.workers or os.cpu_count()}")
+        return detect_labels(image, tile_size=self.tile_size, overlap=self.overlap, workers=self.workers, reader=self._reader)
+
+
+BACKENDS = ('easyocr', 'opencv')
+
+
+def create_backend(name, image_path, tile_size=0, overlap=128, workers=1, train_walls=None):
+    """
+    按名称创建检测后端。opencv 后端用 train_walls (墙体目录列表) 中已有的 holds.json 训练字符分类器，
+    未指定时使用与 image_path 同级的所有带 holds.json 的墙体。
+    """
+    if name == 'easyocr':
+        return EasyOCRBackend(tile_size=tile_size, overlap=overlap, workers=workers)
+    if name == 'opencv':
+        from cv_label_detector import OpenCVLabelBackend, discover_training_sets
+        if train_walls:
+            training_sets = [(Path(w) / 'image_marked.png', Path(w) / 'output/data/holds.json') for w in train_walls]
+        else:
+            training_sets = discover_training_sets(Path(image_path).resolve().parent.parent)
+        return OpenCVLabelBackend(training_sets)
+    raise ValueError(f"未知的检测后端: {name} (可选: {', '.join(BACKENDS)})")
+
+
+def redetect_regions(image, regions, old_detections, pad, backend):
+    """
+    只在变化区域重新识别: 丢弃与变化区域相交的旧检测结果，再在每个区域 (四周各扩展 pad 像素，
+    保证跨越区域边界的标签能被完整识别) 内做识别，收下与该区域相交的新结果。
+    """
+    height, width = image.shape[:2]
+    kept = [d for d in old_detections if not any(bbox_intersects(d[4], region) for region in regions)]
+    found, sources = [], []
+    for i, (x0, y0, x1, y1) in enumerate(regions):
+        crop = (max(0, x0 - pad), max(0, y0 - pad), min(width, x1 + pad), min(height, y1 + pad))
+        region_detections = backend.detect(np.ascontiguousarray(image[crop[1]:crop[3], crop[0]:crop[2]]), offset=crop[:2])
+        print(f"  [{i+1}/{len(regions)}] 区域 {(x0, y0, x1, y1)}: {len(region_detections)} 个文本框")
+        region_detections = [d for d in region_detections if bbox_intersects(d[4], (x0, y0, x1, y1)) and not _touches_inner_edge(d[4], crop, (width, height))]
+        found.extend(region_detections)
+        sources.extend([i] * len(region_detections))
+    # 相邻区域扩展后可能重叠，同一个标签会被两个区域各识别一次
+    return kept + merge_detections(found, sources, 8)
+
+
+def merge_manual_holds(ocr_holds, existing_holds, record=None):
+    """
+    把对 holds.json 的手动修改合并进新的识别结果。record 是 OCR 缓存中的记录 {'written', 'manual', 'deleted'}:
+    上一次写出的 holds.json、累计的手动添加或修正的条目 (例如用 add_missing_coords.py) 和手动删除的编号。
+    现有 holds.json 与上一次写出的内容相比新增或修改的条目记为手动条目，之后始终优先于识别结果；
+    被删除的编号记为手动删除，之后即使再被识别到也不会写回。
+    没有记录时 (第一次使用缓存) 现有的 holds.json 是人工整理过的，合并结果就是它本身，其中所有条目记为手动条目；
+    holds.json 不存在时直接使用识别结果。
+    existing_holds 为 None 表示 holds.json 不存在。返回 (合并结果, 新的记录)。
+    """
+    if record is None and existing_holds is not None:
+        return dict(existing_holds), {'written': existing_holds, 'manual': dict(existing_holds), 'deleted': []}
+    if record is None:
+        record = {'written': {}}
+    written = record['written']
+    existing_holds = written if existing_holds is None else existing_holds
+    manual, deleted = dict(record.get('manual', {})), set(record.get('deleted', ()))
+    for hold_id, coord in existing_holds.items():
+        if written.get(hold_id) != coord:
+            manual[hold_id] = coord
+            deleted.discard(hold_id)
+    for hold_id in written.keys() - existing_holds.keys():
+        manual.pop(hold_id, None)
+        deleted.add(hold_id)
+    merged = {hold_id: coord for hold_id, coord in ocr_holds.items() if hold_id not in deleted}
+    merged.update(manual)
+    return merged, {'written': merged, 'manual': manual, 'deleted': sorted(deleted)}
+
+
+def generate_coords(image_path_str: str, output_path_str: str, tile_size=0, overlap=128, workers=1, cache_path_str=None, backend='easyocr', train_walls=None):
     """
     从给定的图片中识别所有字母和数字标记，并将其中心坐标保存为 JSON 文件。
     这个版本是通用的，不包含任何特定于墙体的规则。
+    指定 cache_path_str 时使用 OCR 缓存: 图片未变化则直接跳过 (返回 False)，变化时只重新识别变化的区域。
+    backend 选择检测后端: 'easyocr' (默认) 或只依赖 OpenCV、不导入 torch 的 'opencv'。
     """
     image_path = Path(image_path_str)
     output_path = Path(output_path_str)
+    cache_path = Path(cache_path_str) if cache_path_str else None
 
     # 1. 检查输入图片是否存在
     if not image_path.exists():
         print(f"错误: 图片文件未找到 at {image_path}", file=sys.stderr)
         sys.exit(1)
 
-    # 2. 初始化 EasyOCR 读取器
-    print("正在初始化 EasyOCR...")
-    reader = easyocr.Reader(['en'], gpu=False) # 在 GitHub Actions 环境中使用 CPU
+    cache, image_sha256 = None, None
+    if cache_path:
+        cache = load_cache(cache_path)
+        image_sha256 = file_sha256(image_path)
+        if cache and cache['image_sha256'] == image_sha256 and cache['backend'] == backend and output_path.exists():
+            print(f"图片未变化 (命中 OCR 缓存 {cache_path})，跳过识别。")
+            return False
 
-    # 3. 读取图片
+    # 2. 读取图片 (OpenCV 只在真正需要识别时才导入，命中缓存的运行不需要它)
+    import cv2
     print(f"正在读取图片: {image_path}")
     image = cv2.imread(str(image_path))
     if image is None:
         print(f"错误: 无法加载图片 at {image_path}", file=sys.stderr)
         sys.exit(1)
+    height, width = image.shape[:2]
 
-    # 4. 使用 EasyOCR 进行文字识别
-    print("正在识别图片中的文字...")
-    results = reader.readtext(image)
+    # 3. 识别图片中的文字 (EasyOCR 分块时各工作进程各自初始化一个读取器)
+    print(f"正在初始化检测后端 {backend} 并识别图片中的文字...")
+    detector = create_backend(backend, image_path, tile_size=tile_size, overlap=overlap, workers=workers, train_walls=train_walls)
+    if cache_path:
+        signatures, grid_shape = block_signatures(image)
+    # 不同后端的检测框和置信度不可比，换了后端就整张重新识别
+    if cache and cache['backend'] == backend and (cache['width'], cache['height'], cache['block_size']) == (width, height, BLOCK_SIZE):
+        regions = changed_regions(cache['blocks'], signatures, grid_shape, BLOCK_SIZE, (width, height))
+        print(f"图片已变化，{len(regions)} 个区域需要重新识别...")
+        detections = redetect_regions(image, regions, cache['detections'], pad=overlap, backend=detector)
+    else:
+        detections = detector.detect_image(image)
 
-    # 5. 处理识别结果并提取坐标
-    holds_coords = {}
-    print(f"识别到 {len(results)} 个文本框，正在处理...")
-
-    for (bbox, text, prob) in results:
-        # 清理文本：去除所有非字母和非数字的字符，并转为小写。
-        # 例如 "#a" -> "a", "123." -> "123", "X-Y" -> "xy"
-        # 这样做使脚本非常通用，不依赖于任何特定的标记格式。
-        cleaned_text = ''.join(filter(str.isalnum, text)).lower()
-        
-        if cleaned_text:
-            # 计算边界框的中心点 (保留您版本中更精确的 np.mean 方法)
-            center_x = int(np.mean([point[0] for point in bbox]))
-            center_y = int(np.mean([point[1] for point in bbox]))
-
-            holds_coords[cleaned_text] = {'x': center_x, 'y': center_y}
-            # print(f"找到岩点: {cleaned_text} -> 坐标: ({center_x}, {center_y})")
-
-    # 6. 确保输出目录存在
+    # 4. 处理识别结果并提取坐标，保留手动添加、修正和删除的岩点
+    print(f"识别到 {len(detections)} 个文本框，正在处理...")
+    holds_coords = detections_to_holds(detections)
+    existing_holds = None
+    if output_path.exists():
+        with open(output_path, 'r', encoding='utf-8') as f:
+            existing_holds = json.load(f)
+    holds_record = None
+    # 与原来的工作流一致: 已有 holds.json 而还没有缓存记录时不改写它，只建立 OCR 缓存
+    seed_only = bool(cache_path) and existing_holds is not None and not (cache and cache.get('holds'))
+    if cache_path:
+        holds_coords, holds_record = merge_manual_holds(holds_coords, existing_holds, cache.get('holds') if cache else None)
+        if holds_record['manual']:
+            print(f"保留 {len(holds_record['manual'])} 个手动添加或修正的岩点坐标: {', '.join(sorted(holds_record['manual']))}")
+        if holds_record['deleted']:
+            print(f"忽略 {len(holds_record['deleted'])} 个手动删除的岩点: {', '.join(holds_record['deleted'])}")
+
+    # 5. 确保输出目录存在
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # 7. 将结果写入 JSON 文件 (保留您版本中的格式)
-    print(f"处理完成，正在将 {len(holds_coords)} 个岩点坐标写入: {output_path}")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(holds_coords, f, indent=2, sort_keys=True)
+    # 6. 将结果写入 JSON 文件 (保留您版本中的格式)
+    if seed_only:
+        print(f"{output_path} 已存在且没有缓存记录，保留其中的 {len(holds_coords)} 个岩点坐标，不改写。")
+    else:
+        print(f"处理完成，正在将 {len(holds_coords)} 个岩点坐标写入: {output_path}")
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(holds_coords, f, indent=2, sort_keys=True)
+    if cache_path:
+        save_cache(cache_path, image_sha256, (width, height), signatures, detections, backend=backend, holds=holds_record)
+        print(f"OCR 缓存已更新: {cache_path}")
 
     print("岩点坐标生成完毕！")
+    return not seed_only
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="从图片中生成岩点坐标。")
     parser.add_argument('--image_path', type=str, required=True, help='输入图片的路径。')
     parser.add_argument('--output_path', type=str, required=True, help='输出 JSON 文件的路径。')
-    
+    parser.add_argument('--tile_size', type=int, default=0, help='分块识别的块大小 (像素)。0 表示整张图片一次识别。')
+    parser.add_argument('--tile_overlap', type=int, default=128, help='相邻块之间的重叠宽度 (像素)，应大于最长标签的宽度。')
+    parser.add_argument('--workers', type=int, default=1, help='分块识别的并行进程数。0 表示使用全部 CPU 核心。')
+    parser.add_argument('--cache_path', type=str, default=None, help='OCR 缓存文件路径。图片未变化时跳过识别，变化时只重新识别变化的区域，并保留对 holds.json 的手动添加、修正和删除。')
+    parser.add_argument('--backend', choices=BACKENDS, default='easyocr', help='检测后端。opencv 不需要 torch，用已有墙体的 holds.json 训练字符分类器。')
+    parser.add_argument('--train_walls', nargs='*', default=None, help='opencv 后端的训练墙体目录。默认使用所有带 holds.json 的墙体。')
+
     args = parser.parse_args()
-    
-    generate_coords(args.image_path, args.output_path)
+
+    generate_coords(args.image_path, args.output_path, tile_size=args.tile_size, overlap=args.tile_overlap, workers=args.workers, cache_path_str=args.cache_path,
+                    backend=args.backend, train_walls=args.train_walls)
@@ -0,0 +1,216 @@
+import argparse
+import io
+import json
+import statistics
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+import sys
+from PIL import Image, features
+from PIL.PngImagePlugin import PngInfo
+
+# 默认编码与原来的输出完全相同 (PNG optimize=True)，已有的图片和增量清单在升级后仍然有效
+DEFAULT_ENCODER = 'png'
+# 格式 -> (Pillow 格式名, 扩展名, 可用选项及默认值)。PNG 的 level 为 None 时使用 optimize=True
+ENCODER_FORMATS = {
+    'png': ('PNG', '.png', {'level': None, 'colors': None}),
+    'webp': ('WEBP', '.webp', {'quality': 85, 'method': 4, 'lossless': False}),
+    'avif': ('AVIF', '.avif', {'quality': 60, 'speed': 6}),
+}
+OUTPUT_EXTENSIONS = tuple(extension for _, extension, _ in ENCODER_FORMATS.values())
+_OPTION_RANGES = {'level': (0, 9), 'colors': (2, 256), 'quality': (0, 100), 'method': (0, 6), 'speed': (0, 10)}
+# 编码报告默认比较的设置
+REPORT_ENCODERS = ('png', 'png:level=1', 'png:colors=256', 'webp', 'webp:quality=75', 'webp:lossless,method=0', 'avif')
+# WebP / AVIF 没有 PNG 那样的文本块，元数据写成 XMP 中这个命名空间下的属性
+_XMP_NAMESPACE = 'urn:climbing-routes:metadata'
+_RDF_NAMESPACE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+
+
+def avif_available():
+    """Pillow >= 11.3 自带 AVIF 支持；更早的版本可以安装 pillow-avif-plugin。"""
+    if 'avif' in features.modules and features.check_module('avif'):
+        return True
+    try:
+        import pillow_avif  # noqa: F401  导入时向 Pillow 注册 AVIF 格式
+        return True
+    except ImportError:
+        return False
+
+
+class ImageEncoder:
+    """
+    一种输出编码设置，用字符串描述: '格式[:选项,...]'，例如 'png:level=1,colors=256'、'webp:quality=80'、
+    'webp:lossless'、'avif:quality=50,speed=8'。选项不合法或当前环境不支持该格式时抛出 ValueError。
+    name 是规范化的描述 (省略与默认值相同的选项)，用于增量清单的哈希和编码报告。
+    """
+
+    def __init__(self, spec=DEFAULT_ENCODER):
+        fmt, _, rest = spec.strip().lower().partition(':')
+        if fmt not in ENCODER_FORMATS:
+            raise ValueError(f"未知的编码格式 '{fmt}' (可选: {', '.join(ENCODER_FORMATS)})")
+        self.format, self.extension, defaults = ENCODER_FORMATS[fmt]
+        options = dict(defaults)
+        for item in filter(None, (part.strip() for part in rest.split(','))):
+            key, has_value, value = item.partition('=')
+            if key not in defaults:
+                raise ValueError(f"编码格式 '{fmt}' 不支持选项 '{key}' (可选: {', '.join(defaults)})")
+            if isinstance(defaults[key], bool):
+                options[key] = value not in ('0', 'false', 'no') if has_value else True
+                continue
+            try:
+                options[key] = int(value)
+            except ValueError:
+                raise ValueError(f"选项 '{key}' 需要一个整数，而不是 '{value}'") from None
+            low, high = _OPTION_RANGES[key]
+            if not low <= options[key] <= high:
+                raise ValueError(f"选项 '{key}' 应在 {low} 到 {high} 之间")
+        if fmt == 'avif' and not avif_available():
+            raise ValueError("当前 Pillow 不支持 AVIF: 需要 Pillow >= 11.3，或者安装 pillow-avif-plugin")
+        self.options = options
+        changed = [key if value is True else f"{key}={int(value)}" for key, value in sorted(options.items()) if value != defaults[key]]
+        self.name = fmt + (':' + ','.join(changed) if changed else '')
+
+    def __repr__(self):
+        return f"ImageEncoder({self.name!r})"
+
+    def save_params(self, image):
+        """返回 (实际保存的图像, Pillow save 参数)。PNG 的 colors 选项在这里把图像量化为调色板。"""
+        options = self.options
+        if self.format == 'PNG':
+            if options['colors']:
+                image = image.quantize(options['colors'], method=Image.Quantize.FASTOCTREE)
+            return image, ({'optimize': True} if options['level'] is None else {'compress_level': options['level']})
+        if self.format == 'WEBP':
+            return image, {'quality': options['quality'], 'method': options['method'], 'lossless': options['lossless']}
+        return image, {'quality': options['quality'], 'speed': options['speed']}
+
+    def encode(self, image, fp, metadata=None):
+        """把图像编码到文件路径或文件对象。metadata ({键: 文本}) 写入 PNG 文本块或 WebP / AVIF 的 XMP。"""
+        image, params = self.save_params(image)
+        if metadata:
+            if self.format == 'PNG':
+                info = PngInfo()
+                for key, text in metadata.items(): info.add_text(key, text)
+                params['pnginfo'] = info
+            else:
+                params['xmp'] = _xmp_packet(metadata)
+        image.save(fp, self.format, **params)
+
+    def encode_bytes(self, image, metadata=None):
+        buffer = io.BytesIO()
+        self.encode(image, buffer, metadata)
+        return buffer.getvalue()
+
+
+def _xmp_packet(metadata):
+    attributes = ' '.join(f"meta:{key}={quoteattr(text)}" for key, text in metadata.items())
+    return (f'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="{_RDF_NAMESPACE}">'
+            f'<rdf:Description xmlns:meta="{_XMP_NAMESPACE}" {attributes}/></rdf:RDF></x:xmpmeta>').encode('utf-8')
+
+
+def read_metadata(im, key):
+    """读取 ImageEncoder.encode 写入的文本 (PNG 文本块或 XMP)。只使用打开文件时读到的文件头，不解码像素。没有时返回 None。"""
+    if key in im.info and isinstance(im.info[key], str):
+        return im.info[key]
+    xmp = im.info.get('xmp')
+    if not xmp:
+        return None
+    try:
+        root = ET.fromstring(xmp)
+    except ET.ParseError:
+        return None
+    for description in root.iter(f"{{{_RDF_NAMESPACE}}}Description"):
+        text = description.get(f"{{{_XMP_NAMESPACE}}}{key}")
+        if text is not None:
+            return text
+    return None
+
+
+def encode_report(images, encoders, repeat=1):
+    """
+    用每种编码设置编码同一批图像，返回每种设置一行: 每条线路的平均编码耗时 (毫秒，取 repeat 次中最快的一次) 和平均字节数。
+    不合法或不可用的设置记为一行错误，不影响其他设置。
+    """
+    rows = []
+    for spec in encoders:
+        try:
+            encoder = ImageEncoder(spec)
+        except ValueError as e:
+            rows.append({'encoder': spec, 'error': str(e)})
+            continue
+        seconds, sizes = [], []
+        for image in images:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = encoder.encode_bytes(image)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            seconds.append(best); sizes.append(len(data))
+        rows.append({'encoder': encoder.name, 'extension': encoder.extension, 'ms_per_route': statistics.mean(seconds) * 1000,
+                     'bytes_per_route': int(statistics.mean(sizes)), 'max_bytes': max(sizes)})
+    return rows
+
+
+def print_encode_report(rows, total_routes):
+    """输出对比表: 相对第一种设置的体积比例，以及按平均体积估算的全部线路总大小。"""
+    valid = [row for row in rows if 'error' not in row]
+    reference = valid[0]['bytes_per_route'] if valid else None
+    fastest = min(valid, key=lambda row: row['ms_per_route'], default=None)
+    smallest = min(valid, key=lambda row: row['bytes_per_route'], default=None)
+    # 中文字符占两列，表头的宽度按显示宽度扣除
+    print(f"{'编码':<24}{'毫秒/条':>7}{'KB/条':>9}{'体积':>6}{f'{total_routes} 条合计':>11}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['encoder']:<26}  跳过: {row['error']}")
+            continue
+        marks = ('  最快' if row is fastest else '') + ('  最小' if row is smallest else '')
+        print(f"{row['encoder']:<26}{row['ms_per_route']:>10.1f}{row['bytes_per_route'] / 1024:>10.1f}"
+              f"{row['bytes_per_route'] / reference:>8.0%}{row['bytes_per_route'] * total_routes / 1024 ** 2:>12.1f}MB{marks}")
+
+
+def sample_route_images(wall_dir, sample=8, scale=0.5, output_mode='full'):
+    """按输出比例绘制墙体的 sample 条线路 (在线路列表中均匀抽取)，返回 (图像列表, 线路总数)。图层模式下返回透明图层。"""
+    import draw_route
+    from wall_data import load_wall
+    wall = load_wall(Path(wall_dir))
+    routes = wall.routes
+    if sample and len(routes) > sample:
+        routes = [routes[round(i * (len(routes) - 1) / (sample - 1))] for i in range(sample)] if sample > 1 else routes[:1]
+    state = draw_route._make_render_state(wall.holds, wall.path / 'image_base.png', None, scale, overlay=output_mode == 'overlay')
+    if output_mode == 'overlay':
+        images = [draw_route.compose_route_layer(route, state['holds'], state['base_size'], state['fonts'], state['style'], state['sprites'])[0] for route in routes]
+    else:
+        images = [draw_route.compose_route_image(route, state['holds'], state['base_image'], state['fonts'], state['style'], state['sprites']) for route in routes]
+    return images, len(wall.routes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="编码报告: 用多种编码设置编码同一批线路图片，比较每条线路的编码耗时和体积，帮助为每面墙选择输出编码。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help="要测试的墙体目录。如果为空，则测试 'walls/' 下所有带 routes.json 的目录。")
+    parser.add_argument('--encoders', nargs='+', default=list(REPORT_ENCODERS), help="要比较的编码设置 (见 draw_route.py --encoder)，第一项作为体积比较的基准。")
+    parser.add_argument('--sample', type=int, default=8, help='每面墙抽取绘制的线路数。0 表示全部线路。')
+    parser.add_argument('--scale', type=float, default=0.5, help='输出比例，与工作流一致默认 0.5。')
+    parser.add_argument('--output_mode', choices=('full', 'overlay'), default='full', help='测试完整图片还是透明图层 (见 draw_route.py --output_mode)。')
+    parser.add_argument('--repeat', type=int, default=1, help='每张图片重复编码的次数 (取最快的一次)。')
+    parser.add_argument('--json', default=None, help='把报告另存为 JSON 文件。')
+    args = parser.parse_args()
+
+    wall_dirs = [Path(d) for d in args.wall_dirs] or [d for d in sorted(Path('walls').iterdir()) if (d / 'routes.json').exists()]
+    report = {}
+    for wall_dir in wall_dirs:
+        try:
+            images, total = sample_route_images(wall_dir, args.sample, args.scale, args.output_mode)
+        except IOError as e:
+            print(f"错误: 字体文件未找到。请在仓库根目录运行，并确保字体文件存在于 'fonts/' 目录下 - {e}", file=sys.stderr); sys.exit(1)
+        print(f"\n--- {wall_dir.name}: {len(images)}/{total} 条线路, 比例 {args.scale:g}, {args.output_mode} ---")
+        if not images:
+            continue
+        rows = encode_report(images, args.encoders, args.repeat)
+        print_encode_report(rows, total)
+        report[wall_dir.name] = {'routes': total, 'sampled': len(images), 'scale': args.scale, 'output_mode': args.output_mode, 'encoders': rows}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已保存: {args.json}")
@@ -1,13 +1,120 @@
-import json
 import cv2
+import json
+import math
 from pathlib import Path
 import argparse
 import sys
+import numpy as np
+from wall_data import MOVE_STYLES, flatten_routes, load_holds, load_routes
+
+# 岩点使用次数的分类: 起步、结束、左手、右手、双手 (与 MOVE_STYLES 一致) 和脚点
+USAGE_CATEGORIES = MOVE_STYLES + ('foot',)
+# 热力图在缩小这个倍数的网格上累加和模糊，再放大回原图尺寸
+HEATMAP_DOWNSAMPLE = 4
+
+def hold_usage(holds, routes):
+    """
+    统计每个岩点在所有线路中的使用次数。返回 {分类: (N,) int64 数组}，另有 'total' (所有动作和脚点) 与
+    'routes' (用到该岩点的线路数)，N 为岩点表长度。全部用 bincount 完成，不逐条线路循环计数。
+    """
+    n = len(holds)
+    move_route, moves, styles, foot_route, feet = flatten_routes(routes)
+    styled = styles >= 0
+    by_style = np.bincount(styles[styled].astype(np.int64) * n + moves[styled], minlength=len(MOVE_STYLES) * n).reshape(len(MOVE_STYLES), n)
+    usage = {category: by_style[i] for i, category in enumerate(MOVE_STYLES)}
+    usage['foot'] = np.bincount(feet, minlength=n)
+    usage['total'] = np.bincount(moves, minlength=n) + usage['foot']
+    # 同一条线路多次用到同一个岩点只算一次
+    pairs = np.unique(np.concatenate([move_route, foot_route]) * n + np.concatenate([moves, feet]))
+    usage['routes'] = np.bincount(pairs % n, minlength=n)
+    return usage
+
+def usage_report(wall_name, holds, routes, usage):
+    """可以写成 JSON 的使用统计: 每个有坐标或被引用的岩点一项，另列出有坐标但没有任何线路使用的岩点。"""
+    keys = USAGE_CATEGORIES + ('total', 'routes')
+    known = holds.known
+    entries = {hold_id: {key: int(usage[key][i]) for key in keys} for i, hold_id in enumerate(holds.ids) if known[i] or usage['total'][i]}
+    return {
+        'wall': wall_name, 'routes': len(routes), 'categories': list(keys), 'holds': entries,
+        'unused': [hold_id for i, hold_id in enumerate(holds.ids) if known[i] and not usage['total'][i]],
+    }
+
+def heatmap_density(shape, xy, weights, sigma, downsample=HEATMAP_DOWNSAMPLE):
+    """
+    把每个岩点的权重以高斯核撒到图像上，返回与图像同尺寸、最大值归一化为 1 的 float32 密度图。
+    权重先双线性地累加到缩小 downsample 倍的网格上，再做一次可分离的高斯模糊并放大，
+    耗时取决于图像尺寸而与岩点数量基本无关。
+    """
+    height, width = shape
+    grid = np.zeros((math.ceil(height / downsample), math.ceil(width / downsample)), np.float32)
+    # 与 cv2.resize 放大时的像素中心约定一致
+    gx, gy = (xy[:, 0] + 0.5) / downsample - 0.5, (xy[:, 1] + 0.5) / downsample - 0.5
+    x0, y0 = np.floor(gx).astype(np.int64), np.floor(gy).astype(np.int64)
+    fx, fy = gx - x0, gy - y0
+    for dx, dy, share in ((0, 0, (1 - fx) * (1 - fy)), (1, 0, fx * (1 - fy)), (0, 1, (1 - fx) * fy), (1, 1, fx * fy)):
+        np.add.at(grid, (np.clip(y0 + dy, 0, grid.shape[0] - 1), np.clip(x0 + dx, 0, grid.shape[1] - 1)), weights * share)
+    grid = cv2.GaussianBlur(grid, (0, 0), max(sigma / downsample, 0.5))
+    density = cv2.resize(grid, (width, height), interpolation=cv2.INTER_LINEAR)
+    peak = float(grid.max())
+    if peak > 0: density *= 1 / peak
+    return density
 
-def main(wall_dir_str: str):
+def render_heatmap(img, density, max_alpha=0.65, band=512):
     """
-    为一个指定的墙体生成调试图片，标记出所有已识别的岩点坐标。
-    这是一个本地调试工具。
+    按密度给图片就地叠加伪彩色: 密度越高越红、越不透明，没有使用的区域保持原图。
+    按行分块做 16 位整数混合，不产生整图的浮点副本。返回 img。
+    """
+    for top in range(0, img.shape[0], band):
+        rows = density[top:top + band]
+        color = cv2.applyColorMap(cv2.convertScaleAbs(rows, alpha=255), cv2.COLORMAP_JET)
+        alpha = cv2.convertScaleAbs(rows, alpha=255 * max_alpha)[..., None].astype(np.uint16)
+        blended = img[top:top + band] * (255 - alpha)
+        blended += color * alpha
+        blended += 127
+        blended //= 255
+        img[top:top + band] = blended
+    return img
+
+def default_sigma(holds, sample=256):
+    """高斯核的标准差: 岩点最近邻距离中位数的一半 (最多抽样 sample 个岩点估计)。"""
+    from spatial_index import GridIndex
+    known = np.flatnonzero(holds.known)
+    if len(known) < 2:
+        return 20.0
+    index = GridIndex.from_holds(holds)
+    picks = known[np.linspace(0, len(known) - 1, min(sample, len(known))).astype(np.int64)]
+    distances = [index.nearest(x, y, k=2)[1][0] for x, y in holds.xy[picks]]
+    return max(2.0, float(np.median(distances)) / 2)
+
+def write_usage_heatmap(wall_dir, holds, routes, category='total', sigma=None):
+    """生成岩点使用热力图 (output/debug_hold_usage_heatmap.png) 和统计 JSON (output/data/hold_usage.json)。"""
+    wall_dir = Path(wall_dir)
+    img_file = wall_dir / "image_base.png"
+    img = cv2.imread(str(img_file))
+    if img is None:
+        print(f"错误: 无法读取图片 {img_file}", file=sys.stderr)
+        sys.exit(1)
+    usage = hold_usage(holds, routes)
+    known = holds.known
+    weights = usage[category][known].astype(np.float32)
+    sigma = sigma or default_sigma(holds)
+    density = heatmap_density(img.shape[:2], holds.xy[known], weights, sigma)
+    heatmap = render_heatmap(img, density)
+    cv2.putText(heatmap, f"{category}: max {int(weights.max(initial=0))}, {len(routes)} routes", (30, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+    heatmap_file = wall_dir / "output/debug_hold_usage_heatmap.png"
+    heatmap_file.parent.mkdir(parents=True, exist_ok=True)
+    cv2.imwrite(str(heatmap_file), heatmap)
+    report_file = wall_dir / "output/data/hold_usage.json"
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(usage_report(wall_dir.name, holds, routes, usage), f, ensure_ascii=False, indent=2)
+    print(f"✅ 岩点使用热力图已生成: {heatmap_file} (统计: {report_file})")
+    return usage
+
+def main(wall_dir_str: str, holds=None, routes=None, heatmap=True, category='total', sigma=None):
+    """
+    为一个指定的墙体生成调试图片，标记出所有已识别的岩点坐标；heatmap 为 True 时另外生成岩点使用热力图和统计 JSON。
+    这是一个本地调试工具。holds / routes 可以传入已经读取好的 wall_data.HoldTable 和线路列表。
     """
     wall_dir = Path(wall_dir_str)
     
@@ -17,7 +124,7 @@ def main(wall_dir_str: str):
     output_file = wall_dir / "output/debug_all_holds_marked.png"
 
     # 2. 检查文件是否存在
-    if not holds_file.exists():
+    if holds is None and not holds_file.exists():
         print(f"错误: 岩点坐标文件不存在 '{holds_file}'", file=sys.stderr)
         sys.exit(1)
     if not img_file.exists():
@@ -25,9 +132,9 @@ def main(wall_dir_str: str):
         sys.exit(1)
 
     # 3. 加载数据和图片
-    print(f"正在加载坐标: {holds_file}")
-    with open(holds_file, "r", encoding="utf-8") as f:
-        holds = json.load(f)
+    if holds is None:
+        print(f"正在加载坐标: {holds_file}")
+        holds = load_holds(holds_file)
 
     print(f"正在加载图片: {img_file}")
     img = cv2.imread(str(img_file))
@@ -36,9 +143,12 @@ def main(wall_dir_str: str):
         sys.exit(1)
 
     # 4. 绘制所有岩点 (核心逻辑保持不变)
-    print(f"正在图片上标记 {len(holds)} 个岩点...")
-    for hold_id, coord in holds.items():
-        x, y = coord["x"], coord["y"]
+    # 这里保留逐个岩点的循环: cv2.circle / putText 只写标记本身的像素，几百个岩点只需几十毫秒；
+    # 预先画好圆圈再整体盖章 (散列写入或 cv2.dilate) 反而更慢，且每个岩点的编号文字不同，无法共用一个图块
+    coords = holds.coords()
+    print(f"正在图片上标记 {len(coords)} 个岩点...")
+    for hold_id, coord in coords.items():
+        x, y = round(coord["x"]), round(coord["y"])
         # 画一个明亮的圈来高亮显示识别出的中心点
         cv2.circle(img, (x, y), 20, (0, 255, 255), 3)
         # 标注识别出的编号
@@ -49,9 +159,18 @@ def main(wall_dir_str: str):
     cv2.imwrite(str(output_file), img)
     print(f"✅ 调试图片已成功生成: {output_file}")
 
+    if heatmap:
+        if routes is None:
+            routes_file = wall_dir / "routes.json"
+            routes = load_routes(routes_file, holds) if routes_file.exists() else []
+        write_usage_heatmap(wall_dir, holds, routes, category, sigma)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="生成一张调试图片，标记出指定墙体的所有已识别岩点。")
     parser.add_argument("--wall_dir", required=True, help="需要处理的墙体目录路径 (例如: 'walls/spray_wall')")
+    parser.add_argument("--no_heatmap", dest="heatmap", action="store_false", help="只生成岩点标记图，不生成使用热力图和统计。")
+    parser.add_argument("--category", choices=USAGE_CATEGORIES + ('total', 'routes'), default='total', help="热力图使用的计数 (默认所有动作和脚点的总次数)。")
+    parser.add_argument("--sigma", type=float, default=None, help="热力图高斯核的标准差 (像素)。默认取岩点最近邻距离中位数的一半。")
     args = parser.parse_args()
     
-    main(args.wall_dir)
+    main(args.wall_dir, heatmap=args.heatmap, category=args.category, sigma=args.sigma)
@@ -0,0 +1,95 @@
+import io
+import json
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+SPRITE_CACHE_VERSION = 2
+
+
+class SpriteCache:
+    """
+    有界的 LRU 精灵缓存。每个精灵是一张透明 RGBA 小图和它的锚点 (岩点中心在小图中的位置)，
+    只在第一次用到时光栅化一次，之后直接 alpha 合成到线路图上。
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._sprites = OrderedDict()
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def get(self, key, render):
+        """返回 key 对应的 (sprite, anchor)；未命中时调用 render() 生成并放入缓存。"""
+        entry = self._sprites.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._sprites.move_to_end(key)
+            return entry
+        self.misses += 1
+        entry = render()
+        self._sprites[key] = entry
+        if len(self._sprites) > self.maxsize:
+            self._sprites.popitem(last=False)
+        return entry
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self)}/{self.maxsize} sprites"
+
+    def save(self, path):
+        """保存为 zip: index.json 记录键和锚点，每个精灵一张 PNG。"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index = []
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zf:
+            for i, (key, (sprite, anchor)) in enumerate(self._sprites.items()):
+                buffer = io.BytesIO()
+                sprite.save(buffer, 'PNG')
+                zf.writestr(f"{i}.png", buffer.getvalue())
+                index.append({'key': list(key), 'anchor': list(anchor), 'file': f"{i}.png"})
+            zf.writestr('index.json', json.dumps({'version': SPRITE_CACHE_VERSION, 'sprites': index}, ensure_ascii=False))
+
+    def load(self, path):
+        """读取 save() 写出的缓存文件。文件不存在或版本不兼容时什么也不做。返回读取的精灵数。"""
+        try:
+            zf = zipfile.ZipFile(path)
+        except (FileNotFoundError, zipfile.BadZipFile):
+            return 0
+        with zf:
+            index = json.loads(zf.read('index.json'))
+            if index.get('version') != SPRITE_CACHE_VERSION:
+                return 0
+            for entry in index['sprites'][-self.maxsize:]:
+                sprite = Image.open(io.BytesIO(zf.read(entry['file'])))
+                sprite.load()
+                self._sprites[_to_key(entry['key'])] = (sprite, tuple(entry['anchor']))
+        return len(index['sprites'])
+
+
+def _to_key(value):
+    # JSON 把元组存成列表，读回时还原为可哈希的元组
+    return tuple(_to_key(v) for v in value) if isinstance(value, list) else value
+
+
+def composite_sprite(image, sprite, x, y):
+    """
+    把精灵的左上角放在 (x, y) 处做 alpha 合成，超出图片边界的部分会被裁掉。
+    image 可以是透明的 RGBA 图层，也可以是不透明的 RGB 画布；只有精灵覆盖的矩形区域被读写。
+    """
+    left, top = max(0, -x), max(0, -y)
+    right, bottom = min(sprite.width, image.width - x), min(sprite.height, image.height - y)
+    if left >= right or top >= bottom:
+        return
+    if image.mode == 'RGBA':
+        image.alpha_composite(sprite, (x + left, y + top), (left, top, right, bottom))
+        return
+    # 不透明画布: 取出这一小块转成 RGBA 合成后贴回，结果与在 RGBA 整图上合成逐像素相同
+    box = (x + left, y + top, x + right, y + bottom)
+    region = image.crop(box).convert('RGBA')
+    region.alpha_composite(sprite, (0, 0), (left, top, right, bottom))
+    image.paste(region.convert(image.mode), box)
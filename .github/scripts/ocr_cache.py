@@ -0,0 +1,84 @@
+import hashlib
+import json
+from pathlib import Path
+import numpy as np
+
+CACHE_VERSION = 1
+# 变化检测的分块大小 (像素)。块越小，需要重新识别的区域越精确，缓存文件也越大
+BLOCK_SIZE = 64
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def block_signatures(image, block_size=BLOCK_SIZE):
+    """把图片切成 block_size 见方的块，返回每块像素内容的短哈希 (按行优先排列) 和网格形状 (行, 列)。"""
+    height, width = image.shape[:2]
+    rows, cols = -(-height // block_size), -(-width // block_size)
+    signatures = []
+    for r in range(rows):
+        for c in range(cols):
+            block = np.ascontiguousarray(image[r * block_size:(r + 1) * block_size, c * block_size:(c + 1) * block_size])
+            signatures.append(hashlib.blake2b(block.tobytes(), digest_size=8).hexdigest())
+    return signatures, (rows, cols)
+
+
+def changed_regions(old_signatures, new_signatures, grid_shape, block_size, image_size):
+    """比较两组块哈希，把相邻的变化块合并成矩形区域，返回 [(x0, y0, x1, y1), ...] (图片坐标)。"""
+    rows, cols = grid_shape
+    width, height = image_size
+    changed = (np.array(old_signatures) != np.array(new_signatures)).reshape(rows, cols).astype(np.uint8)
+    if not changed.any():
+        return []
+    import cv2  # 只有图片变化时才会走到这里，命中缓存的运行不需要导入 OpenCV
+    count, _, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+    regions = []
+    for left, top, w, h, _ in stats[1:count]:
+        regions.append((int(left * block_size), int(top * block_size), min(width, int((left + w) * block_size)), min(height, int((top + h) * block_size))))
+    return regions
+
+
+def bbox_intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def load_cache(path):
+    """读取 OCR 缓存。文件不存在、损坏或版本不兼容时返回 None。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if cache.get('version') != CACHE_VERSION:
+        return None
+    cache.setdefault('backend', 'easyocr')
+    cache['detections'] = [(d['text'], d['x'], d['y'], d['prob'], tuple(d['bbox'])) for d in cache['detections']]
+    return cache
+
+
+def save_cache(path, image_sha256, image_size, signatures, detections, block_size=BLOCK_SIZE, backend='easyocr', holds=None):
+    """
+    保存原始检测结果 (含边界框和置信度)、产生它们的检测后端以及用于下次比较的块哈希。
+    holds 是 holds.json 的手动修改记录 (见 generate_coords.merge_manual_holds)。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cache = {
+        'version': CACHE_VERSION,
+        'image_sha256': image_sha256,
+        'backend': backend,
+        'width': image_size[0], 'height': image_size[1],
+        'block_size': block_size,
+        'blocks': signatures,
+        'detections': [{'text': t, 'x': x, 'y': y, 'prob': round(p, 4), 'bbox': list(b)} for (t, x, y, p, b) in sorted(detections)],
+    }
+    if holds is not None:
+        cache['holds'] = holds
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+        f.write('\n')
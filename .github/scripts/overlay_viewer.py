@@ -0,0 +1,123 @@
+import argparse
+import html
+import json
+from pathlib import Path
+import sys
+from PIL import Image
+from image_encoders import OUTPUT_EXTENSIONS, read_metadata
+
+# 图层文件的元数据键名 (PNG 文本块或 WebP / AVIF 的 XMP): 值为 JSON {'offset', 'canvas', 'route', 'grade', 'author'}
+LAYER_INFO_KEY = 'route-layer'
+# 图层模式下所有线路共用的底图 (已缩放到输出比例)，与图层放在同一目录
+OVERLAY_BASE_FILENAME = 'base.png'
+INDEX_FILENAME = 'index.json'
+VIEWER_FILENAME = 'index.html'
+
+
+def read_layer_info(path):
+    """只读取文件头中的图层信息，不解码像素。不是图层文件时返回 None。"""
+    with Image.open(path) as im:
+        text = read_metadata(im, LAYER_INFO_KEY)
+    return json.loads(text) if text else None
+
+
+def build_index(output_dir):
+    """扫描输出目录中的图层，返回 {'base', 'base_size', 'layers': [...]}。"""
+    output_dir = Path(output_dir)
+    base_path = output_dir / OVERLAY_BASE_FILENAME
+    with Image.open(base_path) as im:
+        base_size = list(im.size)
+    layers = []
+    for path in sorted(path for path in output_dir.iterdir() if path.suffix in OUTPUT_EXTENSIONS):
+        if path.name == OVERLAY_BASE_FILENAME:
+            continue
+        info = read_layer_info(path)
+        if info is None:
+            continue
+        layers.append({'file': path.name, 'bytes': path.stat().st_size, **info})
+    return {'base': OVERLAY_BASE_FILENAME, 'base_size': base_size, 'layers': layers}
+
+
+# 查看器是一个自包含的静态页面: 索引直接嵌入页面，用 file:// 打开也能工作。
+# 图层按百分比定位在底图上方，底图下方的黑色区域容纳标题和 beta 文字
+_VIEWER_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>__TITLE__</title>
+<style>
+body { margin: 0; background: #111; color: #eee; font-family: sans-serif; display: flex; height: 100vh; }
+#list { width: 260px; overflow-y: auto; border-right: 1px solid #333; }
+#list input { width: 100%; box-sizing: border-box; padding: 8px; background: #222; color: #eee; border: 0; }
+#list div { padding: 6px 10px; cursor: pointer; }
+#list div.active, #list div:hover { background: #333; }
+#view { flex: 1; overflow: auto; }
+#canvas { position: relative; background: #000; width: 100%; }
+#canvas img { position: absolute; display: block; }
+</style>
+</head>
+<body>
+<div id="list"><input id="filter" placeholder="筛选线路 / 难度 / 作者"></div>
+<div id="view"><div id="canvas"><img id="base"><img id="layer"></div></div>
+<script>
+const INDEX = __INDEX__;
+const canvas = document.getElementById('canvas'), base = document.getElementById('base'), layer = document.getElementById('layer');
+const [baseW, baseH] = INDEX.base_size;
+base.src = encodeURIComponent(INDEX.base);
+const pct = (v, total) => (100 * v / total) + '%';
+function show(entry, item) {
+  const [w, h] = entry.canvas;
+  canvas.style.aspectRatio = w + ' / ' + h;
+  Object.assign(base.style, {left: 0, top: 0, width: pct(baseW, w), height: pct(baseH, h)});
+  layer.onload = () => Object.assign(layer.style, {left: pct(entry.offset[0], w), top: pct(entry.offset[1], h),
+                                                   width: pct(layer.naturalWidth, w), height: pct(layer.naturalHeight, h)});
+  // 文件名按 URL 编码，线路名中的 #、?、% 不会被当成 URL 的片段、查询或转义
+  layer.src = encodeURIComponent(entry.file);
+  document.querySelectorAll('#list div').forEach(d => d.classList.toggle('active', d === item));
+  location.hash = encodeURIComponent(entry.file);
+}
+const items = INDEX.layers.map(entry => {
+  const item = document.createElement('div');
+  item.textContent = `${entry.grade} ${entry.route}` + (entry.author ? ` (${entry.author})` : '');
+  item.onclick = () => show(entry, item);
+  document.getElementById('list').appendChild(item);
+  return [entry, item];
+});
+document.getElementById('filter').oninput = e => {
+  const q = e.target.value.toLowerCase();
+  items.forEach(([, item]) => item.style.display = item.textContent.toLowerCase().includes(q) ? '' : 'none');
+};
+const initial = items.find(([entry]) => encodeURIComponent(entry.file) === location.hash.slice(1)) || items[0];
+if (initial) show(...initial);
+</script>
+</body>
+</html>
+"""
+
+
+def write_viewer(output_dir, title='Routes'):
+    """写出 index.json 和自包含的 index.html，返回索引。"""
+    output_dir = Path(output_dir)
+    index = build_index(output_dir)
+    with open(output_dir / INDEX_FILENAME, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    # 嵌入 <script> 的 JSON 需要转义 "</"，防止线路名提前结束脚本
+    embedded = json.dumps(index, ensure_ascii=False).replace('</', '<\\/')
+    page = _VIEWER_TEMPLATE.replace('__TITLE__', html.escape(title)).replace('__INDEX__', embedded)
+    with open(output_dir / VIEWER_FILENAME, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="为图层模式 (draw_route.py --output_mode overlay) 的输出目录重新生成索引和静态查看页面。")
+    parser.add_argument('output_dir', help='图层和 base.png 所在的目录。')
+    parser.add_argument('--title', default=None, help='页面标题。默认使用目录所属墙体的名称。')
+    args = parser.parse_args()
+    output_dir = Path(args.output_dir)
+    if not (output_dir / OVERLAY_BASE_FILENAME).exists():
+        print(f"错误: '{output_dir}' 中没有 {OVERLAY_BASE_FILENAME}，请先用 --output_mode overlay 绘制。", file=sys.stderr)
+        sys.exit(1)
+    index = write_viewer(output_dir, args.title or output_dir.resolve().parent.parent.name)
+    print(f"{len(index['layers'])} 个图层 -> {output_dir / VIEWER_FILENAME}")
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from pathlib import Path
+
+# 绘制逻辑发生变化 (即使 STYLE_CONFIG 没变) 时递增，使清单中的所有哈希失效
+RENDERER_VERSION = 3
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(output_dir: Path) -> Path:
+    """清单文件放在输出目录旁边，例如 output/generated_routes.manifest.json。"""
+    return output_dir.parent / f"{output_dir.name}.manifest.json"
+
+
+def _canonical_json(data) -> bytes:
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def file_digest(path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def shared_inputs_digest(base_image_path, style_config, font_paths, options=None) -> str:
+    """所有线路共享的输入: 底图字节、样式配置、字体文件以及渲染选项。"""
+    h = hashlib.sha256()
+    h.update(_canonical_json({
+        'renderer_version': RENDERER_VERSION,
+        'base_image': file_digest(base_image_path),
+        'style': style_config,
+        'fonts': [file_digest(p) for p in sorted(set(font_paths))],
+        'options': options or {},
+    }))
+    return h.hexdigest()
+
+
+def route_digest(route, holds, shared_digest) -> str:
+    """
+    一条线路图片的内容哈希: 线路 JSON 的哈希 (wall_data.Route.digest)、它引用的岩点坐标以及共享输入的哈希。
+    引用了但没有坐标的岩点记为 None，补上坐标后线路会被重绘。
+    """
+    indices = route.hold_indices()
+    coords = holds.coords(indices)
+    referenced = {holds.ids[i]: coords.get(holds.ids[i]) for i in indices}
+    return hashlib.sha256(_canonical_json({'route': route.digest, 'holds': referenced, 'shared': shared_digest})).hexdigest()
+
+
+def load_manifest(path: Path) -> dict:
+    """读取清单，返回 {文件名: 哈希}。文件不存在或格式不兼容时返回空字典 (即全部重绘)。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return {}
+    return {name: entry.get('hash') for name, entry in data.get('routes', {}).items()}
+
+
+def save_manifest(path: Path, entries: dict):
+    """entries: {文件名: {'route': 线路名, 'hash': 哈希}}。键排序输出，内容不变时文件字节也不变。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'routes': entries}, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+
+
+def update_manifest(path: Path, entries: dict):
+    """只更新清单中的部分条目 (只绘制了部分线路时)，其余条目原样保留。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = {}
+    merged = data.get('routes', {}) if isinstance(data, dict) and data.get('version') == MANIFEST_VERSION else {}
+    merged.update(entries)
+    save_manifest(path, merged)
+
+
+def keep_failed_entries(entries, previous, failed_filenames):
+    """
+    处理绘制失败的线路 (原地修改 entries)。上一次的哈希与本次不同时保留上一次的条目: 旧图片仍是最后一张好图，
+    下次运行会因哈希不同而重试。哈希相同 (图片本来就缺失) 或没有旧条目时从清单中删除，下次同样重试。
+    """
+    for filename in failed_filenames:
+        old_hash = previous.get(filename)
+        if filename in entries and old_hash is not None and old_hash != entries[filename]['hash']:
+            entries[filename] = dict(entries[filename], hash=old_hash)
+        else:
+            entries.pop(filename, None)
+
+
+def prune_stale_outputs(output_dir: Path, keep_filenames, pattern='*.png'):
+    """删除输出目录中不再对应任何线路的图片 (线路被删除或改名)。返回被删除的路径列表。"""
+    removed = []
+    for path in sorted(output_dir.glob(pattern)):
+        if path.name not in keep_filenames:
+            path.unlink()
+            removed.append(path)
+    return removed
@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+import sys
+import numpy as np
+from wall_data import expected_hold_ids, load_wall, normalize_hold_id
+
+# 生成参数的默认值，可以在 config.json 的 "generator" 中按墙体覆盖。长度都以 reach (单手最大移动距离) 为单位，
+# reach 未配置时取岩点最近邻距离中位数的 reach_factor 倍 (不超过 config.json 的 max_move_distance)
+GENERATOR_DEFAULTS = {
+    'reach': None, 'reach_factor': 4.0,
+    'min_move': 0.25,        # 每次移动的最短距离
+    'max_drop': 0.2,         # 移动的手最多可以比原来低多少
+    'cross': 0.3,            # 左手最多可以在右手右侧多远 (交叉手)
+    'start_band': 0.35,      # 起步点位于岩点高度范围最下方的这一比例内
+    'finish_band': 0.2,      # 结束点位于最上方的这一比例内
+    'min_moves': 3, 'max_moves': 10,  # 起步和结束之间的移动次数
+    'foot_min': 0.5, 'foot_max': 1.6, 'foot_spread': 0.75,  # 脚点支撑: 手点下方的这一范围内需要有岩点
+}
+# 难度模型: d = 移动距离均值与最大值 (相对 reach) 的平均，V 级别 ≈ slope * d + intercept。
+# 墙上已有足够多带 V 级别的线路时按它们拟合，否则使用这组默认值
+DEFAULT_GRADE_MODEL = (10.0, -2.0)
+MIN_ROUTES_FOR_FIT = 8
+
+
+def _grade_number(grade):
+    match = re.match(r'\s*V(\d+)', str(grade), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+class RouteGenerator:
+    """
+    在岩点坐标表上自动生成线路。可达关系预先算成 N×N 的布尔矩阵，然后对一整批部分线路做向量化的随机束搜索:
+    每一步把所有部分线路的全部候选岩点一次性打分 (向上的进展、移动距离与目标难度的接近程度、Gumbel 噪声)，
+    每条部分线路保留得分最高的几个后继，整批再保留 beam_width 个。到达结束区域的线路以双手结束并去重输出。
+    """
+
+    def __init__(self, wall, require_feet=False, seed=0, **overrides):
+        self.wall = wall
+        params = dict(GENERATOR_DEFAULTS, **wall.config.get('generator', {}), **{k: v for k, v in overrides.items() if v is not None})
+        holds = wall.holds
+        known = np.flatnonzero(holds.known)
+        expected = expected_hold_ids(wall.config)
+        if expected: known = np.array([i for i in known if holds.ids[i] in expected], np.int64)
+        self.table_index = known  # 生成器内部下标 -> HoldTable 下标
+        self.ids = [holds.ids[i] for i in known]
+        xy = holds.xy[known]
+        self.x, self.y = xy[:, 0], xy[:, 1]
+        n = len(known)
+        self.distance = np.hypot(self.x[:, None] - self.x[None, :], self.y[:, None] - self.y[None, :])
+        if params['reach'] is None:
+            nearest = np.where(np.eye(n, dtype=bool), np.inf, self.distance).min(axis=1) if n > 1 else np.ones(1)
+            params['reach'] = float(np.median(nearest)) * params['reach_factor']
+            if wall.config.get('max_move_distance'): params['reach'] = min(params['reach'], float(wall.config['max_move_distance']))
+        self.params = params
+        reach = params['reach']
+        # 单手移动: 距离在 [min_move, reach] 内，且不低于原位置太多；双手间距不超过 reach
+        self.move_ok = (self.distance >= params['min_move'] * reach) & (self.distance <= reach) & (self.y[None, :] <= self.y[:, None] + params['max_drop'] * reach)
+        self.span_ok = (self.distance <= reach) & ~np.eye(n, dtype=bool)
+        foot_only = {normalize_hold_id(h) for h in wall.config.get('foot_only_holds', [])}
+        self.hand_ok = np.array([hold_id not in foot_only for hold_id in self.ids], bool)
+        self.require_feet = require_feet
+        if require_feet:
+            # 手点下方 [foot_min, foot_max] * reach、水平 foot_spread * reach 以内有任意岩点即视为有脚点支撑
+            self.foot_index = np.flatnonzero(holds.known)  # 脚点候选 (列) -> HoldTable 下标
+            all_xy = holds.xy[self.foot_index]
+            dy = all_xy[None, :, 1] - self.y[:, None]; dx = np.abs(all_xy[None, :, 0] - self.x[:, None])
+            self.foot_support = (dy >= params['foot_min'] * reach) & (dy <= params['foot_max'] * reach) & (dx <= params['foot_spread'] * reach)
+            # 选脚点时偏向支撑范围中部、手点正下方的岩点
+            self.foot_cost = np.hypot(dx, dy - (params['foot_min'] + params['foot_max']) / 2 * reach)
+            self.footed = self.foot_support.any(axis=1)
+        else:
+            self.footed = np.ones(n, bool)
+        top, bottom = (self.y.min(), self.y.max()) if n else (0, 0)
+        self.start = self.hand_ok & (self.y >= bottom - params['start_band'] * (bottom - top))
+        self.finish = self.hand_ok & (self.y <= top + params['finish_band'] * (bottom - top))
+        self.grade_model = self._fit_grade_model()
+        self.rng = np.random.default_rng(seed)
+        # 已有线路的动作序列，生成结果与它们相同时视为重复
+        index = {table_i: i for i, table_i in enumerate(known.tolist())}
+        self.seen = {tuple(index.get(int(h), -1) for h in route.moves) for route in wall.routes}
+
+    # --- 难度 ---
+    def difficulty(self, mean_ratio, max_ratio):
+        return (mean_ratio + max_ratio) / 2
+
+    def _fit_grade_model(self):
+        """用墙上已有线路拟合 V 级别 ≈ slope * d + intercept；线路不足或拟合出非正斜率时使用默认值。"""
+        samples = []
+        reach = self.params['reach']
+        for route in self.wall.routes:
+            grade = _grade_number(route.grade)
+            # 按左右手交替估计每只手的移动距离: 同一只手的相邻两个岩点在动作序列中相隔两个位置
+            xy = self.wall.holds.xy[route.moves]
+            moves = np.hypot(*(xy[2:] - xy[:-2]).T) if len(xy) > 2 else np.zeros(0)
+            if grade is None or not len(moves) or np.isnan(moves).any(): continue
+            samples.append((self.difficulty(moves.mean() / reach, moves.max() / reach), grade))
+        if len(samples) >= MIN_ROUTES_FOR_FIT and len({g for _, g in samples}) >= 3:
+            d, g = np.array(samples).T
+            slope, intercept = np.polyfit(d, g, 1)
+            if slope > 0: return float(slope), float(intercept)
+        return DEFAULT_GRADE_MODEL
+
+    def grade_of(self, difficulty):
+        slope, intercept = self.grade_model
+        return np.maximum(0, np.rint(slope * np.asarray(difficulty) + intercept)).astype(int)
+
+    def target_difficulty(self, grade):
+        slope, intercept = self.grade_model
+        return (grade - intercept) / slope
+
+    # --- 搜索 ---
+    def _start_states(self, count):
+        """随机选取起步的 (左手, 右手) 组合: 都在起步区域内，左手在左，双手间距合适。"""
+        starts = np.flatnonzero(self.start)
+        pairs = np.argwhere(self.span_ok[np.ix_(starts, starts)] & (self.x[starts][:, None] < self.x[starts][None, :]))
+        if not len(pairs): return None
+        pick = pairs[self.rng.integers(len(pairs), size=count)]
+        return starts[pick[:, 0]], starts[pick[:, 1]]
+
+    def search(self, target_grade=None, beam_width=2048, children=3, temperature=0.5):
+        """
+        一轮束搜索。返回若干批到达结束点的线路，每批为 (行号, 结束点, 难度, 左手起步点, 右手起步点, 中间动作, 先动的手) 数组。
+        动作序列以左、右手起步开始，之后左右手交替移动，最后一个动作是双手结束。
+        """
+        p = self.params; reach = p['reach']
+        start = self._start_states(beam_width)
+        if start is None: return []
+        left, right = start
+        start_left, start_right = left, right
+        size = len(left)
+        target = self.target_difficulty(target_grade) if target_grade is not None else None
+        first_hand = self.rng.integers(2, size=size)  # 0: 左手先动, 1: 右手先动
+        path = np.full((size, p['max_moves'] + 1), -1, np.int64)
+        used = np.zeros((size, len(self.ids)), bool)
+        used[np.arange(size), left] = True; used[np.arange(size), right] = True
+        ratio_sum = np.zeros(size); ratio_max = np.zeros(size)
+        results = []
+        for step in range(p['max_moves'] + 1):
+            moving_left = (first_hand + step) % 2 == 0
+            mover = np.where(moving_left, left, right); other = np.where(moving_left, right, left)
+            ratio = self.distance[mover] / reach
+            # 结束: 移动的手和另一只手都够得到结束点 (双手结束)
+            if step >= p['min_moves']:
+                done = self.finish[None, :] & self.move_ok[mover] & self.span_ok[other] & ~used
+                rows, holds = np.nonzero(done)
+                if len(rows):
+                    r = ratio[rows, holds]
+                    moves = step + 1
+                    difficulty = self.difficulty((ratio_sum[rows] + r) / moves, np.maximum(ratio_max[rows], r))
+                    results.append((rows, holds, difficulty, start_left[rows], start_right[rows], path[rows, :step].copy(), first_hand[rows]))
+            if step == p['max_moves']: break
+            candidates = self.move_ok[mover] & self.span_ok[other] & ~used & self.hand_ok[None, :] & (self.footed[None, :] | self.footed[other][:, None])
+            # 左手不能跑到右手右侧太远，反之亦然
+            other_x = self.x[other][:, None]
+            candidates &= np.where(moving_left[:, None], self.x[None, :] <= other_x + p['cross'] * reach, self.x[None, :] >= other_x - p['cross'] * reach)
+            score = (self.y[mover][:, None] - self.y[None, :]) / reach
+            if target is not None: score = score - 2 * np.abs(ratio - target)
+            score = score + temperature * self.rng.gumbel(size=score.shape)
+            score[~candidates] = -np.inf
+            # 每条部分线路保留 children 个后继，整批再保留 beam_width 个
+            k = min(children, score.shape[1])
+            top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+            rows = np.repeat(np.arange(len(score)), k); holds = top.ravel()
+            keep = np.isfinite(score[rows, holds])
+            rows, holds = rows[keep], holds[keep]
+            if not len(rows): break
+            if len(rows) > beam_width:
+                best = np.argpartition(-score[rows, holds], beam_width - 1)[:beam_width]
+                rows, holds = rows[best], holds[best]
+            r = ratio[rows, holds]
+            moved_left = moving_left[rows]
+            left = np.where(moved_left, holds, left[rows]); right = np.where(moved_left, right[rows], holds)
+            path = path[rows]; path[:, step] = holds
+            used = used[rows]; used[np.arange(len(rows)), holds] = True
+            ratio_sum = ratio_sum[rows] + r; ratio_max = np.maximum(ratio_max[rows], r)
+            first_hand, start_left, start_right = first_hand[rows], start_left[rows], start_right[rows]
+        return results
+
+    def generate(self, count, target_grade=None, tolerance=1, beam_width=2048, time_limit=None, **search_options):
+        """生成最多 count 条去重后的线路 JSON (routes.json 格式)。target_grade 为 V 级别数字，None 表示不限难度。"""
+        start_time = time.perf_counter()
+        routes, rounds = [], 0
+        while len(routes) < count and (time_limit is None or time.perf_counter() - start_time < time_limit):
+            rounds += 1
+            produced = 0
+            for rows, finish, difficulty, start_left, start_right, paths, first_hand in self.search(target_grade, beam_width, **search_options):
+                grades = self.grade_of(difficulty)
+                for i in range(len(rows)):
+                    if target_grade is not None and abs(grades[i] - target_grade) > tolerance: continue
+                    middle = [h for h in paths[i].tolist() if h >= 0]
+                    sequence = (int(start_left[i]), int(start_right[i]), *middle, int(finish[i]))
+                    if sequence in self.seen: continue
+                    self.seen.add(sequence)
+                    routes.append(self._route_json(sequence, int(first_hand[i]), int(grades[i])))
+                    produced += 1
+                    if len(routes) >= count: break
+                if len(routes) >= count: break
+            # 连续没有新线路时说明这面墙在当前参数下的线路已经被穷尽
+            if not produced and rounds >= 3: break
+        return routes
+
+    def _route_json(self, sequence, first_hand, grade):
+        ids = [self.ids[i] for i in sequence]
+        moves = [{'hold_id': ids[0], 'type': 'start', 'hand': 'left'}, {'hold_id': ids[1], 'type': 'start', 'hand': 'right'}]
+        for step, hold_id in enumerate(ids[2:-1]):
+            moves.append({'hold_id': hold_id, 'hand': 'left' if (first_hand + step) % 2 == 0 else 'right'})
+        moves.append({'hold_id': ids[-1], 'type': 'finish', 'hand': 'both'})
+        tag = hashlib.sha256(' '.join(ids).encode('utf-8')).hexdigest()[:6]
+        return {'routeName': f"V{grade} - Auto {tag}", 'difficulty': f"V{grade}", 'author': 'route_generator', 'beta': '', 'holds': {'foot': self._foot_holds(sequence)}, 'moves': moves}
+
+    def _foot_holds(self, sequence):
+        """
+        require_feet 时为线路中每个有脚点支撑的手点选一个脚点 (支撑范围内最靠近中部、且不是本线路手点的岩点)，
+        按动作顺序去重后返回编号列表。支撑只来自其他手点的手点不另选脚点。
+        """
+        if not self.require_feet: return []
+        sequence = list(sequence)
+        cost = np.where(self.foot_support[sequence], self.foot_cost[sequence], np.inf)
+        cost[:, np.isin(self.foot_index, self.table_index[sequence])] = np.inf
+        best = cost.argmin(axis=1)
+        picks = self.foot_index[best[np.isfinite(cost[np.arange(len(sequence)), best])]]
+        return list(dict.fromkeys(self.wall.holds.ids[i] for i in picks.tolist()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="根据岩点坐标自动生成候选线路 (routes.json 格式)。生成参数可在 config.json 的 generator 中按墙体配置。")
+    parser.add_argument('wall_dir', help='墙体目录。')
+    parser.add_argument('--count', type=int, default=1000, help='要生成的线路数。')
+    parser.add_argument('--grade', type=str, default=None, help='目标难度 (例如 V3)。不指定时不限难度，按难度模型标注。')
+    parser.add_argument('--tolerance', type=int, default=1, help='接受的难度与目标相差的级别数。')
+    parser.add_argument('--reach', type=float, default=None, help='单手最大移动距离 (像素)，覆盖 config.json 和默认估计。')
+    parser.add_argument('--require_feet', action='store_true', help='要求每个手点状态下方都有可用的脚点，并把选出的脚点写入线路的 holds.foot。')
+    parser.add_argument('--beam_width', type=int, default=2048, help='束搜索每一步保留的部分线路数。')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子。')
+    parser.add_argument('--time_limit', type=float, default=None, help='最长生成时间 (秒)。')
+    parser.add_argument('--output', type=str, default=None, help='输出文件。默认写到 <墙体>/output/data/route_candidates.json。')
+    args = parser.parse_args()
+
+    wall = load_wall(args.wall_dir)
+    target = _grade_number(args.grade) if args.grade else None
+    if args.grade and target is None:
+        print(f"错误: 无法识别的难度 '{args.grade}'，应为 V0、V3 这样的格式。", file=sys.stderr); sys.exit(1)
+    start = time.perf_counter()
+    generator = RouteGenerator(wall, require_feet=args.require_feet, seed=args.seed, reach=args.reach)
+    routes = generator.generate(args.count, target, args.tolerance, args.beam_width, args.time_limit)
+    seconds = time.perf_counter() - start
+    slope, intercept = generator.grade_model
+    print(f"{wall.name}: {len(generator.ids)} 个岩点, reach {generator.params['reach']:.0f}px, 难度模型 V ≈ {slope:.1f} * d {intercept:+.1f}")
+    print(f"生成 {len(routes)} 条线路, 耗时 {seconds:.2f}s ({len(routes) / max(seconds, 1e-9):.0f} 条/秒)")
+    output = Path(args.output) if args.output else Path(args.wall_dir) / 'output/data/route_candidates.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(routes, f, ensure_ascii=False, indent=2)
+    print(f"已写入 {output}")
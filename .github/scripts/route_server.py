@@ -0,0 +1,284 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+import sys
+
+from draw_route import _init_worker, _render_route_png_task, render_inputs_digest
+from render_manifest import route_digest
+from wall_data import MISSING_HOLD_ID, HoldTable, Route, iter_route_records, load_config, load_holds, normalize_hold_id
+
+
+class ImageCache:
+    """按总字节数限制的 LRU 缓存: 键为线路图片的内容哈希 (见 render_manifest.route_digest)，值为 PNG 字节。"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def stats(self):
+        return {'images': len(self), 'bytes': self.bytes, 'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+def unknown_hold_ids(route_data, holds):
+    """线路 JSON 中引用了但岩点表里没有的编号 (规范化、去重、排序)。"""
+    hold_ids = [move['hold_id'] for move in route_data.get('moves', ())] + list(route_data.get('holds', {}).get('foot', ()))
+    return sorted({normalize_hold_id(hold_id) for hold_id in hold_ids if holds.lookup(hold_id) is None})
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class WallRenderer:
+    """
+    一面墙的常驻渲染状态: 岩点表、线路数据库和一个进程池。工作进程在启动时各自解码一次底图、加载一次字体，
+    之后每个请求只发送线路 JSON。holds.json 或底图被修改时重建进程池，routes.json 被修改时只重新读取线路。
+    请求中的岩点编号只查询不驻留: 未知编号共用一个没有坐标的占位下标 (不绘制)，岩点表的大小不随请求增长。
+    """
+
+    def __init__(self, wall_dir, cache, scale=1.0, workers=2):
+        self.wall_dir = Path(wall_dir)
+        self.name = load_config(self.wall_dir).get('wall_name', self.wall_dir.name)
+        self.cache, self.scale, self.workers = cache, scale, workers
+        self.holds_path, self.base_image_path, self.routes_path = self.wall_dir / 'output/data/holds.json', self.wall_dir / 'image_base.png', self.wall_dir / 'routes.json'
+        self.renders = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._pool = None
+        self._stamp = None
+        self._routes_stamp = None
+        self._routes = []
+
+    def _refresh(self):
+        """在 self._lock 内调用: 按文件修改时间决定是否重新读取岩点、底图和线路。"""
+        stamp = (_mtime(self.holds_path), _mtime(self.base_image_path))
+        if stamp != self._stamp:
+            if self._pool is not None:
+                # 已提交的绘制仍会完成，新请求交给新的进程池
+                self._pool.shutdown(wait=False)
+            self.holds = load_holds(self.holds_path) if stamp[0] is not None else HoldTable()
+            self.missing = self.holds.intern(MISSING_HOLD_ID)
+            self.shared = render_inputs_digest(self.base_image_path, self.scale)
+            # 服务器是多线程的，用 spawn 启动工作进程，避免 fork 时复制其他线程持有的锁
+            self._pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'), initializer=_init_worker,
+                                             initargs=(self.holds, self.base_image_path, None, self.scale))
+            self._stamp = stamp
+        routes_stamp = _mtime(self.routes_path)
+        if routes_stamp != self._routes_stamp:
+            self._routes = list(iter_route_records(self.routes_path)) if routes_stamp is not None else []
+            self._routes_stamp = routes_stamp
+
+    def start(self):
+        """提前启动工作进程 (解码底图、加载字体)，第一个请求不必等待初始化。"""
+        with self._lock:
+            self._refresh()
+            for _ in range(self.workers): self._pool.submit(os.getpid)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None: self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def routes(self):
+        with self._lock:
+            self._refresh()
+            return self._routes
+
+    def find_route(self, route_id):
+        """按序号或线路名 (不区分大小写) 查找 routes.json 中的线路 JSON，找不到时返回 None。"""
+        routes = self.routes()
+        if route_id.isdigit():
+            return routes[int(route_id)] if int(route_id) < len(routes) else None
+        wanted = route_id.strip().lower()
+        return next((r for r in routes if str(r.get('routeName', r.get('name', ''))).strip().lower() == wanted), None)
+
+    def cache_key(self, route_data):
+        """返回 (内容哈希, 未知岩点编号)。哈希覆盖线路 JSON、它引用的岩点坐标、底图、样式、字体和输出比例。"""
+        with self._lock:
+            self._refresh()
+            route = Route.from_json(route_data, self.holds, with_digest=True, missing=self.missing)
+            return route_digest(route, self.holds, self.shared), unknown_hold_ids(route_data, self.holds)
+
+    def render(self, route_data, key):
+        """返回 (PNG 字节, 是否命中缓存)。同一条线路的并发请求只绘制一次。"""
+        data = self.cache.get(key)
+        if data is not None:
+            return data, True
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = self._pool.submit(_render_route_png_task, route_data, self.missing)
+                self.renders += 1
+        try:
+            data = future.result()
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future: del self._inflight[key]
+        self.cache.put(key, data)
+        return data, False
+
+
+class RouteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, walls, cache):
+        super().__init__(address, RouteRequestHandler)
+        self.walls, self.cache = walls, cache
+
+    def stats(self):
+        return {'cache': self.cache.stats(), 'walls': {key: {'name': wall.name, 'renders': wall.renders} for key, wall in self.walls.items()}}
+
+
+class RouteRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /walls                        墙体列表
+    GET  /walls/<墙体>/routes          routes.json 中的线路列表
+    GET  /walls/<墙体>/routes/<序号或线路名>   绘制 routes.json 中的一条线路，返回 PNG
+    POST /walls/<墙体>/render          请求体为一条线路 JSON，返回 PNG
+    线路引用了 holds.json 中没有的岩点时，这些岩点不绘制，编号列在 X-Missing-Holds 响应头中 (JSON 数组)。
+    GET  /stats                        缓存命中率等统计
+    """
+    server_version = 'RouteServer/1.0'
+
+    def _parts(self):
+        return [unquote(part) for part in urlsplit(self.path).path.split('/') if part]
+
+    def _send_json(self, value, status=HTTPStatus.OK):
+        body = json.dumps(value, ensure_ascii=False, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json({'error': message}, status)
+
+    def _wall(self, key):
+        wall = self.server.walls.get(key)
+        if wall is None: self._send_error(HTTPStatus.NOT_FOUND, f"墙体 '{key}' 不存在")
+        return wall
+
+    def _send_route(self, wall, route_data):
+        start = time.perf_counter()
+        key, unknown = wall.cache_key(route_data)
+        etag = f'"{key}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED); self.send_header('ETag', etag); self.end_headers()
+            return
+        try:
+            data, hit = wall.render(route_data, key)
+        except Exception as e:
+            return self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"绘制失败: {type(e).__name__}: {e}")
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        if unknown: self.send_header('X-Missing-Holds', json.dumps(unknown))
+        self.send_header('Server-Timing', f"render;dur={(time.perf_counter() - start) * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = self._parts()
+        if parts == ['stats']:
+            return self._send_json(self.server.stats())
+        if parts in ([], ['walls']):
+            return self._send_json([{'wall': key, 'name': wall.name, 'routes': f"/walls/{key}/routes"} for key, wall in self.server.walls.items()])
+        if len(parts) in (3, 4) and parts[0] == 'walls' and parts[2] == 'routes':
+            wall = self._wall(parts[1])
+            if wall is None: return
+            if len(parts) == 3:
+                return self._send_json([{'index': i, 'name': r.get('routeName', r.get('name', 'N/A')), 'grade': r.get('difficulty', r.get('grade', 'N/A')),
+                                         'url': f"/walls/{parts[1]}/routes/{i}"} for i, r in enumerate(wall.routes())])
+            route_data = wall.find_route(parts[3].removesuffix('.png'))
+            if route_data is None: return self._send_error(HTTPStatus.NOT_FOUND, f"线路 '{parts[3]}' 不存在")
+            return self._send_route(wall, route_data)
+        self._send_error(HTTPStatus.NOT_FOUND, '未知的路径')
+
+    def do_POST(self):
+        parts = self._parts()
+        if len(parts) != 3 or parts[0] != 'walls' or parts[2] != 'render':
+            return self._send_error(HTTPStatus.NOT_FOUND, '未知的路径')
+        wall = self._wall(parts[1])
+        if wall is None: return
+        try:
+            route_data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+        except (ValueError, UnicodeDecodeError) as e:
+            return self._send_error(HTTPStatus.BAD_REQUEST, f"请求体不是合法的 JSON: {e}")
+        if not isinstance(route_data, dict):
+            return self._send_error(HTTPStatus.BAD_REQUEST, '请求体应为一条线路的 JSON 对象')
+        try:
+            return self._send_route(wall, route_data)
+        except (KeyError, TypeError, AttributeError) as e:
+            return self._send_error(HTTPStatus.BAD_REQUEST, f"线路 JSON 格式错误: {type(e).__name__}: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地线路预览服务: 常驻各墙体的底图、岩点表和字体，按需绘制线路图片，结果按内容哈希缓存。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help="要提供服务的墙体目录。如果为空，则使用 'walls/' 下所有带 routes.json 的目录。")
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址。')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口。')
+    parser.add_argument('--scale', type=float, default=0.5, help='输出图片相对原图的缩放比例，与工作流一致默认 0.5。')
+    parser.add_argument('--workers', type=int, default=2, help='每面墙的绘图进程数。')
+    parser.add_argument('--cache_mb', type=float, default=256, help='已绘制图片缓存的上限 (MB)。')
+    args = parser.parse_args()
+
+    wall_dirs = [Path(d) for d in args.wall_dirs] or [d for d in sorted(Path('walls').iterdir()) if (d / 'routes.json').exists()]
+    if not wall_dirs:
+        print("没有找到任何墙体目录。", file=sys.stderr); sys.exit(1)
+    cache = ImageCache(int(args.cache_mb * 1024 * 1024))
+    walls = {wall_dir.name: WallRenderer(wall_dir, cache, args.scale, args.workers) for wall_dir in wall_dirs}
+    for wall in walls.values(): wall.start()
+    server = RouteServer((args.host, args.port), walls, cache)
+    print(f"Serving {len(walls)} wall(s) on http://{args.host}:{args.port}/walls")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for wall in walls.values(): wall.shutdown()
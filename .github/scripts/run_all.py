@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+# 只导入轻量模块。PIL / cv2 / easyocr 由各阶段在真正执行时才导入，只绘图的运行不会加载 OCR 依赖
+from wall_data import load_wall
+
+# 阶段按此顺序执行；coords 会改写 holds.json，之后的阶段共用重新读取的墙体数据
+STAGES = ('coords', 'render', 'tiles', 'debug', 'check', 'duplicates', 'validate')
+# tiles 会生成大量小文件，而工作流会提交 walls/ 下的全部输出，所以只在显式指定时执行
+DEFAULT_STAGES = tuple(stage for stage in STAGES if stage != 'tiles')
+
+
+class WallJob:
+    """一面墙的所有阶段共享的状态: 墙体数据只读取一次，holds.json 被改写后才重新读取。"""
+
+    def __init__(self, wall_dir, with_digest):
+        self.wall_dir = Path(wall_dir)
+        self.with_digest = with_digest
+        self._wall = None
+        self.results = []  # [(阶段, 状态, 耗时, 说明)]
+
+    @property
+    def wall(self):
+        if self._wall is None:
+            self._wall = load_wall(self.wall_dir, with_digest=self.with_digest)
+        return self._wall
+
+    def invalidate(self):
+        self._wall = None
+
+    @property
+    def holds_path(self):
+        return self.wall_dir / 'output/data/holds.json'
+
+
+# --- 阶段 ---
+# 每个阶段返回一句简短的说明；抛出异常或 sys.exit 即视为失败，不影响其他墙体
+def stage_coords(job, options):
+    from generate_coords import generate_coords
+    changed = generate_coords(str(job.wall_dir / 'image_marked.png'), str(job.holds_path), tile_size=options.tile_size,
+                              workers=options.ocr_workers, cache_path_str=str(job.wall_dir / 'output/data/ocr_cache.json'), backend=options.backend)
+    if changed:
+        job.invalidate()
+    return '已更新 holds.json' if changed else '命中 OCR 缓存'
+
+
+def stage_render(job, options):
+    from draw_route import process_all_routes
+    from image_encoders import DEFAULT_ENCODER
+    wall = job.wall
+    # 缩放后的样式、字体和精灵缓存都是这次调用自己的，多面墙可以同时绘制
+    process_all_routes(job.wall_dir / 'routes.json', job.holds_path, job.wall_dir / 'image_base.png', job.wall_dir / 'output/generated_routes',
+                       workers=options.render_workers, incremental=options.incremental, scale=options.scale, holds=wall.holds, routes=wall.routes,
+                       output_mode=options.output_mode, encoder=options.encoder or wall.config.get('encoder', DEFAULT_ENCODER))
+    return f"{len(wall.routes)} 条线路"
+
+
+def stage_tiles(job, options):
+    from tile_pyramid import export_wall_tiles
+    wall = job.wall
+    drawn, total = export_wall_tiles(job.wall_dir, tile_size=options.tile_pyramid_size, holds=wall.holds, routes=wall.routes)
+    return f"{drawn}/{total} 条线路重新导出瓦片"
+
+
+def stage_debug(job, options):
+    from mark_all_holds import main as mark_all_holds
+    mark_all_holds(str(job.wall_dir), holds=job.wall.holds, routes=job.wall.routes)
+    return 'debug_all_holds_marked.png, debug_hold_usage_heatmap.png'
+
+
+def stage_check(job, options):
+    from check_missing_holds import check_holds
+    missing = check_holds(str(job.wall_dir), holds=job.wall.holds)
+    return '跳过 (未定义 valid_hold_ranges)' if missing is None else f"{len(missing)} 个缺失的岩点"
+
+
+def stage_duplicates(job, options):
+    from spatial_index import near_duplicate_report, print_near_duplicates
+    report = near_duplicate_report(job.wall_dir, options.min_distance, holds=job.wall.holds, config=job.wall.config)
+    print_near_duplicates(report, options.min_distance)
+    return f"{len(report['pairs'])} 对过近的岩点"
+
+
+def stage_validate(job, options):
+    from validate_routes import print_report, wall_report
+    start = time.perf_counter()
+    report = {'walls': [wall_report(job.wall)]}
+    report['seconds'] = round(time.perf_counter() - start, 4)
+    print_report(report)
+    path = job.wall_dir / 'output/data/validation_report.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    wall = report['walls'][0]
+    if options.strict and wall['errors']:
+        raise RuntimeError(f"{wall['errors']} 个错误")
+    return f"{wall['errors']} 个错误, {wall['warnings']} 个警告"
+
+
+STAGE_FUNCTIONS = {name: globals()[f'stage_{name}'] for name in STAGES}
+
+
+def run_wall(job, stages, options):
+    """按顺序执行一面墙的各个阶段。coords 失败时跳过依赖坐标的后续阶段。"""
+    for stage in stages:
+        start = time.perf_counter()
+        try:
+            note, status = STAGE_FUNCTIONS[stage](job, options), 'ok'
+        except SystemExit as e:
+            note, status = f"退出码 {e.code}", 'failed'
+        except Exception as e:
+            traceback.print_exc()
+            note, status = f"{type(e).__name__}: {e}", 'failed'
+        job.results.append((stage, status, time.perf_counter() - start, note))
+        if status == 'failed' and stage == 'coords':
+            for skipped in stages[stages.index(stage) + 1:]:
+                job.results.append((skipped, 'skipped', 0.0, 'coords 阶段失败'))
+            break
+    return job
+
+
+def discover_walls(walls_root):
+    return [d for d in sorted(Path(walls_root).iterdir()) if d.is_dir() and (d / 'routes.json').exists()]
+
+
+def needs_ocr(wall_dirs, backend='easyocr'):
+    """哪些墙体的 coords 阶段需要真正运行识别 (OCR 缓存未命中)。只读文件头和哈希，不导入任何重依赖。"""
+    from ocr_cache import file_sha256, load_cache
+    pending = []
+    for wall_dir in wall_dirs:
+        cache = load_cache(wall_dir / 'output/data/ocr_cache.json')
+        image_path, holds_path = wall_dir / 'image_marked.png', wall_dir / 'output/data/holds.json'
+        if not (cache and holds_path.exists() and cache['backend'] == backend and cache['image_sha256'] == file_sha256(image_path)):
+            pending.append(wall_dir)
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在一个进程中对所有墙体依次执行坐标识别、绘图和各项检查。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help="要处理的墙体目录。如果为空，则处理 'walls/' 下所有带 routes.json 的目录。")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(DEFAULT_STAGES), help='要执行的阶段 (按固定顺序执行)。默认不包括 tiles。')
+    parser.add_argument('--concurrency', type=int, default=0, help='同时处理的墙体数。0 表示 min(墙体数, CPU 核心数)。')
+    parser.add_argument('--backend', choices=('easyocr', 'opencv'), default='easyocr', help='coords 阶段的检测后端。')
+    parser.add_argument('--tile_size', type=int, default=1024, help='coords 阶段的分块大小 (像素)。')
+    parser.add_argument('--ocr_workers', type=int, default=0, help='coords 阶段的并行进程数。0 表示使用全部 CPU 核心。')
+    parser.add_argument('--render_workers', type=int, default=0, help='render 阶段的并行进程数。0 表示使用全部 CPU 核心。')
+    parser.add_argument('--scale', type=float, default=0.5, help='render 阶段的输出比例。')
+    parser.add_argument('--output_mode', choices=('full', 'overlay'), default='full', help='render 阶段的输出模式 (见 draw_route.py --output_mode)。')
+    parser.add_argument('--encoder', default=None, help="render 阶段的输出编码 (见 draw_route.py --encoder)。默认使用墙体 config.json 中的 'encoder'，没有时为 png。")
+    parser.add_argument('--no_incremental', dest='incremental', action='store_false', help='render 阶段重绘所有线路。')
+    parser.add_argument('--tile_pyramid_size', type=int, default=256, help='tiles 阶段的瓦片边长 (像素，不小于 2 的偶数)。')
+    parser.add_argument('--min_distance', type=float, default=15, help='duplicates 阶段判定疑似重复岩点的距离 (像素)。')
+    parser.add_argument('--strict', action='store_true', help='validate 阶段发现错误时视为失败。')
+    parser.add_argument('--needs_ocr', action='store_true', help='只输出 coords 阶段需要真正运行识别的墙体 (每行一个)，不执行任何阶段。')
+    options = parser.parse_args()
+
+    start = time.perf_counter()
+    wall_dirs = [Path(d) for d in options.wall_dirs] or discover_walls('walls')
+    if options.needs_ocr:
+        for wall_dir in needs_ocr(wall_dirs, options.backend): print(wall_dir)
+        return
+    if not wall_dirs:
+        print("没有找到需要处理的墙体目录。", file=sys.stderr)
+        return
+    stages = [stage for stage in STAGES if stage in options.stages]
+    if 'tiles' in stages:
+        # 与 tile_pyramid.py 命令行相同的检查，在开始处理任何墙体之前报错
+        from tile_pyramid import check_tile_size
+        try: check_tile_size(options.tile_pyramid_size)
+        except ValueError as e: parser.error(f"--tile_pyramid_size: {e}")
+    concurrency = min(len(wall_dirs), options.concurrency or os.cpu_count() or 1)
+    print(f"处理 {len(wall_dirs)} 面墙 (并发 {concurrency})，阶段: {', '.join(stages)}")
+
+    jobs = [WallJob(wall_dir, with_digest=('render' in stages and options.incremental) or 'tiles' in stages) for wall_dir in wall_dirs]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda job: run_wall(job, stages, options), jobs))
+
+    print("\n=== 汇总 ===")
+    failed = False
+    for job in jobs:
+        for stage, status, seconds, note in job.results:
+            mark = {'ok': '✓', 'failed': '✗', 'skipped': '-'}[status]
+            print(f"{mark} {job.wall_dir.name:<16} {stage:<10} {seconds:7.2f}s  {note}")
+            failed |= status == 'failed'
+    print(f"总耗时 {time.perf_counter() - start:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
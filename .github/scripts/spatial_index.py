@@ -0,0 +1,177 @@
+import argparse
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+import sys
+import numpy as np
+
+
+class GridIndex:
+    """
+    均匀网格空间索引: 每个点按坐标落入边长为 cell_size 的格子，查询时只检查附近的格子。
+    支持逐个 add() 增量插入，适合岩点这种分布较均匀、数量在几百到几万之间的点集。
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = float(cell_size)
+        self.keys = []
+        self._xy = []
+        self._cells = defaultdict(list)
+        self._bounds = None  # 已占用格子的范围 (cx0, cy0, cx1, cy1)，用于限制最近邻搜索的圈数
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def add(self, key, x, y):
+        """插入一个点，返回它在索引中的序号。"""
+        i = len(self.keys)
+        self.keys.append(key); self._xy.append((float(x), float(y)))
+        cx, cy = self._cell(x, y)
+        self._cells[(cx, cy)].append(i)
+        b = self._bounds
+        self._bounds = (cx, cy, cx, cy) if b is None else (min(b[0], cx), min(b[1], cy), max(b[2], cx), max(b[3], cy))
+        return i
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r; yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy; yield cx + r, cy + dy
+
+    def nearest(self, x, y, k=1, max_distance=math.inf):
+        """距离 (x, y) 最近的 k 个点，返回按距离升序的 [(距离, key), ...]。"""
+        if not self.keys:
+            return []
+        cx, cy = self._cell(x, y)
+        b = self._bounds
+        max_ring = max(abs(cx - b[0]), abs(cx - b[2]), abs(cy - b[1]), abs(cy - b[3]))
+        found = []
+        for r in range(max_ring + 1):
+            for cell in self._ring(cx, cy, r):
+                for i in self._cells.get(cell, ()):
+                    px, py = self._xy[i]
+                    found.append((math.hypot(px - x, py - y), i))
+            found.sort()
+            # 第 r 圈之外的点距离至少为 r * cell_size
+            if len(found) >= k and found[k - 1][0] <= r * self.cell_size or r * self.cell_size > max_distance:
+                break
+        return [(d, self.keys[i]) for d, i in found[:k] if d <= max_distance]
+
+    def within(self, x, y, radius):
+        """与 (x, y) 距离不超过 radius 的所有点，返回按距离升序的 [(距离, key), ...]。"""
+        (cx0, cy0), (cx1, cy1) = self._cell(x - radius, y - radius), self._cell(x + radius, y + radius)
+        found = []
+        for gx in range(cx0, cx1 + 1):
+            for gy in range(cy0, cy1 + 1):
+                for i in self._cells.get((gx, gy), ()):
+                    px, py = self._xy[i]
+                    d = math.hypot(px - x, py - y)
+                    if d <= radius: found.append((d, i))
+        return [(d, self.keys[i]) for d, i in sorted(found)]
+
+    def close_pairs(self, min_distance):
+        """所有距离小于 min_distance 的点对，返回按距离升序的 [(距离, key_a, key_b), ...]。"""
+        reach = max(1, math.ceil(min_distance / self.cell_size))
+        # 只看 "前半平面" 的相邻格子，每对格子只比较一次
+        offsets = [(dx, dy) for dx in range(0, reach + 1) for dy in range(-reach, reach + 1) if dx > 0 or dy > 0]
+        pairs = []
+        for (cx, cy), members in self._cells.items():
+            candidates = [(a, b) for n, a in enumerate(members) for b in members[n + 1:]]
+            for dx, dy in offsets:
+                other = self._cells.get((cx + dx, cy + dy))
+                if other: candidates.extend((a, b) for a in members for b in other)
+            for a, b in candidates:
+                d = math.hypot(self._xy[a][0] - self._xy[b][0], self._xy[a][1] - self._xy[b][1])
+                if d < min_distance: pairs.append((d, min(a, b), max(a, b)))
+        return [(d, self.keys[a], self.keys[b]) for d, a, b in sorted(pairs)]
+
+    @classmethod
+    def from_points(cls, keys, xy, cell_size=None):
+        """
+        由一组点建立索引。cell_size 未指定时按点的平均间距估计 (每格平均约一个点)，
+        这样最近邻查询通常只需要检查一两圈格子。
+        """
+        xy = np.asarray(xy, np.float64).reshape(-1, 2)
+        if cell_size is None:
+            if len(xy) > 1:
+                extent = np.ptp(xy, axis=0)
+                cell_size = max(8.0, math.sqrt(max(1.0, extent[0] * extent[1]) / len(xy)))
+            else:
+                cell_size = 64
+        index = cls(cell_size)
+        for key, (x, y) in zip(keys, xy.tolist()):
+            index.add(key, x, y)
+        return index
+
+    @classmethod
+    def from_holds(cls, holds, cell_size=None):
+        """由 wall_data.HoldTable 建立索引 (只包含有坐标的岩点)，key 为岩点编号。"""
+        known = np.flatnonzero(holds.known)
+        return cls.from_points([holds.ids[i] for i in known], holds.xy[known], cell_size)
+
+
+def cluster_pairs(pairs):
+    """把互相过近的点对合并成簇 (并查集)，返回按大小降序的 [[key, ...], ...]。"""
+    parent = {}
+    def find(k):
+        while parent.setdefault(k, k) != k:
+            parent[k] = parent[parent[k]]; k = parent[k]
+        return k
+    for _, a, b in pairs:
+        parent[find(a)] = find(b)
+    clusters = defaultdict(list)
+    for k in parent:
+        clusters[find(k)].append(k)
+    return sorted(clusters.values(), key=lambda c: (-len(c), c))
+
+
+def near_duplicate_report(wall_dir, min_distance, holds=None, config=None):
+    """一面墙中距离过近 (很可能是重复识别或坐标填错) 的岩点对，以及由它们连成的簇。"""
+    from wall_data import load_config, load_holds
+    holds = holds if holds is not None else load_holds(Path(wall_dir) / 'output/data/holds.json')
+    config = config if config is not None else load_config(wall_dir)
+    pairs = GridIndex.from_holds(holds).close_pairs(min_distance)
+    coords = holds.coords()
+    return {
+        'wall': config.get('wall_name', Path(wall_dir).name),
+        'holds': len(coords),
+        'pairs': [{'a': a, 'b': b, 'distance': round(d, 1)} for d, a, b in pairs],
+        'clusters': [{'holds': sorted(c, key=lambda k: (len(k), k)), 'xy': coords[c[0]]} for c in cluster_pairs(pairs)],
+    }
+
+
+def print_near_duplicates(report, min_distance):
+    if not report['pairs']:
+        print(f"✅  {report['wall']}: {report['holds']} 个岩点中没有距离小于 {min_distance:g}px 的岩点对。")
+        return
+    print(f"::warning::{report['wall']}: 发现 {len(report['pairs'])} 对疑似重复的岩点 (距离 < {min_distance:g}px)，共 {len(report['clusters'])} 处")
+    for cluster in report['clusters']:
+        print(f"  - 约 ({cluster['xy']['x']}, {cluster['xy']['y']}) 附近 {len(cluster['holds'])} 个岩点: {', '.join(cluster['holds'])}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="检查墙体中坐标过于接近 (疑似重复) 的岩点。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help="要检查的墙体目录。如果为空，则检查 'walls/' 下所有带 holds.json 的墙体。")
+    parser.add_argument('--min_distance', type=float, default=15, help='两个岩点中心的距离小于该值 (像素) 时视为疑似重复。')
+    parser.add_argument('--json', type=str, default=None, help='把报告另存为 JSON 文件。')
+    args = parser.parse_args()
+
+    wall_dirs = [Path(d) for d in args.wall_dirs] or [d for d in sorted(Path('walls').iterdir()) if (d / 'output/data/holds.json').exists()]
+    reports = []
+    for wall_dir in wall_dirs:
+        if not (wall_dir / 'output/data/holds.json').exists():
+            print(f"⚠️  警告: 墙体 '{wall_dir.name}' 的岩点坐标文件不存在。跳过检查。", file=sys.stderr)
+            continue
+        report = near_duplicate_report(wall_dir, args.min_distance)
+        reports.append(report)
+        print_near_duplicates(report, args.min_distance)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,85 @@
+import re
+from collections import deque, namedtuple
+from functools import lru_cache
+
+# 一行文字: 文本、按像素测得的宽度，以及相对于绘制原点的包围盒 (left, top, right, bottom)
+TextLine = namedtuple('TextLine', 'text width bbox')
+# 一整块已排版的文字。height 已包含行间距；每行的纵向间隔为 line_height + line_spacing
+TextBlock = namedtuple('TextBlock', 'lines width height line_height line_spacing')
+
+# 中日韩文字 (含全角标点) 每个字符之间都可以断行
+_CJK_RANGES = '\u2e80-\u2fff\u3000-\u30ff\u3100-\u31ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef'
+_TOKEN_RE = re.compile(rf'[{_CJK_RANGES}]|\s+|[^\s{_CJK_RANGES}]+')
+# 避头尾规则: 这些标点不能出现在行首 / 行尾
+_NO_LINE_START = set('，。、；：！？）】」』》〉〕”’…—～,.;:!?)]}%')
+_NO_LINE_END = set('（【「『《〈〔“‘([{')
+
+
+# --- 测量缓存 ---
+# 字体对象按身份哈希，同一进程里字体只加载一次，所以 (字体, 字符串) 可以直接作为缓存键
+@lru_cache(maxsize=65536)
+def measure_length(font, text):
+    return font.getlength(text)
+
+
+@lru_cache(maxsize=16384)
+def measure_bbox(font, text, stroke_width=0):
+    return font.getbbox(text, stroke_width=stroke_width)
+
+
+@lru_cache(maxsize=64)
+def font_line_height(font, stroke_width=0):
+    ascent, descent = font.getmetrics()
+    return ascent + descent + 2 * stroke_width
+
+
+def _break_units(paragraph):
+    """把一段文字切成不可再分的断行单元: 单个中文字符、一个西文单词或一段空白，并按避头尾规则粘连标点。"""
+    units = []
+    for token in _TOKEN_RE.findall(paragraph):
+        if units and not token.isspace() and not units[-1].isspace() and (token[0] in _NO_LINE_START or units[-1][-1] in _NO_LINE_END):
+            units[-1] += token
+        else:
+            units.append(token)
+    return units
+
+
+def wrap_paragraph(paragraph, font, max_width):
+    """按像素宽度贪心断行，返回行字符串列表。单个单元比整行还宽时退化为逐字符断行。"""
+    lines, current, current_width = [], '', 0.0
+    pending = deque(_break_units(paragraph))
+    while pending:
+        unit = pending.popleft()
+        if unit.isspace() and not current:
+            continue  # 新行开头的空白直接丢弃
+        width = measure_length(font, unit)
+        if current_width + width <= max_width or unit.isspace():
+            current += unit; current_width += width
+        elif current:
+            lines.append(current.rstrip())
+            current, current_width = '', 0.0
+            pending.appendleft(unit)
+        elif len(unit) > 1:
+            pending.extendleft(reversed(unit))
+        else:
+            current, current_width = unit, width  # 单个字符也放不下，只能让它独占一行
+    if current.strip():
+        lines.append(current.rstrip())
+    return lines
+
+
+def layout_text(text, font, max_width, line_spacing, stroke_width=0):
+    """
+    对一段文字做一次完整排版 (支持手动换行 '\\n')，返回 TextBlock。
+    计算画布高度和实际绘制使用同一个结果，不需要重复断行和测量。
+    """
+    lines = []
+    for paragraph in text.split('\n'):
+        for line in wrap_paragraph(paragraph, font, max_width):
+            bbox = measure_bbox(font, line, stroke_width)
+            lines.append(TextLine(line, bbox[2] - bbox[0], bbox))
+    if not lines:
+        return TextBlock([], 0, 0, 0, line_spacing)
+    line_height = font_line_height(font, stroke_width)
+    height = line_height * len(lines) + line_spacing * (len(lines) - 1)
+    return TextBlock(lines, max(line.width for line in lines), height, line_height, line_spacing)
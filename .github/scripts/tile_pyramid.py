@@ -0,0 +1,220 @@
+import argparse
+import json
+import math
+import shutil
+import time
+from pathlib import Path
+import sys
+from PIL import Image
+
+# 瓦片清单的格式版本，不兼容时整体重新生成
+TILE_MANIFEST_VERSION = 1
+DZI_NAMESPACE = 'http://schemas.microsoft.com/deepzoom/2008'
+
+
+def check_tile_size(tile_size):
+    """瓦片边长必须是不小于 2 的偶数: 整行瓦片缩小一半后要正好对齐下一层的像素网格。不满足时抛出 ValueError。"""
+    if not isinstance(tile_size, int) or tile_size < 2 or tile_size % 2:
+        raise ValueError(f"瓦片边长必须是不小于 2 的偶数，而不是 {tile_size!r}")
+
+
+def level_sizes(width, height):
+    """DeepZoom 各层的尺寸，从第 0 层 (1x1) 到最高层 (原图)。每降一层宽高减半并向上取整。"""
+    sizes = [(width, height)]
+    while sizes[-1] != (1, 1):
+        w, h = sizes[-1]
+        sizes.append(((w + 1) // 2, (h + 1) // 2))
+    return sizes[::-1]
+
+
+def _vstack(top, bottom):
+    strip = Image.new(top.mode, (top.width, top.height + bottom.height))
+    strip.paste(top, (0, 0)); strip.paste(bottom, (0, top.height))
+    return strip
+
+
+class _LevelStream:
+    """
+    一层金字塔的条带缓冲: 按从上到下的顺序接收图像条带，凑满一行瓦片就切片保存，
+    并把这一行缩小一半后交给下一层。每层最多缓存不到两行瓦片的像素，整个金字塔不保存任何整层图像。
+    """
+
+    def __init__(self, level, tile_size, save_tile, lower=None):
+        self.level, self.tile_size, self.save_tile, self.lower = level, tile_size, save_tile, lower
+        self.strip = None
+        self.row = 0
+
+    def feed(self, strip):
+        self.strip = strip if self.strip is None else _vstack(self.strip, strip)
+        while self.strip.height >= self.tile_size:
+            band = self.strip.crop((0, 0, self.strip.width, self.tile_size))
+            self.strip = self.strip.crop((0, self.tile_size, self.strip.width, self.strip.height))
+            self._emit(band)
+
+    def close(self):
+        if self.strip is not None and self.strip.height:
+            self._emit(self.strip)
+        self.strip = None
+        if self.lower is not None:
+            self.lower.close()
+
+    def _emit(self, band):
+        for col in range(math.ceil(band.width / self.tile_size)):
+            self.save_tile(self.level, col, self.row, band.crop((col * self.tile_size, 0, min(band.width, (col + 1) * self.tile_size), band.height)))
+        self.row += 1
+        # 瓦片边长为偶数，整行缩小一半正好对齐下一层的像素网格；最后一行为奇数高度时向上取整
+        if self.lower is not None:
+            self.lower.feed(band.reduce(2))
+
+
+def _pyramid_stream(sizes, tile_size, save_tile):
+    """从第 0 层到最高层串起各层的条带缓冲，返回最高层 (接收原图条带的那一层)。"""
+    stream = None
+    for level in range(len(sizes)):
+        stream = _LevelStream(level, tile_size, save_tile, stream)
+    return stream
+
+
+def write_base_pyramid(image_path, out_dir, tile_size=256, fmt='jpg', quality=85):
+    """
+    把底图切成 DeepZoom 金字塔: out_dir/base.dzi 和 out_dir/base_files/<层>/<列>_<行>.<格式>。
+    底图只解码一次 (保持原始模式)，之后按瓦片高度的条带逐层切片，转换和缩小都只作用在条带上。
+    返回金字塔各层尺寸。
+    """
+    out_dir = Path(out_dir)
+    tiles_dir = out_dir / 'base_files'
+    if tiles_dir.exists(): shutil.rmtree(tiles_dir)
+    save_params = {'quality': quality} if fmt == 'jpg' else {}
+
+    def save_tile(level, col, row, tile):
+        path = tiles_dir / str(level) / f"{col}_{row}.{fmt}"
+        if col == 0: path.parent.mkdir(parents=True, exist_ok=True)
+        tile.save(path, 'JPEG' if fmt == 'jpg' else 'PNG', **save_params)
+
+    with Image.open(image_path) as image:
+        image.load()
+        sizes = level_sizes(*image.size)
+        stream = _pyramid_stream(sizes, tile_size, save_tile)
+        # 与绘图一致: 底图的透明像素直接丢弃 alpha
+        for y in range(0, image.height, tile_size):
+            stream.feed(image.crop((0, y, image.width, min(image.height, y + tile_size))).convert('RGB'))
+        stream.close()
+    with open(out_dir / 'base.dzi', 'w', encoding='utf-8') as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<Image xmlns="{DZI_NAMESPACE}" TileSize="{tile_size}" Overlap="0" Format="{fmt}">'
+                f'<Size Width="{sizes[-1][0]}" Height="{sizes[-1][1]}"/></Image>\n')
+    return sizes
+
+
+def write_route_tiles(draw_band, sizes, tile_size, out_dir):
+    """
+    把一条线路写成稀疏瓦片: draw_band(top, bottom) 返回原图 [top, bottom) 行的线路标记 (None 表示这几行没有标记)。
+    条带经过与底图相同的流水线逐层缩小，只保存不全透明的瓦片。返回 {层: [[列, 行], ...]}。
+    """
+    out_dir = Path(out_dir)
+    width, height = sizes[-1]
+    tiles = {}
+
+    def save_tile(level, col, row, tile):
+        tile = tile.convert('RGBA')
+        if tile.getbbox() is None: return
+        path = out_dir / str(level) / f"{col}_{row}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tile.save(path, 'PNG')
+        tiles.setdefault(str(level), []).append([col, row])
+
+    stream = _pyramid_stream(sizes, tile_size, save_tile)
+    for top in range(0, height, tile_size):
+        bottom = min(height, top + tile_size)
+        # 预乘 alpha 后再缩小，半透明边缘不会被透明像素的颜色污染
+        strip = Image.new('RGBa', (width, bottom - top), (0, 0, 0, 0))
+        marks = draw_band(top, bottom)
+        if marks is not None:
+            layer, (x, y) = marks
+            strip.paste(layer.convert('RGBa'), (x, y - top))
+        stream.feed(strip)
+    stream.close()
+    return dict(sorted(tiles.items(), key=lambda item: -int(item[0])))
+
+
+def export_wall_tiles(wall_dir, tile_size=256, fmt='jpg', quality=85, force=False, holds=None, routes=None):
+    """
+    导出一面墙的瓦片金字塔到 output/tiles/: 底图金字塔只在底图或瓦片参数变化时重新生成；
+    线路按内容哈希增量导出，已删除线路的瓦片目录会被清理。清单 tiles.json 供查看器按需加载瓦片。
+    """
+    check_tile_size(tile_size)
+    import draw_route
+    from marker_sprites import SpriteCache
+    from render_manifest import file_digest, route_digest
+    from wall_data import load_holds, load_routes
+    wall_dir = Path(wall_dir)
+    base_image_path, out_dir = wall_dir / 'image_base.png', wall_dir / 'output/tiles'
+    holds = holds if holds is not None else load_holds(wall_dir / 'output/data/holds.json')
+    routes = routes if routes is not None else load_routes(wall_dir / 'routes.json', holds, with_digest=True)
+    manifest_path = out_dir / 'tiles.json'
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f: previous = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous = {}
+    if force or previous.get('version') != TILE_MANIFEST_VERSION: previous = {}
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    base = {'sha256': file_digest(base_image_path), 'tile_size': tile_size, 'format': fmt, 'quality': quality}
+    if previous.get('base_source') != base or not (out_dir / 'base.dzi').exists():
+        start = time.perf_counter()
+        sizes = write_base_pyramid(base_image_path, out_dir, tile_size, fmt, quality)
+        print(f"  底图金字塔: {len(sizes)} 层, {time.perf_counter() - start:.2f}s")
+        previous.pop('routes', None)
+    else:
+        sizes = [tuple(size) for size in previous['level_sizes']]
+
+    # 瓦片按原图分辨率绘制；精灵缓存属于这一次导出，run_all.py 可以同时导出多面墙
+    fonts, sprites = draw_route.load_fonts(), SpriteCache()
+    shared = draw_route.render_inputs_digest(base_image_path, 1.0, 'tiles', tile_size=tile_size)
+    old_entries = {entry['id']: entry for entry in previous.get('routes', [])}
+    routes_dir = out_dir / 'routes'
+    entries, drawn = [], 0
+    for route in routes:
+        route_id = draw_route.route_output_filename(route)[:-len('.png')]
+        digest = route_digest(route, holds, shared)
+        entry = old_entries.get(route_id)
+        if entry is None or entry['hash'] != digest or (entry['tiles'] and not (routes_dir / route_id).exists()):
+            if (routes_dir / route_id).exists(): shutil.rmtree(routes_dir / route_id)
+            # 标记按一行瓦片的高度分块绘制，内存中只有当前这一行
+            draw_band = lambda top, bottom: draw_route.compose_route_markers(route, holds, sizes[-1], fonts, region=(0, top, sizes[-1][0], bottom), sprites=sprites)
+            tiles = write_route_tiles(draw_band, sizes, tile_size, routes_dir / route_id)
+            entry = {'id': route_id, 'hash': digest, 'tiles': tiles}
+            drawn += 1
+        entry.update(name=route.name, grade=route.grade, author=route.author, beta=route.beta)
+        entries.append(entry)
+    keep = {entry['id'] for entry in entries}
+    if routes_dir.exists():
+        for path in sorted(routes_dir.iterdir()):
+            if path.name not in keep: shutil.rmtree(path); print(f"  - Pruned stale tiles: {path}")
+
+    manifest = {
+        'version': TILE_MANIFEST_VERSION, 'base_source': base, 'width': sizes[-1][0], 'height': sizes[-1][1],
+        'tile_size': tile_size, 'overlap': 0, 'level_sizes': [list(size) for size in sizes],
+        'base': 'base.dzi', 'base_tiles': f"base_files/{{level}}/{{col}}_{{row}}.{fmt}",
+        'route_tiles': 'routes/{id}/{level}/{col}_{row}.png', 'routes': entries,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    return drawn, len(entries)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="把墙体底图导出为 DeepZoom 瓦片金字塔，并把每条线路导出为只覆盖线路区域的稀疏瓦片。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help="要导出的墙体目录。如果为空，则导出 'walls/' 下所有带 routes.json 的目录。")
+    parser.add_argument('--tile_size', type=int, default=256, help='瓦片边长 (像素，不小于 2 的偶数)。')
+    parser.add_argument('--format', dest='fmt', choices=('jpg', 'png'), default='jpg', help='底图瓦片的格式。线路瓦片总是带透明通道的 PNG。')
+    parser.add_argument('--quality', type=int, default=85, help='JPEG 瓦片的质量。')
+    parser.add_argument('--force', action='store_true', help='忽略已有的清单，重新生成所有瓦片。')
+    args = parser.parse_args()
+    try: check_tile_size(args.tile_size)
+    except ValueError as e: print(f"错误: --tile_size: {e}", file=sys.stderr); sys.exit(1)
+
+    wall_dirs = [Path(d) for d in args.wall_dirs] or [d for d in sorted(Path('walls').iterdir()) if (d / 'routes.json').exists()]
+    for wall_dir in wall_dirs:
+        print(f"--- {wall_dir.name} ---")
+        drawn, total = export_wall_tiles(wall_dir, args.tile_size, args.fmt, args.quality, args.force)
+        print(f"  线路瓦片: {drawn}/{total} 条线路重新导出 -> {wall_dir / 'output/tiles/tiles.json'}")
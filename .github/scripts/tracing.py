@@ -0,0 +1,126 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# 当前进程的追踪器。为 None 时 span() / annotate() 立即返回，关闭追踪时几乎没有开销
+_TRACER = None
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """
+    记录带起止时间的区间 (span)，输出为 Chrome 追踪格式 (chrome://tracing 或 Perfetto 可直接打开)。
+    时间戳来自 time.perf_counter()，在 Linux 上各进程共用同一个单调时钟，工作进程的区间可以直接合并。
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.events = []
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        stack = self._stack()
+        stack.append(args)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            self.events.append({'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+
+    def annotate(self, **values):
+        """给当前最内层的区间添加计数 (例如写入的字节数)，数值型的计数会累加。"""
+        stack = self._stack()
+        if not stack:
+            return
+        args = stack[-1]
+        for key, value in values.items():
+            args[key] = args.get(key, 0) + value if isinstance(value, (int, float)) else value
+
+
+# --- 模块级接口: 各脚本只调用这些函数，不直接持有 Tracer ---
+def enable():
+    global _TRACER
+    # fork 出来的工作进程会继承主进程的追踪器和已记录的事件，需要换一个新的，否则事件会重复
+    if _TRACER is None or _TRACER.pid != os.getpid():
+        _TRACER = Tracer()
+    return _TRACER
+
+
+def enabled():
+    return _TRACER is not None
+
+
+def span(name, **args):
+    """with span('encode'): ... —— 追踪关闭时返回一个共享的空上下文。"""
+    if _TRACER is None:
+        return _NULL_SPAN
+    return _TRACER.span(name, **args)
+
+
+def annotate(**values):
+    if _TRACER is not None:
+        _TRACER.annotate(**values)
+
+
+def drain():
+    """取出并清空当前进程已记录的事件 (工作进程把它们随结果一起发回主进程)。追踪关闭时返回 None。"""
+    if _TRACER is None:
+        return None
+    events, _TRACER.events = _TRACER.events, []
+    return events
+
+
+def extend(events):
+    if _TRACER is not None and events:
+        _TRACER.events.extend(events)
+
+
+# --- 输出 ---
+def summarize(events):
+    """按区间名汇总: [(名称, 次数, 总耗时秒, 平均毫秒, 最长毫秒, 数值计数之和)]，按总耗时降序。"""
+    stats = defaultdict(lambda: [0, 0.0, 0.0, defaultdict(float)])
+    for event in events:
+        entry = stats[event['name']]
+        entry[0] += 1; entry[1] += event['dur']; entry[2] = max(entry[2], event['dur'])
+        for key, value in event['args'].items():
+            if isinstance(value, (int, float)): entry[3][key] += value
+    rows = [(name, count, total / 1e6, total / count / 1e3, longest / 1e3, dict(counters)) for name, (count, total, longest, counters) in stats.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+
+def print_summary(events, top=15):
+    rows = summarize(events)
+    if not rows:
+        return
+    print(f"\n=== 追踪汇总 (按总耗时，前 {min(top, len(rows))} 项) ===")
+    print(f"{'阶段':<20} {'次数':>6} {'总耗时':>10} {'平均':>10} {'最长':>10}  计数")
+    for name, count, total, mean, longest, counters in rows[:top]:
+        counter_text = ', '.join(f"{key}={value:.0f}" if value.is_integer() else f"{key}={value:g}" for key, value in sorted(counters.items()))
+        print(f"{name:<20} {count:>6} {total:>9.3f}s {mean:>8.2f}ms {longest:>8.2f}ms  {counter_text}")
+
+
+def save_trace(path, events):
+    """写出 Chrome 追踪格式的 JSON。时间戳平移到从 0 开始，并为每个进程标注名称。"""
+    origin = min((event['ts'] for event in events), default=0)
+    main_pid = os.getpid()
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'main' if pid == main_pid else f'worker {pid}'}}
+                for pid in sorted({event['pid'] for event in events})]
+    trace_events = metadata + [dict(event, ts=round(event['ts'] - origin, 1), dur=round(event['dur'], 1)) for event in events]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
@@ -0,0 +1,147 @@
+import argparse
+import json
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+import sys
+import numpy as np
+from wall_data import expected_hold_ids, flatten_routes, load_wall, normalize_hold_id
+
+# 检查项及其严重程度。error 会让 --strict 模式以非零状态退出，warning 只报告
+CHECKS = {
+    'unknown_hold': 'error',        # 线路引用了 holds.json 中没有坐标的岩点 (draw_route 会静默跳过它们)
+    'out_of_range': 'error',        # 岩点编号不在 config.json 的 valid_hold_ranges 中
+    'missing_start': 'error',       # 没有 type 为 start 的动作
+    'missing_finish': 'error',      # 没有 type 为 finish 的动作
+    'hand_on_foot_only': 'error',   # 手点用了 config.json 中 foot_only_holds 列出的脚点
+    'duplicate_hold': 'warning',    # 同一只手重复抓同一个岩点，或脚点列表中有重复
+    'long_move': 'warning',         # 相邻两个动作的岩点距离超过 max_move_distance
+}
+# 未配置 max_move_distance 时，以全墙相邻动作距离中位数的这个倍数作为上限
+DEFAULT_MOVE_DISTANCE_FACTOR = 5.0
+
+
+def _duplicates(route_ids, keys):
+    """(线路, key) 出现不止一次的位置掩码。"""
+    combined = route_ids * (int(keys.max(initial=0)) + 1) + keys
+    _, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    return counts[inverse.reshape(-1)] > 1
+
+
+def validate_wall(wall, max_move_distance=None):
+    """对一面墙的所有线路做一次批量检查，返回 (问题列表, 实际使用的 max_move_distance)。"""
+    holds, routes = wall.holds, wall.routes
+    if not routes:
+        return [], max_move_distance
+    move_route, moves, styles, foot_route, feet = flatten_routes(routes)
+    known = holds.known
+    # 每个检查产出 (线路序号数组, 岩点下标数组)；岩点为 -1 表示与具体岩点无关
+    found = {}
+
+    all_route = np.concatenate([move_route, foot_route]); all_holds = np.concatenate([moves, feet])
+    unknown = ~known[all_holds]
+    found['unknown_hold'] = (all_route[unknown], all_holds[unknown])
+
+    expected = expected_hold_ids(wall.config)
+    if expected:
+        in_range = np.fromiter((hold_id in expected for hold_id in holds.ids), bool, len(holds))
+        bad = ~in_range[all_holds]
+        found['out_of_range'] = (all_route[bad], all_holds[bad])
+
+    no_route = np.arange(len(routes))
+    for check, style in (('missing_start', 0), ('missing_finish', 1)):
+        has = np.bincount(move_route[styles == style], minlength=len(routes)) > 0
+        found[check] = (no_route[~has], np.full((~has).sum(), -1))
+
+    foot_only = [holds.index[normalize_hold_id(h)] for h in wall.config.get('foot_only_holds', []) if normalize_hold_id(h) in holds.index]
+    if foot_only:
+        bad = np.isin(moves, foot_only)
+        found['hand_on_foot_only'] = (move_route[bad], moves[bad])
+
+    # 同一岩点换手 (matching) 是正常动作，所以动作的 key 同时包含岩点和样式编号 (-1..4)
+    dup_moves = _duplicates(move_route, moves * 8 + (styles.astype(np.int64) + 1)) if len(moves) else np.zeros(0, bool)
+    dup_feet = _duplicates(foot_route, feet) if len(feet) else np.zeros(0, bool)
+    found['duplicate_hold'] = (np.concatenate([move_route[dup_moves], foot_route[dup_feet]]), np.concatenate([moves[dup_moves], feet[dup_feet]]))
+
+    # 相邻动作的距离: 同一条线路内前后两个动作，且两端都有坐标
+    xy = holds.xy[moves]
+    same_route = move_route[1:] == move_route[:-1]
+    distances = np.hypot(*(xy[1:] - xy[:-1]).T)
+    valid = same_route & ~np.isnan(distances)
+    if max_move_distance is None and valid.any():
+        max_move_distance = float(np.median(distances[valid])) * DEFAULT_MOVE_DISTANCE_FACTOR or None
+    long_move = np.zeros(0, np.int64)
+    if max_move_distance is not None:
+        long_move = np.flatnonzero(valid & (distances > max_move_distance))
+    found['long_move'] = (move_route[long_move + 1], moves[long_move + 1])
+    long_distances = defaultdict(list)
+    for r, d in zip(move_route[long_move + 1].tolist(), distances[long_move].tolist()):
+        long_distances[r].append(round(d, 1))
+
+    # 只有被标记的元素才进入 Python 循环，按 (线路, 检查项) 汇总
+    issues = []
+    order = list(CHECKS)
+    for check, (route_idx, hold_idx) in found.items():
+        by_route = defaultdict(list)
+        for r, h in zip(route_idx.tolist(), hold_idx.tolist()):
+            route_holds = by_route[r]
+            if h >= 0 and h not in route_holds: route_holds.append(h)
+        for r, hold_list in by_route.items():
+            issue = {'route': routes[r].name, 'route_index': r, 'check': check, 'severity': CHECKS[check], 'holds': [holds.ids[h] for h in hold_list]}
+            if check == 'long_move': issue['distances'] = long_distances[r]
+            issues.append(issue)
+    issues.sort(key=lambda i: (i['route_index'], order.index(i['check'])))
+    return issues, max_move_distance
+
+
+def wall_report(wall, max_move_distance=None):
+    """一面墙的检查结果摘要。max_move_distance 未指定时读取 config.json。"""
+    limit = max_move_distance if max_move_distance is not None else wall.config.get('max_move_distance')
+    issues, limit = validate_wall(wall, limit)
+    counts = Counter(issue['check'] for issue in issues)
+    return {
+        'wall': wall.name, 'path': str(wall.path), 'routes': len(wall.routes), 'holds': int(wall.holds.known.sum()),
+        'max_move_distance': round(limit, 1) if limit is not None else None,
+        'errors': sum(n for check, n in counts.items() if CHECKS[check] == 'error'),
+        'warnings': sum(n for check, n in counts.items() if CHECKS[check] == 'warning'),
+        'counts': dict(sorted(counts.items())), 'issues': issues,
+    }
+
+
+def build_report(wall_dirs, max_move_distance=None):
+    start = time.perf_counter()
+    walls = [wall_report(load_wall(wall_dir), max_move_distance) for wall_dir in wall_dirs]
+    return {'walls': walls, 'seconds': round(time.perf_counter() - start, 4)}
+
+
+def print_report(report):
+    for wall in report['walls']:
+        print(f"\n--- {wall['wall']}: {wall['routes']} 条线路, {wall['errors']} 个错误, {wall['warnings']} 个警告 ---")
+        for issue in wall['issues']:
+            level = 'error' if issue['severity'] == 'error' else 'warning'
+            detail = f" ({', '.join(issue['holds'])})" if issue['holds'] else ''
+            if 'distances' in issue: detail += f" 距离 {issue['distances']}px > {wall['max_move_distance']}px"
+            print(f"::{level}::{wall['wall']} / '{issue['route']}': {issue['check']}{detail}")
+        if not wall['issues']:
+            print("✅  所有线路均通过检查。")
+    print(f"\n检查耗时 {report['seconds']:.3f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="批量检查所有墙体的线路定义，输出墙体健康报告。")
+    parser.add_argument('wall_dirs', nargs='*', default=[], help="要检查的墙体目录。如果为空，则检查 'walls/' 下的所有目录。")
+    parser.add_argument('--json', type=str, default=None, help='把报告另存为 JSON 文件。')
+    parser.add_argument('--strict', action='store_true', help='发现任何错误级别的问题时以非零状态退出。')
+    parser.add_argument('--max_move_distance', type=float, default=None,
+                        help='相邻动作的最大合理距离 (像素)。默认读取 config.json 的 max_move_distance，未配置时取全墙相邻动作距离中位数的 5 倍。')
+    args = parser.parse_args()
+
+    wall_dirs = [Path(d) for d in args.wall_dirs] or [d for d in sorted(Path('walls').iterdir()) if d.is_dir()]
+    report = build_report(wall_dirs, args.max_move_distance)
+    print_report(report)
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.strict and any(wall['errors'] for wall in report['walls']):
+        sys.exit(1)
@@ -0,0 +1,329 @@
+import hashlib
+import json
+from pathlib import Path
+import numpy as np
+
+# 线路中每个动作的标记样式，顺序即样式编号 (Route.styles 中的值)；无法识别的动作记为 -1，不绘制
+MOVE_STYLES = ('start', 'finish', 'left_hand', 'right_hand', 'both_hands')
+_HAND_STYLES = {'left': 2, 'right': 3, 'both': 4}
+# 只读解析线路时 (见 Route.from_json 的 missing 参数) 未知岩点共用的占位编号；规范化后的编号不以空白开头，不会与真实岩点冲突
+MISSING_HOLD_ID = ' missing'
+
+
+def normalize_hold_id(hold_id) -> str:
+    """岩点编号统一为去掉首尾空白的小写字符串，例如 12 -> "12"、" A " -> "a"。"""
+    return str(hold_id).strip().lower()
+
+
+class HoldTable:
+    """
+    一面墙的岩点表: 岩点编号被驻留为连续的整数下标，坐标存放在 (N, 2) 的 NumPy 数组中。
+    线路里引用了但 holds.json 中没有坐标的岩点同样分配下标，坐标为 NaN。
+    """
+    __slots__ = ('ids', 'index', '_xy')
+
+    def __init__(self, ids=(), xy=None):
+        self.ids = list(ids)
+        self.index = {hold_id: i for i, hold_id in enumerate(self.ids)}
+        self._xy = np.asarray(xy, np.float64).reshape(-1, 2) if xy is not None else np.full((len(self.ids), 2), np.nan)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, hold_id):
+        i = self.index.get(normalize_hold_id(hold_id))
+        return i is not None and not np.isnan(self.xy[i, 0])
+
+    @property
+    def xy(self):
+        # intern() 只追加编号，坐标数组在下一次访问时一次性补齐
+        if len(self._xy) < len(self.ids):
+            self._xy = np.vstack([self._xy, np.full((len(self.ids) - len(self._xy), 2), np.nan)])
+        return self._xy
+
+    @property
+    def known(self):
+        """有坐标的岩点的布尔掩码。"""
+        return ~np.isnan(self.xy[:, 0])
+
+    def intern(self, hold_id) -> int:
+        # 快速路径: 已经是规范形式的编号直接命中，不必再做字符串处理
+        i = self.index.get(hold_id)
+        if i is not None:
+            return i
+        hold_id = normalize_hold_id(hold_id)
+        i = self.index.get(hold_id)
+        if i is None:
+            i = self.index[hold_id] = len(self.ids)
+            self.ids.append(hold_id)
+        return i
+
+    def lookup(self, hold_id, default=None):
+        """返回岩点的下标但不驻留新编号，未知编号返回 default。"""
+        i = self.index.get(hold_id)
+        return i if i is not None else self.index.get(normalize_hold_id(hold_id), default)
+
+    def get(self, hold_id):
+        """返回 (x, y)；岩点不存在或没有坐标时返回 None。"""
+        i = self.index.get(normalize_hold_id(hold_id))
+        if i is None or np.isnan(self.xy[i, 0]):
+            return None
+        return tuple(self.xy[i])
+
+    def set(self, hold_id, x, y):
+        i = self.intern(hold_id)
+        self.xy[i] = (x, y)
+
+    def coords(self, indices=None):
+        """{编号: {'x', 'y'}}，只包含有坐标的岩点。整数坐标输出为 int，与 holds.json 的格式一致。"""
+        indices = range(len(self)) if indices is None else indices
+        xy = self.xy
+        return {self.ids[i]: {'x': _json_number(xy[i, 0]), 'y': _json_number(xy[i, 1])} for i in indices if not np.isnan(xy[i, 0])}
+
+    def scaled(self, factor):
+        """返回坐标乘以 factor 的新表，编号下标保持不变 (线路中的下标数组可以直接复用)。"""
+        table = HoldTable.__new__(HoldTable)
+        table.ids, table.index, table._xy = self.ids, self.index, self.xy * factor
+        return table
+
+    def translated(self, dx, dy):
+        """返回坐标平移 (dx, dy) 的新表，编号下标保持不变。"""
+        table = HoldTable.__new__(HoldTable)
+        table.ids, table.index, table._xy = self.ids, self.index, self.xy + (dx, dy)
+        return table
+
+    def __getstate__(self):
+        return self.ids, self.xy
+
+    def __setstate__(self, state):
+        ids, xy = state
+        self.ids, self.index, self._xy = ids, {hold_id: i for i, hold_id in enumerate(ids)}, xy
+
+
+def _json_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class Route:
+    """
+    一条线路的紧凑表示。moves / feet 是指向 HoldTable 的 int32 下标数组，styles 是与 moves 等长的
+    MOVE_STYLES 编号 (int8)，labels 是每个动作标记上的文字。digest 是原始线路 JSON 的哈希 (按需计算)。
+    """
+    __slots__ = ('name', 'grade', 'author', 'beta', 'moves', 'styles', 'labels', 'feet', 'digest')
+
+    def __init__(self, name, grade, author, beta, moves, styles, labels, feet, digest=None):
+        self.name, self.grade, self.author, self.beta = name, grade, author, beta
+        self.moves, self.styles, self.labels, self.feet, self.digest = moves, styles, labels, feet, digest
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def hold_indices(self):
+        """这条线路引用的所有岩点下标 (去重、升序)。"""
+        return np.union1d(self.moves, self.feet)
+
+    @classmethod
+    def from_json(cls, route_data, holds, with_digest=False, missing=None):
+        """missing 不为 None 时只查询已有的岩点编号，未知编号一律映射到下标 missing，岩点表不会增长。"""
+        intern = holds.intern if missing is None else lambda hold_id: holds.lookup(hold_id, missing)
+        indices, styles, labels = [], [], []
+        for move in route_data.get('moves', ()):
+            kind, hand = move.get('type'), move.get('hand')
+            indices.append(intern(move['hold_id']))
+            styles.append(0 if kind == 'start' else 1 if kind == 'finish' else _HAND_STYLES.get(hand, -1))
+            labels.append(move.get('text') or (kind or hand or '')[:1].upper())
+        return cls(
+            route_data.get('routeName', route_data.get('name', 'N/A')),
+            route_data.get('difficulty', route_data.get('grade', 'N/A')),
+            route_data.get('author', 'N/A'),
+            route_data.get('beta', ''),
+            np.array(indices, np.int32),
+            np.array(styles, np.int8),
+            tuple(labels),
+            np.array([intern(hold_id) for hold_id in route_data.get('holds', {}).get('foot', ())], np.int32),
+            route_json_digest(route_data) if with_digest else None,
+        )
+
+
+def route_json_digest(route_data) -> str:
+    canonical = json.dumps(route_data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def flatten_routes(routes):
+    """
+    把所有线路的动作和脚点拼接成扁平数组，之后的统计和检查都是整批的数组运算。
+    返回 (move_route, moves, styles, foot_route, feet)，*_route 是每个元素所属线路的序号。
+    """
+    move_counts = np.fromiter((len(r.moves) for r in routes), np.int64, len(routes))
+    foot_counts = np.fromiter((len(r.feet) for r in routes), np.int64, len(routes))
+    empty = np.zeros(0, np.int32)
+    moves = np.concatenate([r.moves for r in routes] or [empty]).astype(np.int64)
+    styles = np.concatenate([r.styles for r in routes] or [empty.astype(np.int8)])
+    feet = np.concatenate([r.feet for r in routes] or [empty]).astype(np.int64)
+    route_ids = np.arange(len(routes))
+    return np.repeat(route_ids, move_counts), moves, styles, np.repeat(route_ids, foot_counts), feet
+
+
+class Wall:
+    """一面墙: 配置、岩点表和线路列表。"""
+    __slots__ = ('path', 'name', 'config', 'holds', 'routes')
+
+    def __init__(self, path, config, holds, routes):
+        self.path, self.config, self.holds, self.routes = Path(path), config, holds, routes
+        self.name = config.get('wall_name', self.path.name)
+
+    def missing_hold_ids(self):
+        """线路中引用了但没有坐标的岩点编号。"""
+        used = np.zeros(len(self.holds), bool)
+        for route in self.routes:
+            used[route.moves] = True; used[route.feet] = True
+        return [self.holds.ids[i] for i in np.flatnonzero(used & ~self.holds.known)]
+
+
+# --- 读取 / 保存 ---
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_holds(path) -> HoldTable:
+    """读取 holds.json ({编号: {'x', 'y'}})。"""
+    data = load_json(path)
+    ids = [normalize_hold_id(hold_id) for hold_id in data]
+    xy = np.array([(coord['x'], coord['y']) for coord in data.values()], np.float64).reshape(-1, 2)
+    if len(set(ids)) != len(ids):
+        # 大小写不同的重复编号: 与逐个写入字典的结果一致，后出现的覆盖先出现的
+        table = HoldTable()
+        for hold_id, (x, y) in zip(ids, xy): table.set(hold_id, x, y)
+        return table
+    return HoldTable(ids, xy)
+
+
+# 每行一条线路 JSON 的流式格式。这两种后缀的文件逐行读取，不会把整个数据库读进内存
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')
+
+
+def parse_route_records(lines, jsonl, prefilter=None):
+    """
+    从文本行产出线路 JSON 对象。jsonl 为 True 时逐行解析 (跳过空行、以 '#' 开头的注释行，
+    以及 prefilter(行) 为假的行)；否则整体解析为线路列表，或带 'routes' 键的对象。
+    """
+    if jsonl:
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#') or (prefilter is not None and not prefilter(line)):
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise json.JSONDecodeError(f"第 {number} 行: {e.msg}", e.doc, e.pos) from None
+        return
+    data = json.loads(''.join(lines))
+    if isinstance(data, dict): data = data.get('routes', [])
+    elif not isinstance(data, list): data = []
+    yield from data
+
+
+def iter_route_records(path, prefilter=None):
+    """逐条产出线路数据库中的线路 JSON 对象，格式由文件后缀决定 (见 JSONL_SUFFIXES)。"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from parse_route_records(f, path.suffix.lower() in JSONL_SUFFIXES, prefilter)
+
+
+def iter_routes(path, holds, with_digest=False, where=None):
+    """流式读取线路: 只为满足 where(线路 JSON) 的线路构建 Route，线路引用的岩点编号驻留到 holds 中。"""
+    for route_data in iter_route_records(path, getattr(where, 'matches_line', None)):
+        if where is None or where(route_data):
+            yield Route.from_json(route_data, holds, with_digest)
+
+
+def load_routes(path, holds, with_digest=False, where=None):
+    """读取 routes.json (线路列表，或带 'routes' 键的对象) 或 JSONL 线路数据库，线路引用的岩点编号驻留到 holds 中。"""
+    return list(iter_routes(path, holds, with_digest, where))
+
+
+class RouteSelector:
+    """
+    按线路名、难度、作者 (均不区分大小写，同一类条件之间为 "或") 筛选线路 JSON；
+    exclude_digests 中的线路 (route_json_digest) 被排除。
+    """
+
+    def __init__(self, names=(), grades=(), authors=(), exclude_digests=None):
+        self.names, self.grades, self.authors = ({v.strip().lower() for v in values} for values in (names, grades, authors))
+        self.exclude_digests = exclude_digests
+
+    def __call__(self, route_data):
+        if self.names and str(route_data.get('routeName', route_data.get('name', ''))).strip().lower() not in self.names: return False
+        if self.grades and str(route_data.get('difficulty', route_data.get('grade', ''))).strip().lower() not in self.grades: return False
+        if self.authors and str(route_data.get('author', '')).strip().lower() not in self.authors: return False
+        return self.exclude_digests is None or route_json_digest(route_data) not in self.exclude_digests
+
+    def matches_line(self, line):
+        """
+        JSONL 的快速预筛: 按线路名筛选时，不包含任何一个线路名的行不可能被选中，可以不做 JSON 解析。
+        只对 ASCII 线路名生效 (非 ASCII 字符在 JSON 中可能被转义)，其他情况总是返回 True。
+        """
+        if not self.names or not all(name.isascii() for name in self.names):
+            return True
+        line = line.lower()
+        return any(name in line for name in self.names)
+
+
+def route_selector(names=(), grades=(), authors=(), exclude_digests=None):
+    """没有任何筛选条件时返回 None (即全部线路)，否则返回 RouteSelector。"""
+    if not (names or grades or authors or exclude_digests is not None):
+        return None
+    return RouteSelector(names or (), grades or (), authors or (), exclude_digests)
+
+
+def route_digests_at_revision(path, revision):
+    """
+    线路数据库在 git 版本 revision 时所有线路的 route_json_digest 集合，用于只选出此后新增或修改过的线路。
+    该版本中文件不存在时返回空集合 (所有线路都算新增)。
+    """
+    import subprocess
+    path = Path(path)
+    result = subprocess.run(['git', 'show', f'{revision}:./{path.name}'], cwd=path.parent, capture_output=True, text=True, encoding='utf-8')
+    if result.returncode != 0:
+        exists = subprocess.run(['git', 'rev-parse', '--verify', '--quiet', f'{revision}^{{commit}}'], cwd=path.parent, capture_output=True)
+        if exists.returncode != 0:
+            raise ValueError(f"无效的 git 版本: {revision}")
+        return set()
+    records = parse_route_records(result.stdout.splitlines(keepends=True), path.suffix.lower() in JSONL_SUFFIXES)
+    return {route_json_digest(route_data) for route_data in records}
+
+
+def expected_hold_ids(config):
+    """config.json 中 valid_hold_ranges 定义的全部岩点编号 (numeric_ranges 和 alphabetic_ranges 均含两端)。"""
+    ranges = config.get('valid_hold_ranges') or {}
+    expected = set()
+    for start, end in ranges.get('numeric_ranges', []):
+        expected.update(str(i) for i in range(start, end + 1))
+    for start_char, end_char in ranges.get('alphabetic_ranges', []):
+        expected.update(chr(i) for i in range(ord(start_char.lower()), ord(end_char.lower()) + 1))
+    return expected
+
+
+def load_config(wall_dir):
+    """读取墙体的 config.json；文件不存在时返回空字典。"""
+    path = Path(wall_dir) / 'config.json'
+    return load_json(path) if path.exists() else {}
+
+
+def load_wall(wall_dir, with_digest=False) -> Wall:
+    """
+    读取一个墙体目录: config.json、routes.json 和 output/data/holds.json。
+    后两者缺失时分别视为没有线路 / 没有坐标。
+    """
+    wall_dir = Path(wall_dir)
+    holds_path, routes_path = wall_dir / 'output/data/holds.json', wall_dir / 'routes.json'
+    holds = load_holds(holds_path) if holds_path.exists() else HoldTable()
+    routes = load_routes(routes_path, holds, with_digest) if routes_path.exists() else []
+    return Wall(wall_dir, load_config(wall_dir), holds, routes)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 脚本之间按模块名互相导入 (from wall_data import ...)，测试同样把脚本目录加入导入路径
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / '.github' / 'scripts'))
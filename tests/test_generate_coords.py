@@ -0,0 +1,99 @@
+import numpy as np
+
+from generate_coords import _collect_tile_results, detections_to_holds, iter_tiles, merge_detections, merge_manual_holds, redetect_regions
+
+
+def test_first_run_keeps_existing_holds_json():
+    existing = {'1': {'x': 10, 'y': 10}, '2': {'x': 20, 'y': 20}}
+    merged, record = merge_manual_holds({'1': {'x': 99, 'y': 99}, '3': {'x': 30, 'y': 30}}, existing)
+    assert merged == existing
+    assert record['written'] == existing and record['manual'] == existing and record['deleted'] == []
+
+
+def test_first_run_without_holds_json_uses_ocr():
+    ocr = {'1': {'x': 10, 'y': 10}}
+    merged, record = merge_manual_holds(ocr, None)
+    assert merged == ocr
+    assert record == {'written': ocr, 'manual': {}, 'deleted': []}
+
+
+def test_manual_edits_survive_later_runs():
+    written = {'1': {'x': 10, 'y': 10}, '2': {'x': 20, 'y': 20}, '3': {'x': 30, 'y': 30}}
+    record = {'written': written, 'manual': {}, 'deleted': []}
+    # 修正 '1'、新增 '9'、删除 '3'
+    edited = {'1': {'x': 11, 'y': 11}, '2': {'x': 20, 'y': 20}, '9': {'x': 90, 'y': 90}}
+    ocr = {'1': {'x': 10, 'y': 10}, '2': {'x': 21, 'y': 21}, '3': {'x': 30, 'y': 30}}
+    merged, record = merge_manual_holds(ocr, edited, record)
+    assert merged == {'1': {'x': 11, 'y': 11}, '2': {'x': 21, 'y': 21}, '9': {'x': 90, 'y': 90}}
+    assert record['deleted'] == ['3']
+    # 下一次识别: 文件就是上次写出的内容，手动条目和删除依然生效
+    merged_again, _ = merge_manual_holds(ocr, merged, record)
+    assert merged_again == merged
+
+
+def test_deleted_id_can_be_added_back_by_hand():
+    record = {'written': {'1': {'x': 1, 'y': 1}}, 'manual': {}, 'deleted': ['3']}
+    merged, record = merge_manual_holds({'3': {'x': 3, 'y': 3}}, {'1': {'x': 1, 'y': 1}, '3': {'x': 4, 'y': 4}}, record)
+    assert merged['3'] == {'x': 4, 'y': 4} and record['deleted'] == []
+
+
+def _detection(text, x, y, prob):
+    return (text, x, y, prob, (x - 5, y - 5, x + 5, y + 5))
+
+
+def test_iter_tiles_covers_the_image_with_overlap():
+    assert list(iter_tiles(500, 400, 0, 128)) == [(0, 0, 500, 400)]
+    assert list(iter_tiles(500, 400, 512, 128)) == [(0, 0, 500, 400)]
+    tiles = list(iter_tiles(1000, 600, 512, 128))
+    assert tiles == [(0, 0, 512, 512), (384, 0, 896, 512), (768, 0, 1000, 512),
+                     (0, 384, 512, 600), (384, 384, 896, 600), (768, 384, 1000, 600)]
+
+
+def test_merge_detections_drops_repeats_from_other_tiles():
+    detections = [_detection('12', 100, 100, 0.6), _detection('12', 103, 101, 0.9), _detection('13', 102, 100, 0.5)]
+    kept = merge_detections(detections, [0, 1, 1], radius=8)
+    # 置信度高的保留；文本不同的标签离得再近也保留
+    assert kept == [detections[1], detections[2]]
+
+
+def test_merge_detections_keeps_same_tile_and_distant_repeats():
+    detections = [_detection('a', 100, 100, 0.9), _detection('a', 102, 100, 0.8), _detection('a', 300, 100, 0.7)]
+    assert merge_detections(detections, [0, 0, 1], radius=8) == detections
+
+
+def test_collect_tile_results_drops_cut_off_labels():
+    image_size = (1000, 600)
+    tiles = [(0, 0, 512, 512), (384, 0, 896, 512)]
+    # 第一块中贴着右边缘 (x=512) 的 "#1" 很可能是被截断的 "#12"
+    results = [(tiles[0], [_detection('1', 507, 100, 0.9), _detection('7', 200, 100, 0.9)]),
+               (tiles[1], [_detection('12', 507, 100, 0.8)])]
+    detections, sources = _collect_tile_results(results, image_size, len(tiles))
+    assert [d[0] for d in detections] == ['7', '12'] and sources == [0, 1]
+
+
+def test_detections_to_holds_prefers_confident_reads():
+    detections = [_detection('5', 10, 10, 0.9), _detection('5', 50, 50, 0.4), _detection('6', 70, 70, 0.5)]
+    assert detections_to_holds(detections) == {'5': {'x': 10, 'y': 10}, '6': {'x': 70, 'y': 70}}
+
+
+class _FakeBackend:
+    """按图片坐标固定返回几个检测结果的假后端，只返回落在被识别的裁剪区域内的结果。"""
+
+    def __init__(self, detections):
+        self.detections, self.calls = detections, []
+
+    def detect(self, image, offset=(0, 0)):
+        x0, y0 = offset; x1, y1 = x0 + image.shape[1], y0 + image.shape[0]
+        self.calls.append((x0, y0, x1, y1))
+        return [d for d in self.detections if x0 <= d[4][0] and d[4][2] <= x1 and y0 <= d[4][1] and d[4][3] <= y1]
+
+
+def test_redetect_regions_replaces_only_changed_areas():
+    image = np.zeros((400, 400, 3), np.uint8)
+    old = [_detection('1', 50, 50, 0.9), _detection('2', 300, 300, 0.9)]
+    backend = _FakeBackend([_detection('1', 50, 50, 0.9), _detection('2', 305, 300, 0.8), _detection('3', 320, 330, 0.7)])
+    result = redetect_regions(image, [(256, 256, 384, 384)], old, 32, backend)
+    # 只识别了扩展 pad 后的变化区域；区域外的旧结果原样保留
+    assert backend.calls == [(224, 224, 400, 400)]
+    assert sorted(d[0] for d in result) == ['1', '2', '3']
+    assert old[0] in result and _detection('2', 305, 300, 0.8) in result and old[1] not in result
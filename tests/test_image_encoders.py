@@ -0,0 +1,69 @@
+import io
+
+import pytest
+from PIL import Image, features
+
+from image_encoders import DEFAULT_ENCODER, ImageEncoder, avif_available, encode_report, read_metadata
+
+
+@pytest.mark.parametrize('spec, name, extension', [
+    (DEFAULT_ENCODER, 'png', '.png'),
+    (' PNG:level=1,colors=256 ', 'png:colors=256,level=1', '.png'),
+    ('webp:quality=85', 'webp', '.webp'),
+    ('webp:lossless,method=0', 'webp:lossless,method=0', '.webp'),
+    ('webp:lossless=no', 'webp', '.webp'),
+    ('webp:,quality=70,', 'webp:quality=70', '.webp'),
+])
+def test_spec_parsing_normalizes_names(spec, name, extension):
+    encoder = ImageEncoder(spec)
+    assert encoder.name == name and encoder.extension == extension
+    assert ImageEncoder(encoder.name).options == encoder.options
+
+
+@pytest.mark.parametrize('spec, message', [
+    ('gif', '未知的编码格式'),
+    ('png:quality=80', '不支持选项'),
+    ('webp:quality=high', '需要一个整数'),
+    ('webp:quality=101', '0 到 100'),
+    ('png:colors=1', '2 到 256'),
+])
+def test_invalid_specs_raise_value_error(spec, message):
+    with pytest.raises(ValueError, match=message):
+        ImageEncoder(spec)
+
+
+def test_png_save_params():
+    image = Image.new('RGB', (8, 8), (10, 20, 30))
+    assert ImageEncoder('png').save_params(image)[1] == {'optimize': True}
+    assert ImageEncoder('png:level=1').save_params(image)[1] == {'compress_level': 1}
+    quantized, _ = ImageEncoder('png:colors=16').save_params(image)
+    assert quantized.mode == 'P'
+
+
+def _formats():
+    formats = ['png']
+    if features.check('webp'): formats.append('webp')
+    if avif_available(): formats.append('avif')
+    return formats
+
+
+@pytest.mark.parametrize('fmt', _formats())
+def test_metadata_round_trip(fmt):
+    text = '{"route": "V3 <a & \\"b\\">", "offset": [1, 2]} 中文'
+    data = ImageEncoder(fmt).encode_bytes(Image.new('RGBA', (8, 8), (255, 0, 0, 128)), metadata={'route-layer': text, 'other': 'x'})
+    with Image.open(io.BytesIO(data)) as im:
+        assert read_metadata(im, 'route-layer') == text and read_metadata(im, 'other') == 'x'
+        assert read_metadata(im, 'missing') is None
+
+
+def test_read_metadata_without_metadata():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+    with Image.open(buffer) as im:
+        assert read_metadata(im, 'route-layer') is None
+
+
+def test_encode_report_records_bad_specs():
+    rows = encode_report([Image.new('RGB', (16, 16))], ['png', 'bogus'])
+    assert rows[0]['encoder'] == 'png' and 'error' not in rows[0]
+    assert rows[1]['encoder'] == 'bogus' and '未知的编码格式' in rows[1]['error']
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+from mark_all_holds import heatmap_density, hold_usage, usage_report  # noqa: E402
+from wall_data import HoldTable, Route  # noqa: E402
+
+
+def _wall():
+    holds = HoldTable(['1', '2', '3', '4'], [(10, 10), (50, 10), (10, 50), (90, 90)])
+    routes = [
+        Route.from_json({'moves': [{'hold_id': '1', 'type': 'start'}, {'hold_id': '2', 'hand': 'left'}, {'hold_id': '2', 'hand': 'right'}],
+                         'holds': {'foot': ['3']}}, holds),
+        Route.from_json({'moves': [{'hold_id': '2', 'type': 'start'}, {'hold_id': '9', 'type': 'finish'}], 'holds': {'foot': ['3', '3']}}, holds),
+    ]
+    return holds, routes
+
+
+def test_hold_usage_counts_by_category():
+    holds, routes = _wall()
+    usage = hold_usage(holds, routes)
+    i = holds.index
+    assert usage['start'][i['1']] == 1 and usage['start'][i['2']] == 1
+    assert usage['left_hand'][i['2']] == 1 and usage['right_hand'][i['2']] == 1
+    assert usage['foot'][i['3']] == 3
+    assert usage['total'][i['2']] == 3
+    # 同一条线路多次用到同一个岩点只算一次
+    assert usage['routes'][i['2']] == 2 and usage['routes'][i['3']] == 2
+    assert usage['finish'][i['9']] == 1
+
+
+def test_usage_report_lists_unused_and_referenced_holds():
+    holds, routes = _wall()
+    report = usage_report('wall', holds, routes, hold_usage(holds, routes))
+    assert report['unused'] == ['4']
+    assert set(report['holds']) == {'1', '2', '3', '4', '9'}
+    assert report['holds']['9']['finish'] == 1
+
+
+def test_hold_usage_without_routes():
+    holds, _ = _wall()
+    usage = hold_usage(holds, [])
+    assert not usage['total'].any() and len(usage['total']) == len(holds)
+
+
+def test_heatmap_density_peaks_at_the_most_used_hold():
+    xy = np.array([[20.0, 20.0], [80.0, 60.0]])
+    density = heatmap_density((100, 120), xy, np.array([1.0, 4.0], np.float32), sigma=6)
+    assert density.shape == (100, 120) and density.dtype == np.float32
+    assert density.max() == pytest.approx(1.0, abs=0.05)
+    y, x = np.unravel_index(np.argmax(density), density.shape)
+    assert abs(x - 80) <= 4 and abs(y - 60) <= 4
+    assert density[20, 20] < density[60, 80]
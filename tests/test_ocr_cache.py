@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from ocr_cache import bbox_intersects, block_signatures, changed_regions, load_cache, save_cache
+
+
+def _image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(200, 300, 3), dtype=np.uint8)
+
+
+def test_block_signatures_grid_and_stability():
+    image = _image()
+    signatures, shape = block_signatures(image, 64)
+    assert shape == (4, 5) and len(signatures) == 20
+    assert block_signatures(image.copy(), 64)[0] == signatures
+
+
+def test_changed_regions_groups_adjacent_blocks():
+    pytest.importorskip('cv2')
+    image = _image()
+    old, shape = block_signatures(image, 64)
+    edited = image.copy()
+    edited[70:130, 70:80] = 0      # 块 (1, 1) 和 (2, 1)
+    edited[10, 290] = 0            # 右上角最后一列 (宽度只有 44 像素)
+    new, _ = block_signatures(edited, 64)
+    regions = changed_regions(old, new, shape, 64, (300, 200))
+    assert sorted(regions) == [(64, 64, 128, 192), (256, 0, 300, 64)]
+
+
+def test_changed_regions_without_changes():
+    signatures, shape = block_signatures(_image(), 64)
+    assert changed_regions(signatures, list(signatures), shape, 64, (300, 200)) == []
+
+
+def test_bbox_intersects():
+    assert bbox_intersects((0, 0, 10, 10), (5, 5, 20, 20))
+    # 只共享一条边不算相交
+    assert not bbox_intersects((0, 0, 10, 10), (10, 0, 20, 10))
+
+
+def test_cache_round_trip(tmp_path):
+    path = tmp_path / 'cache/ocr.json'
+    detections = [('12', 40, 50, 0.98765, (30, 40, 50, 60)), ('a', 5, 6, 0.5, (0, 0, 10, 12))]
+    save_cache(path, 'abc', (300, 200), ['s1', 's2'], detections, block_size=64, backend='opencv', holds={'written': {}})
+    cache = load_cache(path)
+    assert cache['detections'] == [('12', 40, 50, 0.9877, (30, 40, 50, 60)), ('a', 5, 6, 0.5, (0, 0, 10, 12))]
+    assert (cache['backend'], cache['width'], cache['height'], cache['blocks'], cache['holds']) == ('opencv', 300, 200, ['s1', 's2'], {'written': {}})
+
+
+def test_load_cache_rejects_missing_or_incompatible(tmp_path):
+    assert load_cache(tmp_path / 'none.json') is None
+    (tmp_path / 'bad.json').write_text('{', encoding='utf-8')
+    assert load_cache(tmp_path / 'bad.json') is None
+    (tmp_path / 'old.json').write_text('{"version": 0, "detections": []}', encoding='utf-8')
+    assert load_cache(tmp_path / 'old.json') is None
@@ -0,0 +1,34 @@
+import json
+
+from PIL import Image, PngImagePlugin
+
+from overlay_viewer import LAYER_INFO_KEY, build_index, read_layer_info, write_viewer
+
+
+def _layer(path, route):
+    info = PngImagePlugin.PngInfo()
+    info.add_text(LAYER_INFO_KEY, json.dumps({'offset': [1, 2], 'canvas': [20, 14], 'route': route, 'grade': 'V3', 'author': ''}))
+    Image.new('RGBA', (4, 4)).save(path, pnginfo=info)
+
+
+def test_build_index_reads_layer_headers(tmp_path):
+    Image.new('RGB', (20, 10)).save(tmp_path / 'base.png')
+    _layer(tmp_path / 'V3_a#b_%41.png', 'a#b %41')
+    Image.new('RGB', (4, 4)).save(tmp_path / 'plain.png')
+    assert read_layer_info(tmp_path / 'plain.png') is None
+    index = build_index(tmp_path)
+    assert index['base'] == 'base.png' and index['base_size'] == [20, 10]
+    assert [layer['file'] for layer in index['layers']] == ['V3_a#b_%41.png']
+    assert index['layers'][0]['offset'] == [1, 2] and index['layers'][0]['route'] == 'a#b %41'
+
+
+def test_viewer_encodes_file_names_and_escapes_script(tmp_path):
+    Image.new('RGB', (20, 10)).save(tmp_path / 'base.png')
+    _layer(tmp_path / 'V3_x.png', '</script><b>')
+    write_viewer(tmp_path, title='<Wall>')
+    page = (tmp_path / 'index.html').read_text(encoding='utf-8')
+    # 文件名在页面中按 URL 编码后才赋给 src，#、?、% 不会被当成 URL 语法
+    assert 'layer.src = encodeURIComponent(entry.file);' in page and 'base.src = encodeURIComponent(INDEX.base);' in page
+    assert '<title>&lt;Wall&gt;</title>' in page
+    assert page.count('</script>') == 1 and '<\\/script><b>' in page
+    assert json.loads((tmp_path / 'index.json').read_text(encoding='utf-8'))['layers'][0]['route'] == '</script><b>'
@@ -0,0 +1,61 @@
+from render_manifest import (keep_failed_entries, load_manifest, manifest_path_for, prune_stale_outputs, route_digest,
+                             save_manifest, shared_inputs_digest, update_manifest)
+from wall_data import HoldTable, Route
+
+ROUTE = {'routeName': 'A', 'difficulty': 'V1', 'moves': [{'hold_id': '1', 'type': 'start'}, {'hold_id': '2', 'hand': 'left'}]}
+
+
+def test_route_digest_follows_referenced_holds_only():
+    holds = HoldTable(['1', '2', '3'], [(0, 0), (10, 10), (20, 20)])
+    route = Route.from_json(ROUTE, holds, with_digest=True)
+    digest = route_digest(route, holds, 'shared')
+    holds.set('3', 99, 99)
+    assert route_digest(route, holds, 'shared') == digest
+    holds.set('2', 11, 10)
+    assert route_digest(route, holds, 'shared') != digest
+    assert route_digest(route, holds, 'other') != route_digest(route, holds, 'shared')
+
+
+def test_route_digest_changes_when_missing_hold_gets_coordinates():
+    holds = HoldTable(['1'], [(0, 0)])
+    route = Route.from_json(ROUTE, holds, with_digest=True)
+    digest = route_digest(route, holds, 'shared')
+    holds.set('2', 5, 5)
+    assert route_digest(route, holds, 'shared') != digest
+
+
+def test_shared_inputs_digest_covers_style_and_options(tmp_path):
+    base, font = tmp_path / 'base.png', tmp_path / 'font.ttf'
+    base.write_bytes(b'base'); font.write_bytes(b'font')
+    digest = shared_inputs_digest(base, {'radius': 18}, [font], {'scale': 0.5})
+    assert digest == shared_inputs_digest(base, {'radius': 18}, [font, font], {'scale': 0.5})
+    assert digest != shared_inputs_digest(base, {'radius': 19}, [font], {'scale': 0.5})
+    assert digest != shared_inputs_digest(base, {'radius': 18}, [font], {'scale': 1.0})
+    base.write_bytes(b'changed')
+    assert digest != shared_inputs_digest(base, {'radius': 18}, [font], {'scale': 0.5})
+
+
+def test_manifest_round_trip_and_partial_update(tmp_path):
+    path = manifest_path_for(tmp_path / 'generated_routes')
+    assert path == tmp_path / 'generated_routes.manifest.json'
+    assert load_manifest(path) == {}
+    save_manifest(path, {'a.png': {'route': 'a', 'hash': '1'}, 'b.png': {'route': 'b', 'hash': '2'}})
+    update_manifest(path, {'b.png': {'route': 'b', 'hash': '3'}, 'c.png': {'route': 'c', 'hash': '4'}})
+    assert load_manifest(path) == {'a.png': '1', 'b.png': '3', 'c.png': '4'}
+    path.write_text('{"version": 0, "routes": {}}')
+    assert load_manifest(path) == {}
+
+
+def test_prune_stale_outputs_keeps_listed_files(tmp_path):
+    for name in ('a.png', 'b.png', 'c.webp'):
+        (tmp_path / name).write_bytes(b'')
+    removed = prune_stale_outputs(tmp_path, {'a.png'})
+    assert [p.name for p in removed] == ['b.png']
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.png', 'c.webp']
+
+
+def test_failed_route_keeps_previous_entry():
+    entries = {'a.png': {'route': 'a', 'hash': 'new'}, 'b.png': {'route': 'b', 'hash': 'same'}, 'c.png': {'route': 'c', 'hash': 'x'}}
+    keep_failed_entries(entries, {'a.png': 'old', 'b.png': 'same'}, ['a.png', 'b.png', 'c.png'])
+    # a: 旧图片仍然有效，保留旧哈希以便下次重试; b: 图片本来就缺失; c: 第一次绘制就失败
+    assert entries == {'a.png': {'route': 'a', 'hash': 'old'}}
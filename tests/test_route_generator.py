@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from route_generator import RouteGenerator, _grade_number
+from wall_data import HoldTable, Route, Wall
+
+
+def _grid_wall(config=None, routes=()):
+    # 6 列 x 10 行的规则岩点阵，间距 100px，y 向下增大
+    ids, xy = [], []
+    for row in range(10):
+        for col in range(6):
+            ids.append(str(len(ids) + 1)); xy.append((100 + col * 100, 100 + row * 100))
+    holds = HoldTable(ids, xy)
+    return Wall('grid', dict(config or {}), holds, [Route.from_json(r, holds) for r in routes])
+
+
+def _sequence(route):
+    return [move['hold_id'] for move in route['moves']]
+
+
+def test_grade_number():
+    assert _grade_number('V3') == 3 and _grade_number(' v10+') == 10
+    assert _grade_number('5c') is None and _grade_number(None) is None
+
+
+def test_generated_routes_respect_move_constraints():
+    wall = _grid_wall()
+    generator = RouteGenerator(wall, seed=1, reach=250)
+    routes = generator.generate(30, beam_width=256)
+    assert routes
+    p, reach = generator.params, generator.params['reach']
+    coords = wall.holds.coords()
+    xy = lambda hold_id: np.array([coords[hold_id]['x'], coords[hold_id]['y']])
+    top, bottom = 100, 1000
+    for route in routes:
+        moves = route['moves']
+        ids = _sequence(route)
+        assert len(set(ids)) == len(ids)
+        assert [m.get('type') for m in moves[:2]] == ['start', 'start'] and moves[-1] == {'hold_id': ids[-1], 'type': 'finish', 'hand': 'both'}
+        assert p['min_moves'] <= len(moves) - 2 <= p['max_moves'] + 1
+        assert all(xy(h)[1] >= bottom - p['start_band'] * (bottom - top) for h in ids[:2])
+        assert xy(ids[-1])[1] <= top + p['finish_band'] * (bottom - top)
+        left, right = xy(ids[0]), xy(ids[1])
+        assert left[0] < right[0]
+        for move in moves[2:-1]:
+            target = xy(move['hold_id'])
+            mover, other = (left, right) if move['hand'] == 'left' else (right, left)
+            assert p['min_move'] * reach <= np.hypot(*(target - mover)) <= reach
+            assert target[1] <= mover[1] + p['max_drop'] * reach
+            assert np.hypot(*(target - other)) <= reach
+            if move['hand'] == 'left': left = target
+            else: right = target
+        assert route['holds'] == {'foot': []}
+
+
+def test_generate_skips_existing_routes_and_duplicates():
+    wall = _grid_wall()
+    first = RouteGenerator(wall, seed=3, reach=250).generate(5, beam_width=128)
+    wall = _grid_wall(routes=first)
+    again = RouteGenerator(wall, seed=3, reach=250).generate(50, beam_width=128)
+    sequences = [tuple(_sequence(r)) for r in again]
+    assert len(set(sequences)) == len(sequences)
+    assert not {tuple(_sequence(r)) for r in first} & set(sequences)
+
+
+def test_foot_only_holds_are_never_hands():
+    foot_only = [str(i) for i in range(1, 61, 2)]
+    wall = _grid_wall({'foot_only_holds': foot_only})
+    routes = RouteGenerator(wall, seed=2, reach=250).generate(20, beam_width=256)
+    assert routes
+    assert not {h for r in routes for h in _sequence(r)} & set(foot_only)
+
+
+def test_valid_hold_ranges_limit_the_hand_holds():
+    wall = _grid_wall({'valid_hold_ranges': {'numeric_ranges': [[1, 48]]}})
+    generator = RouteGenerator(wall, seed=0, reach=250)
+    assert generator.ids == [str(i) for i in range(1, 49)]
+
+
+def test_require_feet_emits_supporting_foot_holds():
+    wall = _grid_wall()
+    generator = RouteGenerator(wall, require_feet=True, seed=4, reach=250)
+    p, reach = generator.params, generator.params['reach']
+    coords = wall.holds.coords()
+    routes = generator.generate(20, beam_width=256)
+    assert routes
+    for route in routes:
+        hands = _sequence(route)
+        feet = route['holds']['foot']
+        assert feet and len(set(feet)) == len(feet) and not set(feet) & set(hands)
+        for foot in feet:
+            fx, fy = coords[foot]['x'], coords[foot]['y']
+            # 每个脚点都在某个手点下方的支撑范围内
+            assert any(p['foot_min'] * reach <= fy - coords[h]['y'] <= p['foot_max'] * reach and abs(fx - coords[h]['x']) <= p['foot_spread'] * reach
+                       for h in hands)
+
+
+def test_require_feet_marks_hands_without_support():
+    # 最下面两行的岩点下方 foot_min * reach 以外没有岩点，不算有脚点支撑
+    wall = _grid_wall()
+    generator = RouteGenerator(wall, require_feet=True, seed=0, reach=250)
+    assert not generator.footed[generator.y >= 900].any()
+    assert generator.footed[generator.y <= 700].all()
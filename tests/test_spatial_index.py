@@ -0,0 +1,61 @@
+import math
+
+import numpy as np
+import pytest
+
+from spatial_index import GridIndex, cluster_pairs, near_duplicate_report
+from wall_data import HoldTable
+
+
+def _points(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return [str(i) for i in range(n)], rng.uniform(-200, 1200, size=(n, 2))
+
+
+def _brute(xy, x, y):
+    return sorted((math.hypot(px - x, py - y), str(i)) for i, (px, py) in enumerate(xy))
+
+
+@pytest.mark.parametrize('cell_size', [None, 7, 500])
+def test_nearest_matches_brute_force(cell_size):
+    keys, xy = _points()
+    index = GridIndex.from_points(keys, xy, cell_size)
+    for x, y in [(0, 0), (555.5, 123.4), (5000, -3000), tuple(xy[17])]:
+        expected = _brute(xy, x, y)
+        assert index.nearest(x, y, k=5) == pytest.approx(expected[:5])
+        limited = index.nearest(x, y, k=5, max_distance=60)
+        assert limited == [item for item in expected[:5] if item[0] <= 60]
+
+
+def test_nearest_on_empty_and_small_indexes():
+    assert GridIndex().nearest(1, 2) == []
+    index = GridIndex(10)
+    index.add('a', 0, 0)
+    assert index.nearest(100, 0, k=3) == [(100.0, 'a')]
+
+
+@pytest.mark.parametrize('cell_size', [None, 13])
+def test_within_matches_brute_force(cell_size):
+    keys, xy = _points(seed=1)
+    index = GridIndex.from_points(keys, xy, cell_size)
+    for x, y, radius in [(500, 500, 80), (-200, -200, 150), (0, 0, 0)]:
+        assert index.within(x, y, radius) == [item for item in _brute(xy, x, y) if item[0] <= radius]
+
+
+@pytest.mark.parametrize('cell_size', [None, 5, 64])
+def test_close_pairs_matches_brute_force(cell_size):
+    keys, xy = _points(seed=2)
+    index = GridIndex.from_points(keys, xy, cell_size)
+    expected = sorted((math.hypot(*(xy[a] - xy[b])), str(a), str(b)) for a in range(len(xy)) for b in range(a + 1, len(xy))
+                      if math.hypot(*(xy[a] - xy[b])) < 30)
+    assert expected and index.close_pairs(30) == pytest.approx(expected)
+
+
+def test_cluster_pairs_and_report(tmp_path):
+    holds = HoldTable(['1', '2', '3', '10', '11'], [(0, 0), (5, 0), (10, 0), (100, 100), (103, 100)])
+    pairs = GridIndex.from_holds(holds).close_pairs(6)
+    assert [(a, b) for _, a, b in pairs] == [('10', '11'), ('1', '2'), ('2', '3')]
+    assert [sorted(cluster) for cluster in cluster_pairs(pairs)] == [['1', '2', '3'], ['10', '11']]
+    report = near_duplicate_report(tmp_path, 6, holds=holds, config={'wall_name': 'W'})
+    assert report['wall'] == 'W' and report['holds'] == 5 and len(report['pairs']) == 3
+    assert report['clusters'][0]['holds'] == ['1', '2', '3'] and report['clusters'][0]['xy'] in holds.coords(range(3)).values()
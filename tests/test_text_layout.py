@@ -0,0 +1,55 @@
+from text_layout import _break_units, layout_text, wrap_paragraph
+
+
+class MonoFont:
+    """每个字符宽 10px 的假字体，测试不依赖字体文件。"""
+
+    def getlength(self, text):
+        return 10.0 * len(text)
+
+    def getbbox(self, text, stroke_width=0):
+        return (-stroke_width, 2 - stroke_width, 10 * len(text) + stroke_width, 12 + stroke_width)
+
+    def getmetrics(self):
+        return 11, 3
+
+
+FONT = MonoFont()
+
+
+def test_break_units_splits_cjk_per_character_and_words_whole():
+    assert _break_units('abc 中文') == ['abc', ' ', '中', '文']
+
+
+def test_break_units_applies_kinsoku():
+    # 行首禁则标点粘到前一个单元，行尾禁则标点粘到后一个单元
+    assert _break_units('好，「对」。') == ['好，', '「对」。']
+    assert _break_units('end. (note)') == ['end.', ' ', '(note)']
+
+
+def test_wrap_latin_by_words():
+    assert wrap_paragraph('aa bb cc dd', FONT, 50) == ['aa bb', 'cc dd']
+    assert wrap_paragraph('  leading', FONT, 100) == ['leading']
+
+
+def test_wrap_cjk_never_starts_a_line_with_closing_punctuation():
+    lines = wrap_paragraph('一二三四，五六', FONT, 40)
+    assert lines == ['一二三', '四，五六']
+    assert not any(line[0] in '，。' for line in lines)
+
+
+def test_wrap_splits_overlong_words_by_character():
+    assert wrap_paragraph('abcdefg', FONT, 30) == ['abc', 'def', 'g']
+    assert wrap_paragraph('w', FONT, 5) == ['w']
+
+
+def test_layout_text_measures_once():
+    block = layout_text('hello world\n中文', FONT, 60, line_spacing=4, stroke_width=1)
+    assert [line.text for line in block.lines] == ['hello', 'world', '中文']
+    assert [line.width for line in block.lines] == [52, 52, 22]
+    assert block.line_height == 16 and block.height == 3 * 16 + 2 * 4 and block.width == 52
+
+
+def test_layout_empty_text():
+    block = layout_text('', FONT, 100, line_spacing=4)
+    assert block.lines == [] and block.height == 0 and block.width == 0
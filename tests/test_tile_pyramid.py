@@ -0,0 +1,38 @@
+import pytest
+from PIL import Image
+
+from tile_pyramid import check_tile_size, export_wall_tiles, level_sizes, write_base_pyramid
+
+
+@pytest.mark.parametrize('tile_size', [0, -2, 1, 255, 2.0])
+def test_check_tile_size_rejects_odd_and_small(tile_size):
+    with pytest.raises(ValueError):
+        check_tile_size(tile_size)
+
+
+def test_check_tile_size_accepts_even():
+    check_tile_size(2); check_tile_size(256)
+
+
+def test_export_wall_tiles_checks_tile_size_first(tmp_path):
+    with pytest.raises(ValueError):
+        export_wall_tiles(tmp_path, tile_size=255)
+    assert not (tmp_path / 'output').exists()
+
+
+def test_level_sizes():
+    assert level_sizes(5, 3) == [(1, 1), (2, 1), (3, 2), (5, 3)]
+    assert level_sizes(1, 1) == [(1, 1)]
+
+
+def test_write_base_pyramid(tmp_path):
+    Image.new('RGBA', (10, 6), (255, 0, 0, 128)).save(tmp_path / 'base.png')
+    sizes = write_base_pyramid(tmp_path / 'base.png', tmp_path / 'tiles', tile_size=4, fmt='png')
+    assert sizes == level_sizes(10, 6)
+    top = tmp_path / 'tiles/base_files' / str(len(sizes) - 1)
+    assert sorted(p.name for p in top.iterdir()) == sorted(f"{c}_{r}.png" for c in range(3) for r in range(2))
+    with Image.open(top / '2_1.png') as tile:
+        assert tile.size == (2, 2) and tile.mode == 'RGB'
+    with Image.open(tmp_path / 'tiles/base_files/0/0_0.png') as tile:
+        assert tile.size == (1, 1)
+    assert 'TileSize="4"' in (tmp_path / 'tiles/base.dzi').read_text(encoding='utf-8')
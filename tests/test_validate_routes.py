@@ -0,0 +1,69 @@
+from validate_routes import validate_wall, wall_report
+from wall_data import HoldTable, Route, Wall, flatten_routes
+
+
+def _wall(routes, config=None):
+    holds = HoldTable(['1', '2', '3', '4', 'f'], [(0, 300), (50, 250), (100, 200), (100, 0), (20, 320)])
+    return Wall('wall', dict(config or {}), holds, [Route.from_json(dict(r, routeName=f"R{i}"), holds) for i, r in enumerate(routes)])
+
+
+def _moves(*holds, start=True, finish=True):
+    moves = [{'hold_id': h, 'hand': 'left' if i % 2 else 'right'} for i, h in enumerate(holds)]
+    if start: moves[0] = {'hold_id': holds[0], 'type': 'start'}
+    if finish: moves[-1] = {'hold_id': holds[-1], 'type': 'finish'}
+    return moves
+
+
+def _checks(issues):
+    return {(issue['route'], issue['check']): issue['holds'] for issue in issues}
+
+
+def test_flatten_routes():
+    wall = _wall([{'moves': _moves('1', '2'), 'holds': {'foot': ['f']}}, {'moves': _moves('3')}])
+    move_route, moves, styles, foot_route, feet = flatten_routes(wall.routes)
+    assert move_route.tolist() == [0, 0, 1] and moves.tolist() == [0, 1, 2] and styles.tolist() == [0, 1, 1]
+    assert foot_route.tolist() == [0] and feet.tolist() == [4]
+    assert [len(a) for a in flatten_routes([])] == [0] * 5
+
+
+def test_clean_route_passes():
+    issues, limit = validate_wall(_wall([{'moves': _moves('1', '2', '3'), 'holds': {'foot': ['f']}}]), max_move_distance=100)
+    assert issues == [] and limit == 100
+
+
+def test_each_check_reports_its_holds():
+    routes = [
+        {'moves': _moves('1', '9', '3')},                                # unknown_hold
+        {'moves': _moves('1', '2', start=False, finish=False)},          # missing_start + missing_finish
+        {'moves': _moves('1', 'f', '2')},                                # hand_on_foot_only
+        {'moves': _moves('1', '2', '3', '2', '3'), 'holds': {'foot': ['f', 'f']}},  # duplicate_hold (左手两次抓 2)
+        {'moves': _moves('1', '4')},                                     # long_move
+    ]
+    wall = _wall(routes, {'foot_only_holds': ['F'], 'valid_hold_ranges': {'numeric_ranges': [[1, 4]], 'alphabetic_ranges': [['f', 'f']]}})
+    issues, _ = validate_wall(wall, max_move_distance=150)
+    checks = _checks(issues)
+    assert checks[('R0', 'unknown_hold')] == ['9'] and checks[('R0', 'out_of_range')] == ['9']
+    assert checks[('R1', 'missing_start')] == [] and checks[('R1', 'missing_finish')] == []
+    assert checks[('R2', 'hand_on_foot_only')] == ['f']
+    assert checks[('R3', 'duplicate_hold')] == ['2', 'f']
+    assert checks[('R4', 'long_move')] == ['4']
+    assert [i['distances'] for i in issues if i['check'] == 'long_move'] == [[316.2]]
+    # 按线路、再按 CHECKS 中的顺序排列
+    assert [(i['route_index'], i['check']) for i in issues][:2] == [(0, 'unknown_hold'), (0, 'out_of_range')]
+
+
+def test_matching_on_one_hold_is_not_a_duplicate():
+    moves = _moves('1', '2', '3')
+    moves[2:2] = [{'hold_id': '2', 'hand': 'right'}]
+    issues, _ = validate_wall(_wall([{'moves': moves}]), max_move_distance=500)
+    assert issues == []
+
+
+def test_default_move_limit_and_report():
+    wall = _wall([{'moves': _moves('1', '2', '3')}] * 3 + [{'moves': _moves('1', '9')}])
+    issues, limit = validate_wall(wall)
+    assert round(limit, 3) == round(70.71067811865476 * 5, 3)
+    report = wall_report(wall)
+    assert report['routes'] == 4 and report['holds'] == 5
+    assert report['errors'] == 1 and report['warnings'] == 0 and report['counts'] == {'unknown_hold': 1}
+    assert validate_wall(_wall([])) == ([], None)
@@ -0,0 +1,151 @@
+import json
+import pickle
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from wall_data import (HoldTable, MISSING_HOLD_ID, Route, RouteSelector, iter_route_records, load_holds, load_routes, load_wall,
+                       normalize_hold_id, parse_route_records, route_digests_at_revision, route_json_digest, route_selector)
+
+
+def test_normalize_hold_id():
+    assert normalize_hold_id(12) == '12' and normalize_hold_id(' A ') == 'a'
+
+
+def test_hold_table_interns_and_looks_up_ids():
+    holds = HoldTable(['1', 'a'], [(10, 20), (30.5, 40)])
+    assert holds.intern('A') == 1 and holds.intern(' 1') == 0
+    assert holds.intern('B') == 2 and holds.ids == ['1', 'a', 'b']
+    assert np.isnan(holds.xy[2]).all() and holds.known.tolist() == [True, True, False]
+    assert 'A' in holds and 'b' not in holds and 'zz' not in holds
+    assert holds.get('a') == (30.5, 40) and holds.get('b') is None
+    assert holds.lookup('Z', -1) == -1 and len(holds) == 3
+    holds.set('b', 5, 6)
+    assert holds.coords() == {'1': {'x': 10, 'y': 20}, 'a': {'x': 30.5, 'y': 40}, 'b': {'x': 5, 'y': 6}}
+    assert isinstance(holds.coords()['1']['x'], int)
+
+
+def test_hold_table_scaled_translated_and_pickle():
+    holds = HoldTable(['1', '2'], [(10, 20), (30, 40)])
+    assert holds.scaled(0.5).get('2') == (15, 20) and holds.translated(-10, 5).get('1') == (0, 25)
+    copy = pickle.loads(pickle.dumps(holds))
+    assert copy.ids == holds.ids and copy.index == holds.index and np.array_equal(copy.xy, holds.xy)
+
+
+def test_load_holds_normalizes_ids(tmp_path):
+    path = tmp_path / 'holds.json'
+    path.write_text(json.dumps({'A': {'x': 1, 'y': 2}, ' 7 ': {'x': 3, 'y': 4}, 'a': {'x': 5, 'y': 6}}), encoding='utf-8')
+    holds = load_holds(path)
+    # 大小写不同的重复编号: 后出现的覆盖先出现的
+    assert holds.coords() == {'a': {'x': 5, 'y': 6}, '7': {'x': 3, 'y': 4}}
+
+
+def test_route_from_json():
+    holds = HoldTable(['1', '2'], [(0, 0), (10, 10)])
+    data = {
+        'routeName': 'Test', 'difficulty': 'V2', 'author': 'me',
+        'holds': {'foot': ['F1']},
+        'moves': [{'hold_id': '1', 'type': 'start'}, {'hold_id': 2, 'hand': 'left', 'text': '2L'},
+                  {'hold_id': 'X', 'hand': 'right'}, {'hold_id': '2', 'type': 'finish'}, {'hold_id': '1'}],
+    }
+    route = Route.from_json(data, holds, with_digest=True)
+    assert (route.name, route.grade, route.author, route.beta) == ('Test', 'V2', 'me', '')
+    assert holds.ids == ['1', '2', 'x', 'f1']
+    assert route.moves.tolist() == [0, 1, 2, 1, 0] and route.feet.tolist() == [3]
+    assert route.styles.tolist() == [0, 2, 3, 1, -1]
+    assert route.labels == ('S', '2L', 'R', 'F', '')
+    assert route.hold_indices().tolist() == [0, 1, 2, 3]
+    assert route.digest == Route.from_json(dict(data), HoldTable(), with_digest=True).digest
+    assert Route.from_json(data, holds).digest is None
+
+
+def test_route_from_json_defaults_and_missing():
+    holds = HoldTable(['1'], [(0, 0)])
+    route = Route.from_json({'name': 'Old', 'grade': 'V0', 'moves': [{'hold_id': '1'}, {'hold_id': 'new'}]}, holds, missing=-7)
+    assert (route.name, route.grade, route.author) == ('Old', 'V0', 'N/A')
+    assert route.moves.tolist() == [0, -7] and len(holds) == 1
+    assert MISSING_HOLD_ID != normalize_hold_id(MISSING_HOLD_ID)
+
+
+def test_load_wall(tmp_path):
+    (tmp_path / 'output/data').mkdir(parents=True)
+    (tmp_path / 'config.json').write_text(json.dumps({'wall_name': 'Test Wall'}), encoding='utf-8')
+    (tmp_path / 'output/data/holds.json').write_text(json.dumps({'1': {'x': 1, 'y': 2}}), encoding='utf-8')
+    (tmp_path / 'routes.json').write_text(json.dumps({'routes': [{'moves': [{'hold_id': '1'}, {'hold_id': 'B'}], 'holds': {'foot': ['c']}}]}), encoding='utf-8')
+    wall = load_wall(tmp_path)
+    assert wall.name == 'Test Wall' and len(wall.routes) == 1
+    assert wall.missing_hold_ids() == ['b', 'c']
+    empty = load_wall(tmp_path / 'nothing')
+    assert empty.name == 'nothing' and not empty.routes and not len(empty.holds)
+
+
+ROUTES = [
+    {'routeName': 'Crimp Line', 'difficulty': 'V3', 'author': 'Ann', 'moves': [{'hold_id': '1', 'type': 'start'}]},
+    {'routeName': 'Slab', 'difficulty': 'V1', 'author': 'Bo', 'moves': [{'hold_id': '2', 'type': 'start'}]},
+    {'routeName': '天花板', 'difficulty': 'v3', 'author': 'ann', 'moves': [{'hold_id': '3', 'type': 'start'}]},
+]
+
+
+def _jsonl(path, routes):
+    path.write_text('# 注释\n\n' + '\n'.join(json.dumps(r, ensure_ascii=False) for r in routes) + '\n', encoding='utf-8')
+    return path
+
+
+def test_parse_route_records_formats():
+    assert list(parse_route_records([json.dumps({'routes': ROUTES})], jsonl=False)) == ROUTES
+    assert list(parse_route_records([json.dumps(ROUTES)], jsonl=False)) == ROUTES
+    assert list(parse_route_records(['"x"'], jsonl=False)) == []
+    lines = ['# c', '', *map(json.dumps, ROUTES)]
+    assert list(parse_route_records(lines, jsonl=True, prefilter=lambda line: 'Slab' in line)) == [ROUTES[1]]
+    with pytest.raises(json.JSONDecodeError, match='第 2 行'):
+        list(parse_route_records([json.dumps(ROUTES[0]), '{oops'], jsonl=True))
+
+
+def test_jsonl_and_json_load_the_same_routes(tmp_path):
+    (tmp_path / 'routes.json').write_text(json.dumps({'routes': ROUTES}), encoding='utf-8')
+    jsonl = _jsonl(tmp_path / 'routes.JSONL', ROUTES)
+    assert list(iter_route_records(jsonl)) == list(iter_route_records(tmp_path / 'routes.json')) == ROUTES
+    a, b = HoldTable(), HoldTable()
+    from_json, from_jsonl = load_routes(tmp_path / 'routes.json', a, with_digest=True), load_routes(jsonl, b, with_digest=True)
+    assert [r.digest for r in from_json] == [r.digest for r in from_jsonl] == [route_json_digest(r) for r in ROUTES]
+    assert a.ids == b.ids == ['1', '2', '3']
+
+
+def test_route_selector_matches_case_insensitively():
+    by_grade = RouteSelector(grades=['V3 '])
+    assert [by_grade(r) for r in ROUTES] == [True, False, True]
+    both = RouteSelector(grades=['v3'], authors=['ANN'], names=['crimp line', 'Slab'])
+    assert [both(r) for r in ROUTES] == [True, False, False]
+    excluded = RouteSelector(exclude_digests={route_json_digest(ROUTES[0])})
+    assert [excluded(r) for r in ROUTES] == [False, True, True]
+    assert RouteSelector(names=['name'])({'name': 'Name'})
+
+
+def test_route_selector_line_prefilter():
+    selector = RouteSelector(names=['slab'])
+    assert not selector.matches_line(json.dumps(ROUTES[0])) and selector.matches_line(json.dumps(ROUTES[1]))
+    # 非 ASCII 线路名和不按名字筛选时不做预筛
+    assert RouteSelector(names=['天花板']).matches_line('{}') and RouteSelector(grades=['v1']).matches_line('{}')
+
+
+def test_load_routes_with_selector_only_interns_selected_holds(tmp_path):
+    jsonl = _jsonl(tmp_path / 'routes.jsonl', ROUTES)
+    holds = HoldTable()
+    routes = load_routes(jsonl, holds, where=route_selector(names=['Slab']))
+    assert [r.name for r in routes] == ['Slab'] and holds.ids == ['2']
+    assert route_selector() is None and isinstance(route_selector(exclude_digests=set()), RouteSelector)
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='需要 git')
+def test_route_digests_at_revision(tmp_path):
+    git = lambda *args: subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args], cwd=tmp_path, check=True, capture_output=True)
+    git('init', '-q')
+    path = _jsonl(tmp_path / 'routes.jsonl', ROUTES[:2])
+    git('add', 'routes.jsonl'); git('commit', '-qm', 'routes')
+    assert route_digests_at_revision(path, 'HEAD') == {route_json_digest(r) for r in ROUTES[:2]}
+    (tmp_path / 'other.txt').write_text('x'); git('add', 'other.txt'); git('commit', '-qm', 'other')
+    assert route_digests_at_revision(tmp_path / 'new.jsonl', 'HEAD') == set()
+    with pytest.raises(ValueError):
+        route_digests_at_revision(path, 'no-such-revision')